@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class DataConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'data'
+
+    def ready(self):
+        # hook up the receivers that keep our in-memory caches in line with the database
+        import signals
@@ -0,0 +1,66 @@
+import hashlib
+import io
+from threading import Lock
+
+import numpy as np
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+# a store for the per-year arrays behind the heavier analytics (see the similarities viewset)
+# entries are compressed .npz files, kept in one of the response cache's backends (see response_cache.py)
+# and tagged with the data version, so a request over decades only computes the years it hasn't seen before
+# entries from older versions are never read again, and age out of the backend like any other unused entry
+
+_backend = None
+_backend_lock = Lock()
+
+
+def get_array_backend():
+    """Returns the backend set up in settings.ARRAY_CACHE, creating it on first use"""
+    global _backend
+
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                options = dict(getattr(settings, "ARRAY_CACHE", {}))
+                backend = import_string(
+                    options.pop("BACKEND", "response_cache.FileBackend")
+                )
+                _backend = backend(
+                    **{key.lower(): value for key, value in options.items()}
+                )
+
+    return _backend
+
+
+def make_array_key(name, version):
+    # the database is part of the key, so that databases sharing a directory (e.g. the tests) can't mix
+    database = settings.DATABASES["default"]["NAME"]
+    key = f"{database}\n{version}\n{name}"
+
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def cached_arrays(name, version, compute):
+    """
+    Returns the dict of arrays that compute() gives, computing it only if there isn't one stored
+    under this name (e.g. "similarity-2016-cosine") for this data version yet
+    """
+    if getattr(settings, "ARRAY_CACHE_ENABLED", True) is False:
+        return compute()
+
+    backend = get_array_backend()
+    key = make_array_key(name, version)
+    body = backend.get(key)
+
+    if body is not None:
+        with np.load(io.BytesIO(body)) as data:
+            return {array: data[array] for array in data.files}
+
+    arrays = compute()
+
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, **arrays)
+    backend.set(key, buffer.getvalue())
+
+    return arrays
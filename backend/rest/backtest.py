@@ -0,0 +1,199 @@
+from time import perf_counter
+
+import numpy as np
+from scipy.stats import spearmanr
+
+from simulate import get_pool, timed_simulate
+from snapshot import get_snapshot
+
+
+class Backtest:
+    """
+    Predicts each year in a range from the window years before it, the way PredictViewSet.simulate_contest does,
+    and scores the predictions against the results that are in the database
+    The years are simulated in parallel, one per process (with workers > 1)
+    """
+
+    def __init__(
+        self,
+        start_year,
+        end_year,
+        window=5,
+        simulations=2000,
+        seed=0,
+        workers=1,
+        batch_size=1000,
+    ):
+        self.start_year = start_year
+        self.end_year = end_year
+        self.window = window
+        self.simulations = simulations
+        self.seed = seed
+        self.workers = workers
+        self.batch_size = batch_size
+
+    def run(self, callback=None):
+        """
+        Backtests every year in the range that has a final with results, and history to go on
+        Returns a dict of the report of each of those years (see score), the years that were skipped
+        and the averages of the reports, calling callback(report) as each report is ready
+        """
+        from rest.predict.viewset import PredictViewSet
+
+        snapshot = get_snapshot()
+        viewset = PredictViewSet()
+        years = []
+        skipped = []
+        contests = []
+
+        for year in range(self.start_year, self.end_year + 1):
+            start = perf_counter()
+            contest = self.prepare(snapshot, viewset, year)
+
+            if contest is None:
+                skipped.append(year)
+                continue
+
+            years.append(year)
+            contests.append((*contest, perf_counter() - start))
+
+        models = [contest[0] for contest in contests]
+        counts = [self.simulations] * len(models)
+
+        # each year has its own seed, so a year's predictions don't depend on what else is in the range
+        seeds = [[self.seed, year] for year in years]
+        sizes = [self.batch_size] * len(models)
+
+        if self.workers <= 1 or len(models) <= 1:
+            simulated = map(timed_simulate, models, counts, seeds, sizes)
+        else:
+            simulated = get_pool(self.workers).map(
+                timed_simulate, models, counts, seeds, sizes
+            )
+
+        reports = []
+
+        for year, contest, (qualified, places, seconds) in zip(
+            years, contests, simulated
+        ):
+            model, qualifiers, results, prepare_seconds = contest
+            report = {
+                "year": year,
+                **self.score(model, qualifiers, results, qualified, places),
+                "seconds": round(prepare_seconds + seconds, 3),
+            }
+            reports.append(report)
+
+            if callback is not None:
+                callback(report)
+
+        return {
+            "years": reports,
+            "skipped": skipped,
+            "summary": self.summarize(reports),
+        }
+
+    def prepare(self, snapshot, viewset, year):
+        """
+        Sets up the simulation of a year from the window years before it, and gets what actually happened:
+        the countries (by vote tensor index) that qualified from each semi-final and the place of each finalist
+        Returns None if the year has no semi-finals, no final with results, or nothing to predict it from
+        """
+        tensor = snapshot.vote_tensor
+        edition = snapshot.editions_by_year.get(year)
+        final = snapshot.final(edition) if edition else None
+
+        if final is None:
+            return None
+
+        results = {}
+
+        for performance in snapshot.performances_in(final, True):
+            result = snapshot.result(performance)
+
+            if result is not None:
+                results[tensor.country_index[performance.country_id]] = result.place
+
+        if not results:
+            return None
+
+        finalists = tensor.competing[tensor.show_index[final.id]]
+        qualifiers = [
+            set(
+                np.flatnonzero(
+                    tensor.competing[tensor.show_index[semi.id]] & finalists
+                ).tolist()
+            )
+            for semi in snapshot.shows_in(edition, "semi")
+        ]
+
+        if not qualifiers:
+            return None
+
+        # the model takes one number of qualifiers for every semi-final, so it's the one they had on average
+        model = viewset.build_contest_model(
+            snapshot,
+            year,
+            year - self.window,
+            year - 1,
+            round(sum(len(x) for x in qualifiers) / len(qualifiers)),
+        )
+
+        if model is None:
+            return None
+
+        return model, qualifiers, results
+
+    def score(self, model, qualifiers, results, qualified, places):
+        """
+        Scores the simulations of a year against what actually happened
+        qualifier_accuracy is the share of the actual qualifiers that were among the likeliest to qualify
+        from their semi-final (as many as actually did), and final_spearman is the rank correlation
+        between the actual places in the final and the expected places (given making the final)
+        """
+        candidates = model.candidates.tolist()
+        hits = 0
+        total = 0
+
+        for semi, actual in zip(model.semis, qualifiers):
+            positions = semi["competitors"]
+            likeliest = positions[np.argsort(-qualified[positions], kind="stable")]
+            predicted = {candidates[i] for i in likeliest[: len(actual)]}
+
+            hits += len(predicted & actual)
+            total += len(actual)
+
+        # the candidates who never made the final in any simulation are predicted last
+        with np.errstate(divide="ignore", invalid="ignore"):
+            expected = np.where(
+                qualified > 0,
+                places @ np.arange(1, model.finalists + 1) / qualified,
+                model.finalists + 1,
+            )
+
+        finalists = [i for i in results if i in candidates]
+        spearman = None
+
+        if len(finalists) > 1:
+            correlation = spearmanr(
+                [expected[candidates.index(i)] for i in finalists],
+                [results[i] for i in finalists],
+            ).statistic
+
+            if not np.isnan(correlation):
+                spearman = round(float(correlation), 4)
+
+        return {
+            "qualifier_accuracy": round(hits / total, 4) if total else None,
+            "final_spearman": spearman,
+        }
+
+    def summarize(self, reports):
+        """Averages each measure over the years that have it"""
+        summary = {}
+
+        for key in ["qualifier_accuracy", "final_spearman", "seconds"]:
+            values = [report[key] for report in reports if report[key] is not None]
+            summary[key] = round(float(np.mean(values)), 4) if values else None
+
+        return summary
@@ -0,0 +1,296 @@
+import json
+import tracemalloc
+from time import perf_counter
+
+import numpy as np
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+
+from models import Country, Edition, Entry, Group, Show, ShowType
+
+# these change data rather than read it, so they aren't benchmarked
+SKIPPED = {
+    "data-shows-calculate-results",
+    "data-editions-calculate-results",
+    "data-editions-calculate-all-results",
+}
+
+# how many years the analytics are asked about, counting back from the latest edition
+WINDOW = 8
+
+
+def router_endpoints():
+    """Returns the URL name and HTTP method of every read-only action on the router"""
+    from urls import router
+
+    endpoints = {}
+
+    for prefix, viewset, basename in router.registry:
+        for action in viewset.get_extra_actions():
+            name = f"{basename}-{action.url_name}"
+
+            if name not in SKIPPED:
+                endpoints[name] = next(iter(action.mapping))
+
+    return endpoints
+
+
+def request_bodies():
+    """
+    The path and body to call each endpoint with, keyed by URL name
+    They are picked from whatever is in the database, so this works on the real data and on generated data alike
+    """
+    edition = Edition.objects.filter(show__isnull=False).order_by("-year").first()
+    show = Show.objects.get(edition=edition, show_type=ShowType.GRAND_FINAL)
+    country = Country.objects.exclude(code="un").order_by("id").first()
+    entry = Entry.objects.filter(country=country).order_by("-year__year").first()
+    group = Group.objects.order_by("id").first()
+    everyone = list(Country.objects.order_by("id").values_list("id", flat=True))
+
+    years = {"start_year": max(edition.year - WINDOW + 1, 0), "end_year": edition.year}
+    exchange = {
+        **years,
+        "vote_type": "combined",
+        "country": country.id,
+        "shows": "final",
+        "average": False,
+    }
+
+    bodies = {
+        "data-average-get-average-point-giver-count": (
+            "/average/get_average_point_giver_count/",
+            {**years, "shows": "final", "vote_type": "combined", "proportional": True},
+        ),
+        "data-average-get-average-performance": (
+            "/average/get_average_performance/",
+            {**years, "vote_type": "combined"},
+        ),
+        "data-average-get-average-final-points": (
+            "/average/get_average_final_points/",
+            {
+                **years,
+                "vote_type": "combined",
+                "proportional": True,
+                "include_nq": True,
+            },
+        ),
+        "data-average-get-average-semi-points": (
+            "/average/get_average_semi_points/",
+            {**years, "vote_type": "combined", "proportional": True},
+        ),
+        "data-average-get-average-place": (
+            "/average/get_average_place/",
+            {**years, "vote_type": "combined", "include_nq": True},
+        ),
+        "data-average-get-average-semi-place": (
+            "/average/get_average_semi_place/",
+            {**years, "vote_type": "combined"},
+        ),
+        "data-exchanges-get-points-from": ("/exchanges/get_points_from/", exchange),
+        "data-exchanges-get-points-to": ("/exchanges/get_points_to/", exchange),
+        "data-exchanges-get-friends": ("/exchanges/get_friends/", exchange),
+        "data-exchanges-get-exchanges": ("/exchanges/get_exchanges/", exchange),
+        "data-exchanges-get-batch": (
+            "/exchanges/get_batch/",
+            {
+                **years,
+                "vote_type": "combined",
+                "shows": "final",
+                "average": False,
+                "countries": everyone,
+            },
+        ),
+        "data-exchanges-get-discrepancies": ("/exchanges/get_discrepancies/", exchange),
+        "data-exchanges-get-grid": (
+            "/exchanges/get_grid/",
+            {**years, "vote_type": "combined", "shows": "final", "average": True},
+        ),
+        "data-qualify-get-qualify-count": ("/qualify/get_qualify_count/", years),
+        "data-qualify-get-qualify-rate": ("/qualify/get_qualify_rate/", years),
+        "data-qualify-get-longest-q-streak": ("/qualify/get_longest_q_streak/", years),
+        "data-qualify-get-longest-nq-streak": (
+            "/qualify/get_longest_nq_streak/",
+            years,
+        ),
+        "data-running-order-get-average-running-order": (
+            "/running_order/get_average_running_order/",
+            {**years, "shows": "final", "proportional": True},
+        ),
+        "data-votetypes-get-discrepancy": (
+            "/votetypes/get_discrepancy/",
+            {**years, "shows": "final", "metric": "points", "average": True},
+        ),
+        "data-votetypes-get-points-proportion": (
+            "/votetypes/get_points_proportion/",
+            {**years, "shows": "final"},
+        ),
+        "data-languages-get-language-count": ("/languages/get_language_count/", years),
+        "data-languages-get-language-count-by-country": (
+            "/languages/get_language_count_by_country/",
+            {**years, "country": country.id},
+        ),
+        "data-languages-get-country-count": ("/languages/get_country_count/", years),
+        "data-languages-get-use-streak": ("/languages/get_use_streak/", years),
+        "data-languages-get-qualification-rate": (
+            "/languages/get_qualification_rate/",
+            years,
+        ),
+        "data-languages-get-earliest-appearance": (
+            "/languages/get_earliest_appearance/",
+            years,
+        ),
+        "data-languages-get-latest-appearance": (
+            "/languages/get_latest_appearance/",
+            years,
+        ),
+        "data-similarities-get-similarity": (
+            "/similarities/get_similarity/",
+            {**years, "mode": "cosine"},
+        ),
+        "data-similarities-get-jury-televote-similarity": (
+            "/similarities/get_jury_televote_similarity/",
+            {**years, "mode": "rank"},
+        ),
+        "data-predict-country-affinity": (
+            "/predict/country_affinity/",
+            {
+                "year": edition.year,
+                "start_year": max(edition.year - WINDOW, 0),
+                "end_year": edition.year - 1,
+            },
+        ),
+        "data-predict-simulate-contest": (
+            "/predict/simulate_contest/",
+            {
+                "year": edition.year,
+                "start_year": max(edition.year - WINDOW, 0),
+                "end_year": edition.year - 1,
+                "simulations": 10000,
+            },
+        ),
+        "data-predict-backtest": (
+            "/predict/backtest/",
+            {**years, "window": 5, "simulations": 1000},
+        ),
+        "data-predict-voting-bias": (
+            "/predict/voting_bias/",
+            {**years, "shows": "all", "vote_type": "combined"},
+        ),
+        "data-countries-get-all": ("/countries/get_all/", {}),
+        "data-countries-get-country": (f"/countries/{country.id}/get_country/", {}),
+        "data-countries-get-entries": (f"/countries/{country.id}/get_entries/", {}),
+        "data-editions-get-all": ("/editions/get_all/", {}),
+        "data-editions-get-color": (f"/editions/{edition.id}/get_color/", {}),
+        "data-editions-get-entries": (f"/editions/{edition.id}/get_entries/", {}),
+        "data-entries-get-entry": (
+            "/entries/get_entry/",
+            {"edition": entry.year_id, "country": country.id},
+        ),
+        "data-entries-get-entries": (
+            "/entries/get_entries/",
+            {"edition": edition.id, "show_type": ShowType.GRAND_FINAL},
+        ),
+        "data-entries-get-entries-in-years": (
+            "/entries/get_entries_in_years/",
+            {"start_year": edition.id, "end_year": edition.id},
+        ),
+        "data-entries-get-points-to": (f"/entries/{entry.id}/get_points_to/", {}),
+        "data-entries-get-points-from": (f"/entries/{entry.id}/get_points_from/", {}),
+        "data-results-get-results": (
+            "/results/get_results/",
+            {"country": country.id, "edition": edition.id},
+        ),
+        "data-shows-get-results": (f"/shows/{show.id}/get_results/", {}),
+        "data-shows-get-show": (
+            "/shows/get_show/",
+            {"year": edition.id, "show_type": ShowType.GRAND_FINAL},
+        ),
+    }
+
+    if group is not None:
+        bodies["data-groups-get-all"] = ("/groups/get_all/", {})
+        bodies["data-groups-get-group"] = (f"/groups/{group.id}/get_group/", {})
+
+    return bodies
+
+
+class Benchmark:
+    """
+    Calls each endpoint a number of times through the whole Django stack (middleware included),
+    and reports the p50/p95 latency, the number of queries and the peak Python memory of each
+
+    The response cache is off unless cache=True, so every call does the full computation
+    Peak memory comes from one extra traced call, since tracemalloc slows everything else down
+    """
+
+    def __init__(self, iterations=10, cache=False, names=None):
+        self.iterations = iterations
+        self.cache = cache
+        self.names = names
+        self.client = Client(HTTP_HOST="localhost")
+
+    def call(self, method, path, body):
+        if method == "get":
+            return self.client.get(path)
+
+        return self.client.post(path, json.dumps(body), content_type="application/json")
+
+    def measure(self, method, path, body):
+        """Returns the stats for one endpoint"""
+        times = []
+        queries = 0
+
+        def count(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        for i in range(self.iterations):
+            queries = 0
+            start = perf_counter()
+
+            with connection.execute_wrapper(count):
+                response = self.call(method, path, body)
+
+            times.append(perf_counter() - start)
+
+            if response.status_code != 200:
+                return {"status": response.status_code}
+
+        tracemalloc.start()
+
+        try:
+            self.call(method, path, body)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        return {
+            "status": 200,
+            "p50_ms": round(float(np.percentile(times, 50)) * 1000, 1),
+            "p95_ms": round(float(np.percentile(times, 95)) * 1000, 1),
+            "queries": queries,
+            "peak_kib": round(peak / 1024),
+        }
+
+    def run(self, log=None):
+        """Returns the stats of every endpoint, keyed by URL name (endpoints without a body get None)"""
+        log = log or (lambda name, stats: None)
+        bodies = request_bodies()
+        report = {}
+
+        with override_settings(RESPONSE_CACHE_ENABLED=self.cache):
+            for name, method in router_endpoints().items():
+                if self.names and not any(x in name for x in self.names):
+                    continue
+
+                if name in bodies:
+                    path, body = bodies[name]
+                    report[name] = self.measure(method, path, body)
+                else:
+                    report[name] = None
+
+                log(name, report[name])
+
+        return report
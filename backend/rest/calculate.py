@@ -0,0 +1,271 @@
+from concurrent.futures import ThreadPoolExecutor
+from threading import local, Lock, Timer
+
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+
+from models import (
+    Country,
+    Edition,
+    get_vote_label,
+    Performance,
+    Result,
+    Show,
+    Vote,
+    VoteType,
+    VotingBias,
+)
+from tensors import VoteTensor
+from version import bump_data_version
+
+# the Result fields that calculate_show fills in
+RESULT_FIELDS = [
+    "place",
+    "jury_place",
+    "televote_place",
+    "combined",
+    "jury",
+    "televote",
+    "running_order",
+]
+
+
+def calculate_show(show: Show, tensor: VoteTensor, performances):
+    """
+    Works out the standings of a show from the votes in the tensor, without touching the database
+    performances should be the show's competing performances (running_order > 0), in id order
+    Returns the same list of dicts ShowViewSet.calculate_results returns, sorted by place
+    """
+    vote_types = show.voting_system
+    lst = []
+
+    # add up the points each country received from all voters
+    totals = tensor.points[tensor.show_index[show.id]].sum(axis=0, dtype=np.int32)
+    totals = totals.tolist()
+
+    for performance in performances:
+        obj = {
+            "country": performance.country_id,
+            "running_order": performance.running_order,
+            "id": performance.id,
+        }
+        receiver = tensor.country_index[performance.country_id]
+
+        # add voting results for each vote type
+        for vote_type, label in VoteType.choices:
+            if vote_type in vote_types:
+                obj[label.lower()] = totals[vote_type - 1][receiver]
+
+        # add a "combined" property if there are multiple vote types
+        # this assumes that len(vote_types) > 1 implies VoteType.COMBINED
+        if len(vote_types) > 1:
+            obj[VoteType.COMBINED.label.lower()] = sum(
+                totals[vote_type - 1][receiver] for vote_type in vote_types
+            )
+
+        lst.append(obj)
+
+    if len(lst) == 0:
+        return lst
+
+    # sort the list by the appropriate vote type to add place data
+    if "jury" in lst[0]:
+        lst.sort(key=lambda x: x["jury"], reverse=True)
+
+        for i in range(len(lst)):
+            lst[i]["jury_place"] = i + 1
+
+    if "televote" in lst[0]:
+        lst.sort(key=lambda x: x["televote"], reverse=True)
+
+        for i in range(len(lst)):
+            lst[i]["televote_place"] = i + 1
+
+    # sort the list by the appropriate vote type
+    # combined if there are multiple vote types, otherwise the only vote type
+    key = get_vote_label(show.get_primary_vote_type())
+
+    lst.sort(key=lambda x: x[key], reverse=True)
+
+    for i in range(len(lst)):
+        lst[i]["place"] = i + 1
+
+    return lst
+
+
+def recalculate_shows(shows):
+    """
+    Recalculates and saves the results of the given shows in one transaction
+    Everything is worked out in memory first, then written with one bulk_update and one bulk_create
+    Returns a dict of show id -> the standings from calculate_show
+    """
+    shows = list(shows)
+    show_ids = [show.id for show in shows]
+
+    performances = list(Performance.objects.filter(show__in=show_ids).order_by("id"))
+    tensor = VoteTensor(
+        Country.objects.all(),
+        shows,
+        performances,
+        Vote.objects.filter(performance__show__in=show_ids),
+    )
+
+    existing = {
+        result.performance_id: result
+        for result in Result.objects.filter(performance__show__in=show_ids)
+    }
+
+    standings = {}
+    to_update = []
+    to_create = []
+
+    for show in shows:
+        competing = [
+            performance
+            for performance in performances
+            if performance.show_id == show.id and performance.running_order > 0
+        ]
+        standings[show.id] = calculate_show(show, tensor, competing)
+
+        for row in standings[show.id]:
+            values = {field: row.get(field, None) for field in RESULT_FIELDS}
+
+            if row["id"] in existing:
+                # update the existing result
+                result = existing[row["id"]]
+
+                for field, value in values.items():
+                    setattr(result, field, value)
+
+                to_update.append(result)
+
+            else:
+                # create a new result
+                to_create.append(Result(performance_id=row["id"], **values))
+
+    # the voting biases go in the same transaction as the results they're measured against,
+    # so nobody ever sees new places next to old biases
+    with transaction.atomic():
+        Result.objects.bulk_update(to_update, RESULT_FIELDS)
+        Result.objects.bulk_create(to_create)
+
+        VotingBias.objects.rebuild(Edition.objects.filter(show__in=show_ids).distinct())
+
+        # the bulk operations skip the model signals, so we have to bump the version ourselves
+        # (it only goes up once this transaction commits)
+        bump_data_version()
+
+    return standings
+
+
+def recalculate_edition(edition: Edition):
+    """Recalculates the results of every show in an edition (see recalculate_shows)"""
+    shows = Show.objects.filter(edition=edition).select_related("edition")
+    return recalculate_shows(shows.order_by("id"))
+
+
+def _recalculate_in_thread(edition):
+    try:
+        return recalculate_edition(edition)
+    finally:
+        # each thread gets its own connection, which Django won't close for us
+        connection.close()
+
+
+def recalculate_editions(editions, workers=1):
+    """
+    Recalculates the results of several editions, each in its own transaction
+    With workers > 1, editions are spread over a thread pool (the time goes into the database, not the GIL)
+    Returns a dict of edition year -> the standings from recalculate_shows
+    """
+    editions = list(editions)
+
+    if workers <= 1:
+        return {edition.year: recalculate_edition(edition) for edition in editions}
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        standings = executor.map(_recalculate_in_thread, editions)
+        return {
+            edition.year: standing for edition, standing in zip(editions, standings)
+        }
+
+
+# shows waiting to be recalculated once the current transaction commits
+# this is per thread, since each thread has its own connection (and therefore its own transaction)
+_local = local()
+
+# shows waiting for the debounce timer, across all threads
+_delayed = set()
+_delayed_lock = Lock()
+_timer = None
+
+
+def _pending_shows():
+    if not hasattr(_local, "shows"):
+        _local.shows = set()
+
+    return _local.shows
+
+
+def schedule_recalculation(show_id):
+    """
+    Marks a show as needing its results recalculated once the current transaction commits
+    Every show marked before the commit is recalculated together, once, no matter how many votes changed
+    With RESULTS_RECALCULATION_DELAY set, shows are instead collected for that many seconds after the commit
+    """
+    _pending_shows().add(show_id)
+
+    # registering on every call means a rolled back transaction can't leave shows stranded,
+    # the first callback to run does the work and the rest find nothing to do
+    transaction.on_commit(_flush_pending)
+
+
+def _flush_pending():
+    global _timer
+
+    pending = _pending_shows()
+
+    if len(pending) == 0:
+        return
+
+    show_ids = set(pending)
+    pending.clear()
+
+    delay = getattr(settings, "RESULTS_RECALCULATION_DELAY", 0)
+
+    if delay <= 0:
+        _recalculate_show_ids(show_ids)
+        return
+
+    with _delayed_lock:
+        _delayed.update(show_ids)
+
+        if _timer is None:
+            _timer = Timer(delay, _flush_delayed)
+            _timer.daemon = True
+            _timer.start()
+
+
+def _flush_delayed():
+    global _timer
+
+    with _delayed_lock:
+        show_ids = set(_delayed)
+        _delayed.clear()
+        _timer = None
+
+    try:
+        _recalculate_show_ids(show_ids)
+    finally:
+        # the timer runs on its own thread, which Django won't close the connection of
+        connection.close()
+
+
+def _recalculate_show_ids(show_ids):
+    # some of the shows may have been deleted in the meantime
+    shows = Show.objects.filter(id__in=show_ids).select_related("edition")
+    shows = list(shows.order_by("id"))
+
+    if len(shows) > 0:
+        recalculate_shows(shows)
@@ -0,0 +1,66 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from backtest import Backtest
+
+
+class Command(BaseCommand):
+    help = "Predicts each year in a range from the years before it and scores the predictions against the results"
+
+    def add_arguments(self, parser):
+        parser.add_argument("start_year", type=int)
+        parser.add_argument("end_year", type=int)
+        parser.add_argument(
+            "--window",
+            type=int,
+            default=5,
+            help="how many years before each year to predict it from",
+        )
+        parser.add_argument("--simulations", type=int, default=2000)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=settings.SIMULATION_WORKERS,
+            help="how many years to simulate at once, each in its own process",
+        )
+        parser.add_argument("--json", help="also write the report to this file")
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{'year':>6} {'qualifiers':>11} {'spearman':>9} {'seconds':>8}"
+        )
+
+        backtest = Backtest(
+            options["start_year"],
+            options["end_year"],
+            options["window"],
+            options["simulations"],
+            options["seed"],
+            options["workers"],
+            settings.SIMULATION_BATCH_SIZE,
+        )
+        report = backtest.run(self.write_row)
+
+        if report["skipped"]:
+            skipped = ", ".join(str(year) for year in report["skipped"])
+            self.stdout.write(
+                self.style.WARNING(f"no results or history to go on, skipped {skipped}")
+            )
+
+        self.write_row({"year": "mean", **report["summary"]})
+
+        if options["json"]:
+            with open(options["json"], "w") as f:
+                json.dump(report, f, indent=2)
+
+    def write_row(self, report):
+        def format(value):
+            return "-" if value is None else value
+
+        self.stdout.write(
+            f"{report['year']:>6} {format(report['qualifier_accuracy']):>11} "
+            f"{format(report['final_spearman']):>9} {report['seconds']:>8}"
+        )
@@ -0,0 +1,46 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from benchmark import Benchmark
+
+
+class Command(BaseCommand):
+    help = "Calls every endpoint on the router and reports its latency, query count and peak memory"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "names",
+            nargs="*",
+            help="only benchmark endpoints whose URL name contains one of these",
+        )
+        parser.add_argument("--iterations", type=int, default=10)
+        parser.add_argument(
+            "--cache",
+            action="store_true",
+            help="leave the response cache on (so only the first call does any work)",
+        )
+        parser.add_argument("--json", help="also write the report to this file")
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{'endpoint':55} {'p50 ms':>9} {'p95 ms':>9} {'queries':>8} {'peak KiB':>9}"
+        )
+
+        benchmark = Benchmark(options["iterations"], options["cache"], options["names"])
+        report = benchmark.run(self.write_row)
+
+        if options["json"]:
+            with open(options["json"], "w") as f:
+                json.dump(report, f, indent=2)
+
+    def write_row(self, name, stats):
+        if stats is None:
+            self.stdout.write(self.style.WARNING(f"{name:55} no request body, skipped"))
+        elif stats["status"] != 200:
+            self.stdout.write(self.style.ERROR(f"{name:55} failed ({stats['status']})"))
+        else:
+            self.stdout.write(
+                f"{name:55} {stats['p50_ms']:>9} {stats['p95_ms']:>9} "
+                f"{stats['queries']:>8} {stats['peak_kib']:>9}"
+            )
@@ -0,0 +1,79 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from models import Country
+from synthetic import ContestGenerator
+
+
+class Command(BaseCommand):
+    help = "Fills an empty database with a made up contest history, for testing and benchmarking"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--start-year", type=int, default=1998)
+        parser.add_argument("--years", type=int, default=27)
+        parser.add_argument("--countries", type=int, default=44)
+        parser.add_argument(
+            "--semis",
+            type=int,
+            choices=[0, 1, 2],
+            default=2,
+            help="number of semi-finals each year",
+        )
+        parser.add_argument(
+            "--top-ten",
+            action="store_true",
+            help="only generate the top ten of each ranking, like the older real data",
+        )
+        parser.add_argument(
+            "--split-from",
+            type=int,
+            default=2016,
+            help="first year with separate jury and televotes",
+        )
+        parser.add_argument(
+            "--scale",
+            type=int,
+            default=1,
+            help="multiplies the number of years generated (up to 100)",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="number of editions to calculate results for at once",
+        )
+        parser.add_argument(
+            "--flush",
+            action="store_true",
+            help="delete all the existing contest data first",
+        )
+
+    def handle(self, *args, **options):
+        if not 1 <= options["scale"] <= 100:
+            raise CommandError("--scale must be between 1 and 100")
+
+        try:
+            generator = ContestGenerator(
+                start_year=options["start_year"],
+                years=options["years"],
+                countries=options["countries"],
+                semis=options["semis"],
+                full_rankings=not options["top_ten"],
+                split_from=options["split_from"],
+                scale=options["scale"],
+                seed=options["seed"],
+            )
+        except ValueError as e:
+            raise CommandError(e)
+
+        # the options are checked first, so a mistake in them doesn't empty the database
+        if options["flush"]:
+            ContestGenerator.flush()
+        elif Country.objects.exists():
+            raise CommandError(
+                "The database already has data, use --flush to replace it"
+            )
+
+        editions = generator.generate(options["workers"], self.stdout.write)
+
+        self.stdout.write(self.style.SUCCESS(f"Generated {len(editions)} edition(s)"))
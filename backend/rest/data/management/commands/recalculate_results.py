@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from calculate import recalculate_editions
+from models import Edition
+
+
+class Command(BaseCommand):
+    help = "Recalculates the results of every show in a range of editions (all of them by default)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--start-year", type=int, default=None)
+        parser.add_argument("--end-year", type=int, default=None)
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="number of editions to recalculate at once",
+        )
+
+    def handle(self, *args, **options):
+        editions = Edition.objects.order_by("year")
+
+        if options["start_year"] is not None:
+            editions = editions.filter(year__gte=options["start_year"])
+
+        if options["end_year"] is not None:
+            editions = editions.filter(year__lte=options["end_year"])
+
+        standings = recalculate_editions(editions, options["workers"])
+
+        for year, shows in standings.items():
+            self.stdout.write(f"{year}: recalculated {len(shows)} show(s)")
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Recalculated {len(standings)} edition(s)")
+        )
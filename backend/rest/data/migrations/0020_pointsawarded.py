@@ -0,0 +1,68 @@
+# Generated by Django 4.2.2 on 2026-10-18 07:45
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Points per place at the time of this migration
+POINTS_PER_PLACE = [12, 10, 8, 7, 6, 5, 4, 3, 2, 1]
+
+
+def populate_points_awarded(apps, schema_editor):
+    Country = apps.get_model('data', 'Country')
+    Vote = apps.get_model('data', 'Vote')
+    PointsAwarded = apps.get_model('data', 'PointsAwarded')
+
+    countries = dict(Country.objects.values_list('code', 'id'))
+    rows = []
+
+    for vote in Vote.objects.select_related('performance__show__edition').iterator():
+        show = vote.performance.show
+
+        for i, code in enumerate(vote.ranking):
+            rows.append(PointsAwarded(
+                vote=vote,
+                voter_id=vote.performance.country_id,
+                receiver_id=countries[code],
+                show=show,
+                year=show.edition.year,
+                show_type=show.show_type,
+                vote_type=vote.vote_type,
+                points=POINTS_PER_PLACE[i] if i < len(POINTS_PER_PLACE) else 0,
+                rank=i + 1,
+            ))
+
+    PointsAwarded.objects.bulk_create(rows, batch_size=5000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data', '0019_group'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PointsAwarded',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.IntegerField()),
+                ('show_type', models.IntegerField(choices=[(1, 'Semi-Final 1'), (2, 'Semi-Final 2'), (3, 'Grand Final')])),
+                ('vote_type', models.IntegerField(choices=[(1, 'Jury'), (2, 'Televote'), (3, 'Combined')])),
+                ('points', models.IntegerField()),
+                ('rank', models.IntegerField()),
+                ('receiver', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='points_received', to='data.country')),
+                ('show', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='data.show')),
+                ('vote', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='data.vote')),
+                ('voter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='points_given', to='data.country')),
+            ],
+            options={
+                'abstract': False,
+                'indexes': [
+                    models.Index(fields=['voter', 'year', 'vote_type'], name='points_voter_year_idx'),
+                    models.Index(fields=['receiver', 'year', 'vote_type'], name='points_receiver_year_idx'),
+                    models.Index(fields=['year', 'show_type'], name='points_year_show_idx'),
+                ],
+            },
+        ),
+        migrations.RunPython(populate_points_awarded, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.2 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+def create_data_version(apps, schema_editor):
+    DataVersion = apps.get_model('data', 'DataVersion')
+    DataVersion.objects.create(id=1, version=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data', '0020_pointsawarded'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.RunPython(create_data_version, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 4.2.2 on 2026-10-18 10:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# QualificationType at the time of this migration
+QUALIFIED, NON_QUALIFIED, AUTO_QUALIFIED, HOST, DID_NOT_COMPETE = 1, 2, 3, 4, 5
+GRAND_FINAL = 3
+
+
+def populate_qualification_status(apps, schema_editor):
+    Performance = apps.get_model('data', 'Performance')
+    QualificationStatus = apps.get_model('data', 'QualificationStatus')
+
+    performances = Performance.objects.filter(
+        show__show_type=GRAND_FINAL
+    ).select_related('country', 'show__edition').order_by('id')
+    rows = []
+
+    for performance in performances:
+        edition = performance.show.edition
+
+        if performance.running_order > 0:
+            if performance.country_id == edition.host_id:
+                status = HOST
+            elif performance.country.is_big_five:
+                status = AUTO_QUALIFIED
+            else:
+                status = QUALIFIED
+        elif performance.country.code == 'un':
+            status = DID_NOT_COMPETE
+        else:
+            status = NON_QUALIFIED
+
+        rows.append(QualificationStatus(
+            edition=edition,
+            year=edition.year,
+            country_id=performance.country_id,
+            performance=performance,
+            status=status,
+        ))
+
+    QualificationStatus.objects.bulk_create(rows, batch_size=5000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data', '0021_dataversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QualificationStatus',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.IntegerField()),
+                ('status', models.IntegerField(choices=[(1, 'Qualified'), (2, 'Non Qualified'), (3, 'Auto Qualified'), (4, 'Host'), (5, 'Did Not Compete')])),
+                ('country', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='data.country')),
+                ('edition', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='data.edition')),
+                ('performance', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='data.performance')),
+            ],
+            options={
+                'abstract': False,
+                'indexes': [
+                    models.Index(fields=['year', 'status'], name='qualification_year_idx'),
+                    models.Index(fields=['country', 'year'], name='qualification_country_idx'),
+                ],
+            },
+        ),
+        migrations.RunPython(populate_qualification_status, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.2 on 2026-10-18 10:40
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data', '0022_qualificationstatus'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='edition',
+            index=models.Index(fields=['year'], name='edition_year_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='performance',
+            index=models.Index(fields=['show', 'country'], name='performance_show_country_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='performance',
+            index=models.Index(fields=['show', 'running_order'], name='performance_show_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vote',
+            index=models.Index(fields=['performance', 'vote_type'], name='vote_performance_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vote',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['ranking'], name='vote_ranking_idx'),
+        ),
+    ]
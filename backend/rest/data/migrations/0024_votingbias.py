@@ -0,0 +1,95 @@
+# Generated by Django 4.2.2 on 2026-10-18 08:28
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# POINTS_PER_PLACE and the Result field of each VoteType at the time of this migration
+POINTS_PER_PLACE = [12, 10, 8, 7, 6, 5, 4, 3, 2, 1]
+RESULT_FIELDS = {1: 'jury', 2: 'televote', 3: 'combined'}
+
+
+def populate_voting_bias(apps, schema_editor):
+    Country = apps.get_model('data', 'Country')
+    Performance = apps.get_model('data', 'Performance')
+    Result = apps.get_model('data', 'Result')
+    Vote = apps.get_model('data', 'Vote')
+    VotingBias = apps.get_model('data', 'VotingBias')
+
+    show_performances = {}
+
+    for performance in Performance.objects.select_related('show__edition').order_by('id'):
+        show_performances.setdefault(performance.show_id, []).append(performance)
+
+    results = {result.performance_id: result for result in Result.objects.all()}
+    countries = dict(Country.objects.values_list('code', 'id'))
+    rows = []
+
+    for vote in Vote.objects.select_related('performance').order_by('id'):
+        performances = show_performances[vote.performance.show_id]
+        places = {countries[code]: i for i, code in enumerate(vote.ranking)}
+
+        for performance in performances:
+            if performance.running_order <= 0 or performance.country_id == vote.performance.country_id:
+                continue
+
+            result = results.get(performance.id)
+            total = getattr(result, RESULT_FIELDS[vote.vote_type], None)
+
+            if total is None:
+                continue
+
+            place = places.get(performance.country_id)
+            points = POINTS_PER_PLACE[place] if place is not None and place < len(POINTS_PER_PLACE) else 0
+            average = total / (len(performances) - 1)
+            show = performance.show
+
+            rows.append(VotingBias(
+                edition=show.edition,
+                show=show,
+                year=show.edition.year,
+                show_type=show.show_type,
+                vote_type=vote.vote_type,
+                voter_id=vote.performance.country_id,
+                receiver_id=performance.country_id,
+                points=points,
+                rank=None if place is None else place + 1,
+                average=average,
+                excess=points - average,
+            ))
+
+    VotingBias.objects.bulk_create(rows, batch_size=5000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data', '0023_analytics_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VotingBias',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.IntegerField()),
+                ('show_type', models.IntegerField(choices=[(1, 'Semi-Final 1'), (2, 'Semi-Final 2'), (3, 'Grand Final')])),
+                ('vote_type', models.IntegerField(choices=[(1, 'Jury'), (2, 'Televote'), (3, 'Combined')])),
+                ('points', models.IntegerField()),
+                ('rank', models.IntegerField(blank=True, null=True)),
+                ('average', models.FloatField()),
+                ('excess', models.FloatField()),
+                ('edition', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='data.edition')),
+                ('receiver', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='biases_received', to='data.country')),
+                ('show', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='data.show')),
+                ('voter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='biases_given', to='data.country')),
+            ],
+            options={
+                'abstract': False,
+                'indexes': [
+                    models.Index(fields=['year', 'show_type'], name='bias_year_show_idx'),
+                    models.Index(fields=['voter', 'receiver'], name='bias_pair_idx'),
+                ],
+            },
+        ),
+        migrations.RunPython(populate_voting_bias, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,775 @@
+import json
+from unittest import mock
+
+import numpy as np
+from scipy.stats import spearmanr
+from django.conf import settings
+from django.db import connection, transaction
+from django.test import override_settings, TestCase
+
+from backtest import Backtest
+from benchmark import request_bodies
+from calculate import _pending_shows, recalculate_shows
+from middleware import QueryBudgetExceeded
+from models import (
+    Country,
+    DataVersion,
+    Edition,
+    Entry,
+    Group,
+    Language,
+    Performance,
+    PointsAwarded,
+    QualificationStatus,
+    Result,
+    Show,
+    ShowType,
+    Vote,
+    VoteType,
+    VotingBias,
+)
+from rest.countries.registry import get_country_registry
+from rest.predict.viewset import PredictViewSet
+from snapshot import get_snapshot
+from synthetic import ContestGenerator
+from version import bump_data_version, get_data_version
+
+
+class IndexUsageTests(TestCase):
+    """
+    Checks that the planner can answer the hot analytics filters from the indexes in 0023_analytics_indexes
+    The test tables are tiny, so sequential scans are switched off to make the planner show its hand
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.sweden = Country.objects.create(
+            name="Sweden", adjective="Swedish", code="se"
+        )
+        cls.norway = Country.objects.create(
+            name="Norway", adjective="Norwegian", code="no"
+        )
+
+        cls.edition = Edition.objects.create(
+            year=2016, host=cls.sweden, city="Stockholm"
+        )
+        cls.show = Show.objects.create(
+            edition=cls.edition,
+            show_type=ShowType.GRAND_FINAL,
+            voting_system=[VoteType.JURY, VoteType.TELEVOTE],
+        )
+
+        cls.performance = Performance.objects.create(
+            country=cls.sweden, show=cls.show, running_order=1
+        )
+        Performance.objects.create(country=cls.norway, show=cls.show, running_order=2)
+
+        Vote.objects.create(
+            performance=cls.performance, vote_type=VoteType.JURY, ranking=["no"]
+        )
+
+    def explain(self, queryset):
+        # the statistics are taken from this test's rows, rather than whatever autovacuum last saw
+        # (other tests fill these tables too), so the planner picks the same way every time
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {queryset.model._meta.db_table}")
+            cursor.execute("SET LOCAL enable_seqscan = off")
+
+        return queryset.explain()
+
+    def test_performance_by_show_and_country(self):
+        plan = self.explain(
+            Performance.objects.filter(show=self.show, country=self.sweden)
+        )
+        self.assertIn("performance_show_country_idx", plan)
+
+    def test_performance_by_show_and_running_order(self):
+        plan = self.explain(
+            Performance.objects.filter(show=self.show, running_order__gt=0)
+        )
+        self.assertIn("performance_show_order_idx", plan)
+
+    def test_vote_by_performance_and_type(self):
+        plan = self.explain(
+            Vote.objects.filter(performance=self.performance, vote_type=VoteType.JURY)
+        )
+        self.assertIn("vote_performance_type_idx", plan)
+
+    def test_vote_ranking_contains(self):
+        plan = self.explain(Vote.objects.filter(ranking__contains=["no"]))
+        self.assertIn("vote_ranking_idx", plan)
+
+    def test_edition_year_range(self):
+        plan = self.explain(Edition.objects.filter(year__gte=2010, year__lte=2020))
+        self.assertIn("edition_year_idx", plan)
+
+
+# the listener thread would hold a connection to the test database, which stops it from being dropped
+@override_settings(
+    RESPONSE_CACHE_ENABLED=False, ARRAY_CACHE_ENABLED=False, DATA_VERSION_LISTEN=False
+)
+class ContestTestCase(TestCase):
+    """Two small editions, each with a semi-final and a final, with results calculated"""
+
+    @classmethod
+    def setUpTestData(cls):
+        # two small editions, each with a semi-final and a final
+        codes = ["se", "no", "fi", "dk", "fr", "de"]
+        cls.countries = {
+            code: Country.objects.create(
+                name=code, adjective=code, code=code, is_big_five=code in ["fr", "de"]
+            )
+            for code in codes
+        }
+
+        english = Language.objects.create(name="English")
+        cls.group = Group.objects.create(name="Nordics")
+        cls.group.countries.set(
+            [cls.countries[code] for code in ["se", "no", "fi", "dk"]]
+        )
+
+        shows = []
+
+        for year in [2021, 2022]:
+            edition = Edition.objects.create(
+                year=year, host=cls.countries["se"], city="Stockholm"
+            )
+
+            for code in codes:
+                entry = Entry.objects.create(
+                    title=f"{code} {year}",
+                    artist=code,
+                    country=cls.countries[code],
+                    year=edition,
+                )
+                entry.languages.set([english])
+
+            # the semi-final has the four Nordics competing, with France voting
+            # in the final, Finland and Denmark didn't qualify, so they only vote
+            line_ups = {
+                ShowType["SEMI-FINAL_1"]: {"se": 1, "no": 2, "fi": 3, "dk": 4, "fr": 0},
+                ShowType.GRAND_FINAL: {
+                    "se": 1,
+                    "no": 2,
+                    "fr": 3,
+                    "de": 4,
+                    "fi": 0,
+                    "dk": 0,
+                },
+            }
+
+            for show_type, line_up in line_ups.items():
+                show = Show.objects.create(
+                    edition=edition,
+                    show_type=show_type,
+                    voting_system=[VoteType.JURY, VoteType.TELEVOTE],
+                )
+                shows.append(show)
+
+                competing = [code for code, order in line_up.items() if order > 0]
+
+                for code, order in line_up.items():
+                    performance = Performance.objects.create(
+                        country=cls.countries[code], show=show, running_order=order
+                    )
+
+                    ranking = [other for other in competing if other != code]
+
+                    for vote_type in [VoteType.JURY, VoteType.TELEVOTE]:
+                        Vote.objects.create(
+                            performance=performance,
+                            vote_type=vote_type,
+                            ranking=ranking
+                            if vote_type == VoteType.JURY
+                            else ranking[::-1],
+                        )
+
+        recalculate_shows(shows)
+
+        # nothing commits inside a TestCase, so the data version has to be moved on by hand, past whatever
+        # an earlier test class left in memory (its data was rolled back, but the snapshot it built is still there)
+        DataVersion.objects.update(version=get_data_version())
+
+        with cls.captureOnCommitCallbacks(execute=True):
+            bump_data_version()
+
+        cls.edition = Edition.objects.get(year=2022)
+        cls.show = Show.objects.get(edition=cls.edition, show_type=ShowType.GRAND_FINAL)
+        cls.entry = Entry.objects.get(year=cls.edition, country=cls.countries["se"])
+
+    def post(self, path, body, status=200):
+        response = self.client.post(
+            path, json.dumps(body), content_type="application/json"
+        )
+        self.assertEqual(response.status_code, status)
+
+        return response.json()
+
+
+@override_settings(QUERY_BUDGETS_ENFORCED=True)
+class QueryBudgetTests(ContestTestCase):
+    """
+    Calls every endpoint that has a budget in settings.QUERY_BUDGETS, with the bodies the benchmark uses
+    The middleware raises QueryBudgetExceeded when an endpoint goes over, which fails the test
+    The budgets are exact on this data, so a query added per edition or per country shows up here
+    """
+
+    def test_every_budget_is_exercised(self):
+        self.assertLessEqual(set(settings.QUERY_BUDGETS), set(request_bodies()))
+
+    def test_endpoints_stay_within_budget(self):
+        bodies = request_bodies()
+
+        for name in settings.QUERY_BUDGETS:
+            path, body = bodies[name]
+
+            with self.subTest(name):
+                self.post(path, body)
+
+    def test_one_more_query_goes_over(self):
+        budgets = {**settings.QUERY_BUDGETS, "data-predict-voting-bias": 0}
+        body = {"start_year": 2021, "end_year": 2022, "shows": "all"}
+
+        with override_settings(QUERY_BUDGETS=budgets):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.post("/predict/voting_bias/", {**body, "vote_type": "jury"})
+
+
+class ExchangeTests(ContestTestCase):
+    def test_batch_matches_single_countries(self):
+        for average in [False, True]:
+            body = {
+                "start_year": 2021,
+                "end_year": 2022,
+                "vote_type": "combined",
+                "shows": "all",
+                "average": average,
+            }
+            batch = self.post("/exchanges/get_batch/", {**body, "group": self.group.id})
+
+            self.assertEqual(
+                [x["country"]["code"] for x in batch], ["se", "no", "fi", "dk"]
+            )
+
+            for x in batch:
+                with self.subTest(x["country"]["code"], average=average):
+                    single = {**body, "country": x["country"]["id"]}
+
+                    self.assertEqual(
+                        x["points_from"],
+                        self.post("/exchanges/get_points_from/", single),
+                    )
+                    self.assertEqual(
+                        x["points_to"], self.post("/exchanges/get_points_to/", single)
+                    )
+
+
+class ETagTests(ContestTestCase):
+    def post_with(self, tags):
+        return self.client.post(
+            "/groups/get_all/",
+            "{}",
+            content_type="application/json",
+            HTTP_IF_NONE_MATCH=tags,
+        )
+
+    def test_same_etag_not_modified(self):
+        etag = self.client.post(
+            "/groups/get_all/", "{}", content_type="application/json"
+        )["ETag"]
+
+        self.assertEqual(self.post_with(etag).status_code, 304)
+        self.assertEqual(self.post_with('"other", ' + etag).status_code, 304)
+        self.assertEqual(self.post_with('"other"').status_code, 200)
+
+    def test_wildcard_fails(self):
+        self.assertEqual(self.post_with("*").status_code, 412)
+
+
+class CountryRegistryTests(ContestTestCase):
+    def test_only_rebuilt_when_a_country_changes(self):
+        registry = get_country_registry()
+        vote = Vote.objects.filter(performance__show=self.show).first()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            vote.save()
+
+        self.assertIs(get_country_registry(), registry)
+
+        sweden = self.countries["se"]
+        sweden.name = "Sverige"
+
+        with self.captureOnCommitCallbacks(execute=True):
+            sweden.save()
+
+        self.assertEqual(get_country_registry().payload(sweden.id)["name"], "Sverige")
+
+
+class RecalculationTests(ContestTestCase):
+    def setUp(self):
+        # the votes created in setUpTestData scheduled their shows, but that transaction never commits
+        _pending_shows().clear()
+
+    def vote(self, show, code, vote_type=VoteType.TELEVOTE):
+        return Vote.objects.get(
+            performance__show=show,
+            performance__country=self.countries[code],
+            vote_type=vote_type,
+        )
+
+    def places(self, show):
+        return {
+            result.performance.country.code: result.place
+            for result in Result.objects.filter(performance__show=show)
+        }
+
+    def test_saving_a_vote_recalculates_its_show(self):
+        # Germany and Sweden are level on 98 points (as are France and Norway on 96), the televote settles it
+        self.assertEqual(self.places(self.show), {"de": 1, "se": 2, "fr": 3, "no": 4})
+
+        # Finland's televote goes from Germany first to Sweden first, which moves Germany to last
+        vote = self.vote(self.show, "fi")
+        vote.ranking = ["se", "no", "fr", "de"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            vote.save()
+
+        self.assertEqual(self.places(self.show), {"se": 1, "no": 2, "fr": 3, "de": 4})
+
+    def test_failed_bias_rebuild_keeps_the_old_places(self):
+        # an update skips the signals, so nothing is scheduled behind our back
+        Vote.objects.filter(pk=self.vote(self.show, "fi").pk).update(
+            ranking=["se", "no", "fr", "de"]
+        )
+
+        with mock.patch.object(
+            VotingBias.objects, "rebuild", side_effect=RuntimeError
+        ), self.captureOnCommitCallbacks() as callbacks:
+            with self.assertRaises(RuntimeError):
+                recalculate_shows([self.show])
+
+        self.assertEqual(self.places(self.show), {"de": 1, "se": 2, "fr": 3, "no": 4})
+        self.assertEqual(callbacks, [])
+
+    def test_one_recalculation_per_transaction(self):
+        semi_final = Show.objects.get(
+            edition=self.edition, show_type=ShowType["SEMI-FINAL_1"]
+        )
+
+        with mock.patch(
+            "calculate.recalculate_shows", wraps=recalculate_shows
+        ) as recalculate:
+            with self.captureOnCommitCallbacks(execute=True):
+                with transaction.atomic():
+                    for show in [self.show, semi_final]:
+                        for code in ["fi", "dk"]:
+                            vote = self.vote(show, code)
+                            vote.ranking = vote.ranking[::-1]
+                            vote.save()
+
+        self.assertEqual(recalculate.call_count, 1)
+        self.assertEqual(
+            [show.id for show in recalculate.call_args.args[0]],
+            sorted([self.show.id, semi_final.id]),
+        )
+
+    @override_settings(RESULTS_RECALCULATION_DELAY=5)
+    def test_delayed_recalculation_collects_commits(self):
+        semi_final = Show.objects.get(
+            edition=self.edition, show_type=ShowType["SEMI-FINAL_1"]
+        )
+
+        # the timer is started by hand, so the recalculation happens on this thread (and connection)
+        with mock.patch("calculate.Timer") as timer, mock.patch(
+            "calculate._recalculate_show_ids"
+        ) as recalculate, mock.patch("calculate.connection"):
+            for show in [self.show, semi_final]:
+                with self.captureOnCommitCallbacks(execute=True):
+                    self.vote(show, "fi").save()
+
+            # nothing happens until the delay is up, and the second commit joins the first one's timer
+            recalculate.assert_not_called()
+            self.assertEqual(timer.call_count, 1)
+            self.assertEqual(timer.call_args.args[0], 5)
+
+            timer.call_args.args[1]()
+
+        recalculate.assert_called_once_with({self.show.id, semi_final.id})
+
+    @override_settings(RECALCULATION_MAX_WORKERS=2)
+    def test_workers_are_checked(self):
+        for workers in ["many", -1, 0, 1.5, True, None]:
+            with self.subTest(workers=workers):
+                self.post("/editions/calculate_all_results/", {"workers": workers}, 400)
+
+        # anything over the limit is brought down to it (worker threads can't see the test's transaction,
+        # so the recalculation itself is left out)
+        with mock.patch(
+            "rest.editions.viewset.recalculate_editions", return_value={}
+        ) as recalculate:
+            self.post("/editions/calculate_all_results/", {"workers": 1000})
+
+        self.assertEqual(recalculate.call_args.args[1], 2)
+
+
+class AffinityTests(ContestTestCase):
+    body = {"year": 2022, "start_year": 2021, "end_year": 2021}
+
+    def test_affinity_by_hand(self):
+        result = self.post("/predict/country_affinity/", self.body)["result"]
+
+        # in 2021, Norway, Finland and Denmark gave Sweden 12 jury and 8 televote points, France gave 12 and 7
+        # that's 31 televote points over 4 voters, so the affinities are 12.25, 12.25, 12.25 and 11.25
+        self.assertAlmostEqual(result["se"], 12)
+
+        # Denmark got 8 + 12 three times and 7 + 12 from France, with 48 televote points over 4 voters
+        self.assertAlmostEqual(result["dk"], (8 + 8 + 8 + 7) / 4)
+
+        # France only votes in the semi-final, and Germany goes straight to the final
+        self.assertEqual(sorted(result), ["dk", "fi", "no", "se"])
+
+    def test_years_without_semi_finals(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Edition.objects.create(year=2023, host=self.countries["no"], city="Oslo")
+
+        for year in [2023, 2030]:
+            with self.subTest(year=year):
+                self.assertEqual(
+                    self.post(
+                        "/predict/country_affinity/", {**self.body, "year": year}, 400
+                    ),
+                    {"error": "Nothing to predict"},
+                )
+
+
+class SimilarityTests(ContestTestCase):
+    def test_unknown_mode(self):
+        body = {"start_year": 2021, "end_year": 2022, "mode": "euclidean"}
+
+        for path in [
+            "/similarities/get_similarity/",
+            "/similarities/get_jury_televote_similarity/",
+        ]:
+            with self.subTest(path):
+                self.assertEqual(self.post(path, body, 400), {"error": "Invalid mode"})
+
+
+@override_settings(
+    RESPONSE_CACHE_ENABLED=False, ARRAY_CACHE_ENABLED=False, DATA_VERSION_LISTEN=False
+)
+class PairSimilarityTests(TestCase):
+    """
+    The similarities of get_similarity against the original list-building computation
+    They only look at full rankings (more than 10 countries), so this uses one generated final of 16
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        ContestGenerator(start_year=2021, years=1, countries=16, semis=0).generate()
+
+        # see ContestTestCase
+        DataVersion.objects.update(version=get_data_version())
+
+        with cls.captureOnCommitCallbacks(execute=True):
+            bump_data_version()
+
+    def summed_proportions(self):
+        """
+        For each voter, what its jury and televote ranking proportions (1 for first, 0 for last)
+        add up to for each receiver, in the order of its jury ranking
+        """
+        summed = {}
+
+        for vote in Vote.objects.filter(
+            performance__show__show_type=ShowType.GRAND_FINAL
+        ).order_by("vote_type"):
+            voter = summed.setdefault(vote.performance.country.code, {})
+
+            # summed like the original, since the float rounding decides which totals tie
+            for i, code in enumerate(vote.ranking):
+                proportion = 1 - i / (len(vote.ranking) - 1)
+                voter[code] = voter.get(code, 0) + proportion
+
+        return summed
+
+    def test_pairs_leave_out_their_own_entries(self):
+        summed = self.summed_proportions()
+        body = {"start_year": 2021, "end_year": 2021}
+
+        cosine = self.client.post(
+            "/similarities/get_similarity/",
+            json.dumps({**body, "mode": "cosine"}),
+            content_type="application/json",
+        ).json()["data"]
+        rank = self.client.post(
+            "/similarities/get_similarity/",
+            json.dumps({**body, "mode": "rank"}),
+            content_type="application/json",
+        ).json()["data"]
+
+        pairs = [(a, b) for a in summed for b in summed if a < b]
+        self.assertEqual(len(pairs), 16 * 15 / 2)
+
+        for a, b in pairs:
+            # neither country can rank itself, so both vectors leave out a's and b's entries
+            a_scores = [summed[a][code] for code in summed[a] if code != b]
+            b_scores = [summed[b][code] for code in summed[a] if code != b]
+
+            with self.subTest(a=a, b=b):
+                self.assertAlmostEqual(
+                    cosine[a][b],
+                    np.dot(a_scores, b_scores)
+                    / (np.linalg.norm(a_scores) * np.linalg.norm(b_scores)),
+                    places=12,
+                )
+                self.assertAlmostEqual(
+                    rank[a][b], spearmanr(a_scores, b_scores).statistic, places=12
+                )
+
+
+class SimulationTests(ContestTestCase):
+    body = {
+        "year": 2022,
+        "start_year": 2021,
+        "end_year": 2021,
+        "simulations": 500,
+        "seed": 1,
+        "qualifiers": 2,
+    }
+
+    def setUp(self):
+        # a test that changes the data leaves its snapshot behind once it's rolled back, so start on a new version
+        DataVersion.objects.update(version=get_data_version())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            bump_data_version()
+
+    def test_probabilities_add_up(self):
+        data = self.post("/predict/simulate_contest/", self.body)["data"]
+
+        automatic = [x for x in data if x["automatic"]]
+        self.assertEqual(sorted(x["country"]["code"] for x in automatic), ["de", "fr"])
+        self.assertTrue(all(x["qualify"] == 1 for x in automatic))
+
+        # two of the four semi-finalists qualify each time, and every place in the final is taken once
+        self.assertAlmostEqual(sum(x["qualify"] for x in data if not x["automatic"]), 2)
+
+        for place in range(4):
+            self.assertAlmostEqual(sum(x["places"][place] for x in data), 1)
+
+        for x in data:
+            self.assertAlmostEqual(sum(x["places"]), x["qualify"])
+
+    def test_entries_that_never_perform(self):
+        # Rest of the World only votes, and Serbia and Montenegro 2006 had an entry without a song
+        with self.captureOnCommitCallbacks(execute=True):
+            for code in ["un", "cs"]:
+                country = Country.objects.create(name=code, adjective=code, code=code)
+                Entry.objects.create(
+                    title=None, artist=None, country=country, year=self.edition
+                )
+
+            Performance.objects.create(
+                country=Country.objects.get(code="un"), show=self.show, running_order=0
+            )
+
+        def automatic():
+            data = self.post("/predict/simulate_contest/", self.body)["data"]
+            return sorted(x["country"]["code"] for x in data if x["automatic"])
+
+        # the final's line-up is in
+        self.assertEqual(automatic(), ["de", "fr"])
+
+        # and it isn't, so it comes down to the entries
+        with self.captureOnCommitCallbacks(execute=True):
+            self.show.delete()
+
+        self.assertEqual(automatic(), ["de", "fr"])
+
+    def test_bad_inputs_are_rejected(self):
+        for key, values in {
+            "qualifiers": [-1, 0, 1.5, "2", True],
+            "simulations": [0, 10**9, 100.0, "100"],
+            "seed": [-1, 0.5, "1", None],
+        }.items():
+            for value in values:
+                with self.subTest(key, value=value):
+                    self.post(
+                        "/predict/simulate_contest/", {**self.body, key: value}, 400
+                    )
+
+    @override_settings(SIMULATION_WORKERS=1, SIMULATION_BATCH_SIZE=100)
+    def test_same_seed_same_result(self):
+        first = self.post("/predict/simulate_contest/", self.body)
+
+        # the batches are seeded the same way however many processes they're spread over
+        with override_settings(SIMULATION_WORKERS=2):
+            self.assertEqual(self.post("/predict/simulate_contest/", self.body), first)
+
+        self.assertNotEqual(
+            self.post("/predict/simulate_contest/", {**self.body, "seed": 2}), first
+        )
+
+
+class BacktestTests(ContestTestCase):
+    body = {"start_year": 2021, "end_year": 2022, "window": 1, "simulations": 200}
+
+    def setUp(self):
+        # see SimulationTests.setUp
+        DataVersion.objects.update(version=get_data_version())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            bump_data_version()
+
+    def test_years_without_history_are_skipped(self):
+        report = self.post("/predict/backtest/", self.body)
+
+        self.assertEqual(report["skipped"], [2021])
+        self.assertEqual([x["year"] for x in report["years"]], [2022])
+
+        year = report["years"][0]
+        self.assertIn(year["qualifier_accuracy"], [0, 0.5, 1])
+        self.assertTrue(-1 <= year["final_spearman"] <= 1)
+
+    def test_bad_inputs_are_rejected(self):
+        for key, values in {
+            "window": [0, -3, 1.5, "1", None],
+            "simulations": [0, 10**9, 100.0, "100"],
+            "seed": [-1, "1"],
+            "start_year": ["2021", None],
+        }.items():
+            for value in values:
+                with self.subTest(key, value=value):
+                    self.post("/predict/backtest/", {**self.body, key: value}, 400)
+
+    def test_perfect_prediction_scores_one(self):
+        snapshot = get_snapshot()
+        model, qualifiers, results = Backtest(2022, 2022, 1).prepare(
+            snapshot, PredictViewSet(), 2022
+        )
+
+        # every simulation goes exactly the way the contest did
+        qualified = np.zeros(len(model.candidates), dtype=np.int64)
+        places = np.zeros((len(model.candidates), model.finalists), dtype=np.int64)
+
+        for i, candidate in enumerate(model.candidates.tolist()):
+            if candidate in results:
+                qualified[i] = 1
+                places[i, results[candidate] - 1] = 1
+
+        self.assertEqual(
+            Backtest(2022, 2022, 1).score(
+                model, qualifiers, results, qualified, places
+            ),
+            {"qualifier_accuracy": 1, "final_spearman": 1},
+        )
+
+    def test_entries_that_never_perform(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for code in ["un", "cs"]:
+                country = Country.objects.create(name=code, adjective=code, code=code)
+                Entry.objects.create(
+                    title=None, artist=None, country=country, year=self.edition
+                )
+
+            Performance.objects.create(
+                country=Country.objects.get(code="un"), show=self.show, running_order=0
+            )
+
+        snapshot = get_snapshot()
+        tensor = snapshot.vote_tensor
+        model, qualifiers, results = Backtest(2022, 2022, 1).prepare(
+            snapshot, PredictViewSet(), 2022
+        )
+
+        # only France and Germany go straight to the final, which has the four places it actually had
+        self.assertEqual(
+            sorted(
+                snapshot.countries[tensor.countries[i]].code
+                for i in model.candidates[: model.automatic]
+            ),
+            ["de", "fr"],
+        )
+        self.assertEqual(model.finalists, len(results))
+
+        report = self.post("/predict/backtest/", self.body)["years"][0]
+        self.assertTrue(-1 <= report["final_spearman"] <= 1)
+
+
+class EditionSignalTests(ContestTestCase):
+    def derived_rows(self):
+        return {
+            model.__name__: set(
+                model.objects.filter(year=self.edition.year).values_list("id", "year")
+            )
+            for model in [PointsAwarded, QualificationStatus, VotingBias]
+        }
+
+    def test_other_edits_leave_the_rows_alone(self):
+        before = self.derived_rows()
+
+        self.edition.city = "Malmö"
+        self.edition.save()
+
+        self.assertEqual(self.derived_rows(), before)
+
+    def test_moving_the_year_rebuilds_the_rows(self):
+        self.edition.year = 2023
+        self.edition.save()
+
+        for name, rows in self.derived_rows().items():
+            with self.subTest(name):
+                self.assertTrue(rows)
+
+    def test_fixtures_are_left_alone(self):
+        before = self.derived_rows()
+
+        # loaddata saves like this, and fixtures bring their own rows
+        self.edition.year = 2023
+        self.edition.save_base(raw=True)
+        self.edition.year = 2022
+
+        self.assertEqual(self.derived_rows(), before)
+
+
+class VotingBiasTests(ContestTestCase):
+    def bias(self, year, voter, receiver, vote_type):
+        return VotingBias.objects.get(
+            year=year,
+            show_type=ShowType.GRAND_FINAL,
+            voter=self.countries[voter],
+            receiver=self.countries[receiver],
+            vote_type=vote_type,
+        )
+
+    def test_excess_over_average(self):
+        # Finland's televote has Sweden last of four (7 points), and Sweden got 38 televote points from 5 voters
+        bias = self.bias(2022, "fi", "se", VoteType.TELEVOTE)
+
+        self.assertEqual((bias.points, bias.rank), (7, 4))
+        self.assertAlmostEqual(bias.average, 38 / 5)
+        self.assertAlmostEqual(bias.excess, 7 - 38 / 5)
+
+    def test_recalculating_only_redoes_its_edition(self):
+        untouched = set(
+            VotingBias.objects.filter(year=2021).values_list("id", flat=True)
+        )
+
+        # Finland's televote now puts Sweden first
+        vote = Vote.objects.get(
+            performance__show=self.show,
+            performance__country=self.countries["fi"],
+            vote_type=VoteType.TELEVOTE,
+        )
+        vote.ranking = ["se", "no", "fr", "de"]
+        vote.save()
+        recalculate_shows([self.show])
+
+        self.assertEqual(
+            set(VotingBias.objects.filter(year=2021).values_list("id", flat=True)),
+            untouched,
+        )
+
+        bias = self.bias(2022, "fi", "se", VoteType.TELEVOTE)
+        self.assertEqual(bias.points, 12)
+        self.assertAlmostEqual(bias.average, 43 / 5)
@@ -0,0 +1,64 @@
+from functools import wraps
+
+from django.http import HttpResponse, HttpResponseNotModified
+
+from response_cache import make_key
+from version import get_data_version
+
+
+def if_none_match(request):
+    """The tags in the request's If-None-Match header"""
+    header = request.META.get("HTTP_IF_NONE_MATCH")
+
+    if header is None:
+        return []
+
+    return [tag.strip() for tag in header.split(",")]
+
+
+def matches(request, etag):
+    """True if the client already has the response with this ETag (per its If-None-Match header)"""
+    return etag in if_none_match(request)
+
+
+def etag_response(view):
+    """
+    Tags a view's response with a strong ETag built from the data version, path and request body,
+    and answers with an empty 304 when the client sends that ETag back in If-None-Match
+    "If-None-Match: *" fails with a 412, since there's always a response and these views are all POSTs
+    (a 304 for it is only allowed on GET and HEAD)
+    Like cached_response, this only works for views whose output depends on nothing else, e.g.
+
+    @action(detail=False, methods=["POST"])
+    @etag_response
+    def get_all(self, request):
+    """
+
+    @wraps(view)
+    def wrapper(self, request, *args, **kwargs):
+        key = make_key(request, get_data_version())
+
+        if key is None:
+            return view(self, request, *args, **kwargs)
+
+        etag = f'"{key}"'
+
+        if "*" in if_none_match(request):
+            return HttpResponse(status=412)
+
+        if matches(request, etag):
+            response = HttpResponseNotModified()
+            response["ETag"] = etag
+            return response
+
+        response = view(self, request, *args, **kwargs)
+
+        if response.status_code == 200:
+            response["ETag"] = etag
+
+            # browsers don't cache POST responses on their own, so this is mostly for the client's sake
+            response["Cache-Control"] = "no-cache"
+
+        return response
+
+    return wrapper
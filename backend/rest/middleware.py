@@ -0,0 +1,215 @@
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+from contextlib import contextmanager
+from datetime import datetime
+from threading import local
+from time import perf_counter
+
+from django.conf import settings
+from django.db import connection
+from django.http import HttpResponse
+
+logger = logging.getLogger("instrumentation")
+
+# set (per thread, like connections) while data shared between requests is being loaded
+_shared = local()
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+@contextmanager
+def loading_shared_data():
+    """
+    Marks the queries run inside it as loading data that's shared between requests (the snapshot, the data version)
+    They're counted apart from the endpoint's own queries, since only whichever request finds the data changed runs them
+    """
+    _shared.depth = getattr(_shared, "depth", 0) + 1
+
+    try:
+        yield
+    finally:
+        _shared.depth -= 1
+
+
+class InstrumentationMiddleware:
+    """
+    Measures every request: the number of queries, the time spent in the database and in Python,
+    and the size of the response
+    The numbers go out as a Server-Timing header (so they show up in the browser's network tab)
+    and as one JSON log line on the "instrumentation" logger
+
+    Endpoints can be given a query budget in settings.QUERY_BUDGETS, keyed by URL name
+    (e.g. "data-average-get-average-place"). Going over it logs a warning,
+    or raises QueryBudgetExceeded when settings.QUERY_BUDGETS_ENFORCED is on (as it is in the tests)
+    The queries that load shared data (see loading_shared_data) are logged as shared_queries and don't count
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = 0
+        shared_queries = 0
+        db_time = 0
+
+        def count(execute, sql, params, many, context):
+            nonlocal queries, shared_queries, db_time
+
+            start = perf_counter()
+
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                if getattr(_shared, "depth", 0):
+                    shared_queries += 1
+                else:
+                    queries += 1
+
+                db_time += perf_counter() - start
+
+        start = perf_counter()
+
+        with connection.execute_wrapper(count):
+            response = self.get_response(request)
+
+        total_time = perf_counter() - start
+        python_time = total_time - db_time
+        size = None if response.streaming else len(response.content)
+
+        match = request.resolver_match
+        name = match.url_name if match is not None else None
+
+        response["Server-Timing"] = ", ".join(
+            [
+                f'db;dur={db_time * 1000:.1f};desc="{queries + shared_queries} queries"',
+                f"app;dur={python_time * 1000:.1f}",
+                f"total;dur={total_time * 1000:.1f}",
+            ]
+        )
+
+        logger.info(
+            json.dumps(
+                {
+                    "method": request.method,
+                    "path": request.path,
+                    "endpoint": name,
+                    "status": response.status_code,
+                    "queries": queries,
+                    "shared_queries": shared_queries,
+                    "db_ms": round(db_time * 1000, 1),
+                    "python_ms": round(python_time * 1000, 1),
+                    "total_ms": round(total_time * 1000, 1),
+                    "bytes": size,
+                }
+            )
+        )
+
+        budget = getattr(settings, "QUERY_BUDGETS", {}).get(name)
+
+        if budget is not None and queries > budget:
+            message = f"{name} ran {queries} queries, over its budget of {budget}"
+
+            if getattr(settings, "QUERY_BUDGETS_ENFORCED", False):
+                raise QueryBudgetExceeded(message)
+
+            logger.warning(message)
+
+        return response
+
+
+# where the time in a profile goes, by the file (or name) of each function (the first match wins)
+PROFILE_AREAS = [
+    ("database driver", ["psycopg2"]),
+    ("ORM", [os.path.join("django", "db")]),
+    ("numpy/scipy", ["numpy", "scipy"]),
+    ("DRF", ["rest_framework"]),
+    ("Django", ["django"]),
+    ("app", [str(settings.BASE_DIR)]),
+]
+
+# how many functions the report lists in each table
+PROFILE_TOP = 40
+
+
+def profile_report(profiler):
+    """Returns a text report of a profile: the time in each area, and the top functions by own and total time"""
+    stats = pstats.Stats(profiler)
+    areas = {}
+
+    for (filename, line, function), (_, _, own, _, _) in stats.stats.items():
+        # C functions have no file, but their name says where they're from (e.g. "<method 'execute' of 'psycopg2...")
+        where = filename + function
+        area = next(
+            (name for name, paths in PROFILE_AREAS if any(x in where for x in paths)),
+            "other",
+        )
+        areas[area] = areas.get(area, 0) + own
+
+    out = io.StringIO()
+    out.write(f"total {stats.total_tt * 1000:.1f} ms\n\n")
+
+    for area, own in sorted(areas.items(), key=lambda x: x[1], reverse=True):
+        out.write(f"{area:20} {own * 1000:10.1f} ms\n")
+
+    # the cumulative table is the call tree flattened: the hot loops are the app functions near the top
+    stats.stream = out
+
+    for sort in ["tottime", "cumulative"]:
+        out.write(f"\n\nby {sort}\n")
+        stats.sort_stats(sort).print_stats(PROFILE_TOP)
+
+    return out.getvalue()
+
+
+class ProfilingMiddleware:
+    """
+    Runs a request under cProfile, when settings.PROFILING_ENABLED is on and the request has an X-Profile header
+
+    "X-Profile: inline" answers with the text report instead of the view's response
+    Any other value keeps the response and saves the profile to settings.PROFILING_DIRECTORY,
+    as a .prof file (for snakeviz, gprof2dot, etc.) and a .txt report, named in the X-Profile response header
+    The response cache is skipped for profiled requests, otherwise there would be nothing to profile
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mode = request.headers.get("X-Profile")
+
+        if mode is None or not getattr(settings, "PROFILING_ENABLED", False):
+            return self.get_response(request)
+
+        request.profiling = True
+        profiler = cProfile.Profile()
+        response = profiler.runcall(self.get_response, request)
+        report = profile_report(profiler)
+
+        if mode == "inline":
+            return HttpResponse(report, content_type="text/plain")
+
+        directory = getattr(
+            settings,
+            "PROFILING_DIRECTORY",
+            os.path.join(settings.BASE_DIR, ".profiles"),
+        )
+        os.makedirs(directory, exist_ok=True)
+
+        match = request.resolver_match
+        name = match.url_name if match is not None else "unresolved"
+        name = f"{datetime.now():%Y%m%d-%H%M%S-%f}-{name}"
+
+        profiler.dump_stats(os.path.join(directory, name + ".prof"))
+
+        with open(os.path.join(directory, name + ".txt"), "w") as f:
+            f.write(report)
+
+        response["X-Profile"] = name
+
+        return response
@@ -1,5 +1,6 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
 from functools import reduce
 
 
@@ -19,6 +20,16 @@ ShowType = models.IntegerChoices("ShowType", "SEMI-FINAL_1 SEMI-FINAL_2 GRAND_FI
 VoteType = models.IntegerChoices("VoteType", "JURY TELEVOTE COMBINED")
 
 
+# Enum for how a country got to (or didn't get to) the grand final
+QualificationType = models.IntegerChoices(
+    "QualificationType", "QUALIFIED NON_QUALIFIED AUTO_QUALIFIED HOST DID_NOT_COMPETE"
+)
+
+
+def get_show_label(show_type):
+    return ShowType.choices[show_type - 1][1].lower()
+
+
 def get_vote_label(vote_type):
     return VoteType.choices[vote_type - 1][1].lower()
 
@@ -65,6 +76,9 @@ class Edition(BaseModel):
     )  # TODO make separate field for last year's winner?
     city = models.CharField(max_length=25)
 
+    class Meta(BaseModel.Meta):
+        indexes = [models.Index(fields=["year"], name="edition_year_idx")]
+
     @property
     def final(self):
         return self.show_set.get(show_type=ShowType.GRAND_FINAL)
@@ -120,7 +134,7 @@ class Show(BaseModel):
     )
 
     def get_show_key(self):
-        return ShowType.choices[self.show_type - 1][1].lower()
+        return get_show_label(self.show_type)
 
     def get_primary_vote_type(self):
         return (
@@ -176,6 +190,16 @@ class Performance(BaseModel):
         models.IntegerField()
     )  # nonpositive indicates not competing, only voting
 
+    class Meta(BaseModel.Meta):
+        indexes = [
+            models.Index(
+                fields=["show", "country"], name="performance_show_country_idx"
+            ),
+            models.Index(
+                fields=["show", "running_order"], name="performance_show_order_idx"
+            ),
+        ]
+
 
 class Vote(BaseModel):
     """Votes are the results of a country's jury or televote (or combined vote) in a given show"""
@@ -184,6 +208,15 @@ class Vote(BaseModel):
     performance = models.ForeignKey(Performance, on_delete=models.CASCADE)
     ranking = ArrayField(models.CharField(max_length=2))
 
+    class Meta(BaseModel.Meta):
+        indexes = [
+            models.Index(
+                fields=["performance", "vote_type"], name="vote_performance_type_idx"
+            ),
+            # for ranking__contains lookups
+            GinIndex(fields=["ranking"], name="vote_ranking_idx"),
+        ]
+
     @property
     def edition(self):
         return self.performance.show.edition
@@ -217,3 +250,272 @@ class Result(BaseModel):
         # get the number of countries voting in the show
         show = self.performance.show
         return Country.objects.filter(performance__show=show).count() - 1
+
+
+class PointsAwardedManager(models.Manager):
+    def rebuild(self, votes):
+        """
+        Replaces the rows for the given votes (a queryset) with ones derived from their current rankings
+        This is what keeps the table in line with Vote.ranking, so it should be called whenever votes change
+        """
+        votes = votes.select_related("performance__show__edition")
+        countries = dict(Country.objects.values_list("code", "id"))
+        rows = []
+
+        for vote in votes:
+            show = vote.performance.show
+
+            for i, code in enumerate(vote.ranking):
+                rows.append(
+                    self.model(
+                        vote=vote,
+                        voter_id=vote.performance.country_id,
+                        receiver_id=countries[code],
+                        show=show,
+                        year=show.edition.year,
+                        show_type=show.show_type,
+                        vote_type=vote.vote_type,
+                        points=POINTS_PER_PLACE[i] if i < len(POINTS_PER_PLACE) else 0,
+                        rank=i + 1,
+                    )
+                )
+
+        with transaction.atomic():
+            self.filter(vote__in=votes).delete()
+            self.bulk_create(rows)
+
+
+class PointsAwarded(BaseModel):
+    """
+    PointsAwarded is a flattened copy of Vote.ranking, with one row per country placed in a vote
+    e.g. Sweden's jury giving Norway 8 points in the 2019 Grand Final
+    The show, year and vote type are copied onto each row so exchanges can be added up with one GROUP BY
+    Rows are managed by signals (see signals.py), so they should never be edited by hand
+    """
+
+    vote = models.ForeignKey(Vote, on_delete=models.CASCADE)
+    voter = models.ForeignKey(
+        Country, on_delete=models.CASCADE, related_name="points_given"
+    )
+    receiver = models.ForeignKey(
+        Country, on_delete=models.CASCADE, related_name="points_received"
+    )
+    show = models.ForeignKey(Show, on_delete=models.CASCADE)
+    year = models.IntegerField()
+    show_type = models.IntegerField(choices=ShowType.choices)
+    vote_type = models.IntegerField(choices=VoteType.choices)
+
+    # places outside of POINTS_PER_PLACE are kept with 0 points, so rank comparisons still work
+    points = models.IntegerField()
+    rank = models.IntegerField()
+
+    objects = PointsAwardedManager()
+
+    class Meta(BaseModel.Meta):
+        indexes = [
+            models.Index(
+                fields=["voter", "year", "vote_type"], name="points_voter_year_idx"
+            ),
+            models.Index(
+                fields=["receiver", "year", "vote_type"],
+                name="points_receiver_year_idx",
+            ),
+            models.Index(fields=["year", "show_type"], name="points_year_show_idx"),
+        ]
+
+
+class DataVersion(BaseModel):
+    """
+    A single row counting how many times the contest data has changed (see version.py)
+    Every worker compares it with the version its caches were built from, to know when they're stale
+    """
+
+    version = models.BigIntegerField(default=0)
+
+
+class QualificationStatusManager(models.Manager):
+    def rebuild(self, editions):
+        """
+        Replaces the rows for the given editions (a queryset) with ones worked out from their grand finals
+        This follows Edition.get_qualifier_data and Edition.get_automatic_qualifiers, so it should be called
+        whenever anything they look at changes
+        """
+        performances = (
+            Performance.objects.filter(
+                show__edition__in=editions, show__show_type=ShowType.GRAND_FINAL
+            )
+            .select_related("country", "show__edition")
+            .order_by("id")
+        )
+        rows = []
+
+        for performance in performances:
+            edition = performance.show.edition
+
+            # countries in the final that didn't perform only voted, i.e. they didn't qualify
+            # (except the rest of the world, which never competes at all)
+            if performance.running_order > 0:
+                if performance.country_id == edition.host_id:
+                    status = QualificationType.HOST
+                elif performance.country.is_big_five:
+                    status = QualificationType.AUTO_QUALIFIED
+                else:
+                    status = QualificationType.QUALIFIED
+            elif performance.country.code == "un":
+                status = QualificationType.DID_NOT_COMPETE
+            else:
+                status = QualificationType.NON_QUALIFIED
+
+            rows.append(
+                self.model(
+                    edition=edition,
+                    year=edition.year,
+                    country_id=performance.country_id,
+                    performance=performance,
+                    status=status,
+                )
+            )
+
+        with transaction.atomic():
+            self.filter(edition__in=editions).delete()
+            self.bulk_create(rows)
+
+
+class QualificationStatus(BaseModel):
+    """
+    QualificationStatus records how each country in an edition's grand final got there
+    e.g. Sweden qualified in 2019, Italy auto-qualified in 2019, Israel hosted in 2019
+    Countries that voted in the final without performing are non-qualifiers
+    Rows are managed by signals (see signals.py), so they should never be edited by hand
+    """
+
+    edition = models.ForeignKey(Edition, on_delete=models.CASCADE)
+    year = models.IntegerField()
+    country = models.ForeignKey(Country, on_delete=models.CASCADE)
+
+    # the country's performance in the final
+    performance = models.ForeignKey(Performance, on_delete=models.CASCADE)
+
+    status = models.IntegerField(choices=QualificationType.choices)
+
+    objects = QualificationStatusManager()
+
+    class Meta(BaseModel.Meta):
+        indexes = [
+            models.Index(fields=["year", "status"], name="qualification_year_idx"),
+            models.Index(fields=["country", "year"], name="qualification_country_idx"),
+        ]
+
+
+class VotingBiasManager(models.Manager):
+    def rebuild(self, editions):
+        """
+        Replaces the rows for the given editions (a queryset) with ones worked out from their votes and results
+        Results are recalculated in bulk, so this is called by calculate.recalculate_shows rather than by a signal
+        """
+        shows = {
+            show.id: show
+            for show in Show.objects.filter(edition__in=editions).select_related(
+                "edition"
+            )
+        }
+        show_performances = {id: [] for id in shows}
+
+        for performance in Performance.objects.filter(show__in=shows).order_by("id"):
+            show_performances[performance.show_id].append(performance)
+
+        results = {
+            result.performance_id: result
+            for result in Result.objects.filter(performance__show__in=shows)
+        }
+        countries = dict(Country.objects.values_list("code", "id"))
+        votes = Vote.objects.filter(performance__show__in=shows).select_related(
+            "performance"
+        )
+        rows = []
+
+        for vote in votes:
+            show = shows[vote.performance.show_id]
+            performances = show_performances[show.id]
+            places = {countries[code]: i for i, code in enumerate(vote.ranking)}
+
+            for performance in performances:
+                if (
+                    performance.running_order <= 0
+                    or performance.country_id == vote.performance.country_id
+                ):
+                    continue
+
+                # the receiver's total in this kind of vote, which isn't there until the results are calculated
+                result = results.get(performance.id)
+                total = getattr(result, get_vote_label(vote.vote_type), None)
+
+                if total is None:
+                    continue
+
+                place = places.get(performance.country_id)
+                points = (
+                    POINTS_PER_PLACE[place]
+                    if place is not None and place < len(POINTS_PER_PLACE)
+                    else 0
+                )
+                average = total / (len(performances) - 1)
+
+                rows.append(
+                    self.model(
+                        edition=show.edition,
+                        show=show,
+                        year=show.edition.year,
+                        show_type=show.show_type,
+                        vote_type=vote.vote_type,
+                        voter_id=vote.performance.country_id,
+                        receiver_id=performance.country_id,
+                        points=points,
+                        rank=None if place is None else place + 1,
+                        average=average,
+                        excess=points - average,
+                    )
+                )
+
+        with transaction.atomic():
+            self.filter(edition__in=editions).delete()
+            self.bulk_create(rows, batch_size=5000)
+
+
+class VotingBias(BaseModel):
+    """
+    VotingBias is how many points a voter gave a receiver in a vote, over what the receiver's entry got on average
+    e.g. Norway's televote giving Sweden 12 points in the 2023 first semi-final, when Sweden averaged 7.5 per voter
+    There's a row for every competitor in every vote, ranked or not, so any range of years can be added up
+    without going back to the votes. Rows are rebuilt an edition at a time, so they should never be edited by hand
+    """
+
+    edition = models.ForeignKey(Edition, on_delete=models.CASCADE)
+    show = models.ForeignKey(Show, on_delete=models.CASCADE)
+    year = models.IntegerField()
+    show_type = models.IntegerField(choices=ShowType.choices)
+    vote_type = models.IntegerField(choices=VoteType.choices)
+
+    voter = models.ForeignKey(
+        Country, on_delete=models.CASCADE, related_name="biases_given"
+    )
+    receiver = models.ForeignKey(
+        Country, on_delete=models.CASCADE, related_name="biases_received"
+    )
+
+    points = models.IntegerField()
+
+    # None if the voter didn't rank the receiver at all (only the top ten are known for older votes)
+    rank = models.IntegerField(null=True, blank=True)
+
+    # the receiver's points in this kind of vote, divided by the number of other countries in the show
+    average = models.FloatField()
+    excess = models.FloatField()
+
+    objects = VotingBiasManager()
+
+    class Meta(BaseModel.Meta):
+        indexes = [
+            models.Index(fields=["year", "show_type"], name="bias_year_show_idx"),
+            models.Index(fields=["voter", "receiver"], name="bias_pair_idx"),
+        ]
@@ -0,0 +1,188 @@
+import hashlib
+import os
+from collections import OrderedDict
+from functools import wraps
+from json import dumps, loads
+from threading import get_ident, Lock
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.module_loading import import_string
+
+from version import get_data_version
+
+
+class MemoryBackend:
+    """Keeps responses in a dict in this process, dropping the least recently used past max_entries"""
+
+    def __init__(self, max_entries=512, **kwargs):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = Lock()
+
+    def get(self, key):
+        with self.lock:
+            body = self.entries.get(key)
+
+            if body is not None:
+                self.entries.move_to_end(key)
+
+            return body
+
+    def set(self, key, body):
+        with self.lock:
+            self.entries[key] = body
+            self.entries.move_to_end(key)
+
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class FileBackend:
+    """
+    Keeps responses as files in a directory, so they survive restarts and can be shared by workers on one machine
+    A file's modification time is bumped whenever it's read, so the oldest ones are the least recently used
+    """
+
+    def __init__(self, max_entries=512, directory=None, **kwargs):
+        self.max_entries = max_entries
+        self.directory = directory or os.path.join(settings.BASE_DIR, ".response_cache")
+        self.lock = Lock()
+
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, key):
+        path = self.path(key)
+
+        try:
+            with open(path, "rb") as file:
+                body = file.read()
+
+            os.utime(path)
+            return body
+
+        # the file may have been evicted by another worker in the meantime
+        except FileNotFoundError:
+            return None
+
+    def set(self, key, body):
+        # write to a temporary file first (one per thread), so that nobody ever reads half a response
+        path = self.path(key)
+        temp = f"{path}.{os.getpid()}.{get_ident()}.tmp"
+
+        with open(temp, "wb") as file:
+            file.write(body)
+
+        os.replace(temp, path)
+
+        with self.lock:
+            self.evict()
+
+    def evict(self):
+        entries = [
+            entry
+            for entry in os.scandir(self.directory)
+            if not entry.name.endswith(".tmp")
+        ]
+
+        if len(entries) <= self.max_entries:
+            return
+
+        entries.sort(key=lambda x: x.stat().st_mtime)
+
+        for entry in entries[: len(entries) - self.max_entries]:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+    def clear(self):
+        for entry in os.scandir(self.directory):
+            os.remove(entry.path)
+
+
+_backend = None
+_backend_lock = Lock()
+
+
+def get_backend():
+    """Returns the backend set up in settings.RESPONSE_CACHE, creating it on first use"""
+    global _backend
+
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                options = dict(getattr(settings, "RESPONSE_CACHE", {}))
+                backend = import_string(
+                    options.pop("BACKEND", "response_cache.MemoryBackend")
+                )
+                _backend = backend(
+                    **{key.lower(): value for key, value in options.items()}
+                )
+
+    return _backend
+
+
+def make_key(request, version):
+    """
+    Builds a cache key out of the path, the data version and the request body
+    The body is parsed and dumped again with sorted keys, so the same filters always give the same key
+    Returns None if the body isn't JSON, since then we can't say which requests are the same
+    """
+    try:
+        body = loads(request.body or "{}")
+    except ValueError:
+        return None
+
+    canonical = dumps(body, sort_keys=True, separators=(",", ":"))
+    key = f"{request.method}\n{request.get_full_path()}\n{version}\n{canonical}"
+
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def cached_response(view):
+    """
+    Caches the JSON a view returns, for views whose output only depends on the path, body and data
+    Goes between @action and the method, e.g.
+
+    @action(detail=False, methods=["POST"])
+    @cached_response
+    def get_average_place(self, request):
+    """
+
+    @wraps(view)
+    def wrapper(self, request, *args, **kwargs):
+        # a profiled request has to do the work to be worth profiling (see middleware.ProfilingMiddleware)
+        if getattr(settings, "RESPONSE_CACHE_ENABLED", True) is False or getattr(
+            request, "profiling", False
+        ):
+            return view(self, request, *args, **kwargs)
+
+        # we take the version before doing any work, so if the data changes while we're working
+        # the response is stored under the old version and never handed out again
+        key = make_key(request, get_data_version())
+
+        if key is None:
+            return view(self, request, *args, **kwargs)
+
+        backend = get_backend()
+        body = backend.get(key)
+
+        if body is not None:
+            return HttpResponse(body, content_type="application/json")
+
+        response = view(self, request, *args, **kwargs)
+
+        if response.status_code == 200 and not response.streaming:
+            backend.set(key, response.content)
+
+        return response
+
+    return wrapper
@@ -1,23 +1,19 @@
 from django.http import JsonResponse
 from json import loads
+import numpy as np
 from rest_framework import viewsets
 from rest_framework.decorators import action
 
 from models import (
-    Country,
-    Edition,
     get_vote_index,
     get_vote_label,
-    Performance,
-    POINTS_PER_PLACE,
-    Result,
-    Show,
-    ShowType,
-    Vote,
     VoteType,
 )
 
-from rest.countries.viewset import CountrySerializer
+from rest.countries.registry import get_country_registry
+from snapshot import get_snapshot
+from etags import etag_response
+from response_cache import cached_response
 
 
 # TODO ignore noncompeting countries
@@ -30,9 +26,8 @@ class AverageViewset(viewsets.GenericViewSet):
         if not (data["mode"] == "final" or data["mode"] == "semi"):
             return
 
-        editions = Edition.objects.filter(
-            year__gte=data["start_year"], year__lte=data["end_year"]
-        )
+        snapshot = get_snapshot()
+        editions = snapshot.editions_between(data["start_year"], data["end_year"])
 
         # get the average points for each country
         # we use a dict with a country as a key, and a list of [points, num_editions] as a value
@@ -40,12 +35,7 @@ class AverageViewset(viewsets.GenericViewSet):
         averages = {}
 
         for edition in editions:
-            if data["mode"] == "final":
-                shows = edition.show_set.filter(show_type=ShowType.GRAND_FINAL)
-            else:
-                shows = edition.show_set.exclude(show_type=ShowType.GRAND_FINAL)
-
-            for show in shows:
+            for show in snapshot.shows_in(edition, data["mode"]):
                 # find the key for the points given the voting system
                 if data["vote_type"] == get_vote_label(VoteType.COMBINED):
                     key = get_vote_label(show.get_primary_vote_type())
@@ -56,15 +46,14 @@ class AverageViewset(viewsets.GenericViewSet):
                     key = data["vote_type"]
 
                 if data["mode"] == "final":
-                    performances = show.performance_set.all()
-
                     # remove NQs if we are not accounting for them
-                    if not data["include_nq"]:
-                        performances = performances.filter(running_order__gt=0)
+                    performances = snapshot.performances_in(
+                        show, competing=None if data["include_nq"] else True
+                    )
                 else:
-                    performances = show.performance_set.filter(running_order__gt=0)
+                    performances = snapshot.performances_in(show, competing=True)
 
-                show_maximum = show.get_maximum_possible()
+                show_maximum = snapshot.maximum_possible(show)
 
                 for performance in performances:
                     if not performance.country in averages:
@@ -76,7 +65,7 @@ class AverageViewset(viewsets.GenericViewSet):
                         averages[performance.country][1] += 1
 
                     else:
-                        result = Result.objects.get(performance=performance)
+                        result = snapshot.result(performance)
 
                         # add points to tally and increment number of editions
                         toAdd = getattr(result, key, 0)
@@ -102,10 +91,11 @@ class AverageViewset(viewsets.GenericViewSet):
             averages[country] = averages[country][0] / averages[country][1]
 
         # convert dict into list sorted by the average we just calculated
+        countries = get_country_registry()
         lst = sorted(averages.items(), key=lambda x: x[1], reverse=True)
         lst = [
             {
-                "country": CountrySerializer(x[0]).data,
+                "country": countries.payload(x[0].id),
                 "result": x[1],
             }
             for x in lst
@@ -118,69 +108,33 @@ class AverageViewset(viewsets.GenericViewSet):
         Returns the average number of countries that gave points to each other country.
         """
 
-        editions = Edition.objects.filter(
-            year__gte=data["start_year"], year__lte=data["end_year"]
-        )
-
-        # keys are countries, values are [total number of countries that gave them points in a year, number of appearances]
-        averages = {}
-
-        for edition in editions:
-            shows = edition.show_set.all()
-
-            if data["mode"] == "final":
-                shows = shows.filter(show_type=ShowType.GRAND_FINAL)
-            elif data["mode"] == "semi":
-                shows = shows.exclude(show_type=ShowType.GRAND_FINAL)
-
-            for show in shows:
-                # we make a dict with countries as keys and sets of countries that gave them points as values
-                show_dict = {}
-                performances = show.performance_set.all()
-
-                # add all competitors here in case some don't get points
-                competitors = performances.filter(running_order__gt=0)
-
-                for competitor in competitors:
-                    show_dict[competitor.country.code] = set()
-
-                votes = Vote.objects.filter(performance__in=performances)
-
-                # filter votes by vote type if needed
-                if data["vote_type"] != get_vote_label(VoteType.COMBINED):
-                    index = get_vote_index(data["vote_type"])
-                    votes = votes.filter(vote_type=index)
-
-                for vote in votes:
-                    voter = vote.performance.country
-
-                    for i in range(min(len(vote.ranking), len(POINTS_PER_PLACE))):
-                        votee = vote.ranking[i]
-                        show_dict[votee].add(voter)
+        snapshot = get_snapshot()
+        tensor = snapshot.vote_tensor
 
-                # now, we add the data from this edition to the averages dict
-                max_voters = performances.count() - 1
+        shows = tensor.show_mask(data["start_year"], data["end_year"], data["mode"])
+        competing = tensor.competing[shows]
 
-                for country in show_dict:
-                    if country not in averages:
-                        averages[country] = [0, 0]
+        # for every show, the number of countries that gave each country points (in any of the chosen vote types)
+        points = tensor.points[shows][:, :, tensor.vote_types(data["vote_type"])]
+        givers = (points > 0).any(axis=2).sum(axis=1)
 
-                    toAdd = (
-                        len(show_dict[country]) / max_voters
-                        if data["proportional"]
-                        else len(show_dict[country])
-                    )
+        if data["proportional"]:
+            max_voters = tensor.present[shows].sum(axis=1) - 1
+            givers = givers / max_voters[:, np.newaxis]
 
-                    averages[country][0] += toAdd
-                    averages[country][1] += 1
+        # only competitors count, but they count even when nobody gave them points
+        totals = np.where(competing, givers, 0).sum(axis=0)
+        appearances = competing.sum(axis=0)
 
         # calculate the average number of countries that gave points to each country
+        countries = get_country_registry()
         lst = [
             {
-                "country": CountrySerializer(Country.objects.get(code=country)).data,
-                "result": averages[country][0] / averages[country][1],
+                "country": countries.payload(id),
+                "result": totals[i] / appearances[i],
             }
-            for country in averages
+            for i, id in enumerate(tensor.countries)
+            if appearances[i] > 0
         ]
 
         lst = sorted(lst, key=lambda x: x["result"], reverse=True)
@@ -188,6 +142,8 @@ class AverageViewset(viewsets.GenericViewSet):
         return lst
 
     @action(detail=False, methods=["POST"])
+    @etag_response
+    @cached_response
     def get_average_point_giver_count(self, request):
         lst = self.calculate_average_point_giver_count(
             {
@@ -203,6 +159,8 @@ class AverageViewset(viewsets.GenericViewSet):
 
     # TODO make this less unwieldy
     @action(detail=False, methods=["POST"])
+    @etag_response
+    @cached_response
     def get_average_performance(self, request):
         """
         This function calculates the average performance of a country in a way that is adjusted
@@ -215,18 +173,19 @@ class AverageViewset(viewsets.GenericViewSet):
         vote_type = request.data.get("vote_type", get_vote_label(VoteType.COMBINED))
 
         # begin by getting all of our editions
-        editions = Edition.objects.filter(
-            year__gte=request.data["start_year"], year__lte=request.data["end_year"]
+        snapshot = get_snapshot()
+        editions = snapshot.editions_between(
+            request.data["start_year"], request.data["end_year"]
         )
 
         # keys are countries, values are [sum of proportions, number of appearances]
         averages = {}
 
         for edition in editions:
-            if edition.show_set.count() == 0:
+            if len(snapshot.shows_in(edition)) == 0:
                 continue
 
-            final = edition.show_set.get(show_type=ShowType.GRAND_FINAL)
+            final = snapshot.final(edition)
 
             # find the key for the points given the voting system
             if vote_type == get_vote_label(VoteType.COMBINED):
@@ -239,7 +198,7 @@ class AverageViewset(viewsets.GenericViewSet):
 
             # we need to make sure the semis have the vote type as well
             if vote_type != get_vote_label(VoteType.COMBINED):
-                semis = edition.show_set.exclude(show_type=ShowType.GRAND_FINAL)
+                semis = snapshot.shows_in(edition, "semi")
 
                 exit = False
 
@@ -250,33 +209,35 @@ class AverageViewset(viewsets.GenericViewSet):
                 if exit:
                     continue
 
-            performances = final.performance_set.all()
-
-            q_performances = performances.filter(running_order__gt=0)
-            gf_results = Result.objects.filter(performance__in=q_performances)
-            # result_set?
+            q_performances = snapshot.performances_in(final, competing=True)
+            gf_results = snapshot.results_of(q_performances)
 
             # array elements have form [country, bad_aq]
             # bad_aq is true iff the AQ did not place above any non-AQs
             # indices are place - 1
-            places = [None] * gf_results.count()
+            places = [None] * len(gf_results)
 
             for result in gf_results:
                 place = result.get_place(place_key)
                 places[place - 1] = [result.performance.country, False]
 
             #  get the NQing countries from the final
-            nq_countries = performances.filter(running_order__lte=0).values_list(
-                "country", flat=True
-            )
+            nq_countries = [
+                performance.country_id
+                for performance in snapshot.performances_in(final, competing=False)
+            ]
 
             # then, get their performances
-            nqs = Performance.objects.filter(
-                show__edition=edition, country__in=nq_countries, running_order__gt=0
-            )
+            nqs = [
+                performance
+                for performance in snapshot.edition_performances(
+                    edition, competing=True
+                )
+                if performance.country_id in nq_countries
+            ]
 
             # then, get the results of those performances
-            nq_results = Result.objects.filter(performance__in=nqs)
+            nq_results = snapshot.results_of(nqs)
 
             # get proportion of maximum points for each NQ
             nq_data = [
@@ -288,7 +249,7 @@ class AverageViewset(viewsets.GenericViewSet):
                         if place_key == VoteType.COMBINED
                         else get_vote_label(place_key),
                     )
-                    / result.performance.show.get_maximum_possible(),
+                    / snapshot.maximum_possible(result.performance.show),
                 ]
                 for result in nq_results
             ]
@@ -304,8 +265,8 @@ class AverageViewset(viewsets.GenericViewSet):
             # for almost all, this is just total number of participants
             # for poorly performing AQs, it is number of finalists
 
-            aq_index = gf_results.count() - 1
-            auto_qualifiers = edition.get_automatic_qualifiers()
+            aq_index = len(gf_results) - 1
+            auto_qualifiers = snapshot.automatic_qualifiers(edition)
 
             # get all the AQs that did not place above any NQs and mark them as "bad" AQs
             while places[aq_index][0].id in auto_qualifiers:
@@ -313,11 +274,11 @@ class AverageViewset(viewsets.GenericViewSet):
                 aq_index -= 1
 
             # this is the total number of participants
-            total_participants = edition.entry_set.count()
+            total_participants = len(snapshot.edition_entries[edition.id])
 
             # add our data from this edition to the dict
             for i in range(len(places)):
-                denominator = gf_results.count() if places[i][1] else total_participants
+                denominator = len(gf_results) if places[i][1] else total_participants
 
                 if not places[i][0] in averages:
                     averages[places[i][0]] = [0, 0]
@@ -325,9 +286,10 @@ class AverageViewset(viewsets.GenericViewSet):
                 averages[places[i][0]][0] += 1 - (i / (denominator - 1))
                 averages[places[i][0]][1] += 1
 
+        countries = get_country_registry()
         lst = [
             {
-                "country": CountrySerializer(country).data,
+                "country": countries.payload(country.id),
                 "result": averages[country][0] / averages[country][1],
             }
             for country in averages
@@ -339,6 +301,8 @@ class AverageViewset(viewsets.GenericViewSet):
 
     # TODO see if we can unify include_nq
     @action(detail=False, methods=["POST"])
+    @etag_response
+    @cached_response
     def get_average_final_points(self, request):
         vote_type = request.data.get("vote_type", get_vote_label(VoteType.COMBINED))
 
@@ -356,6 +320,8 @@ class AverageViewset(viewsets.GenericViewSet):
         return JsonResponse(lst, safe=False)
 
     @action(detail=False, methods=["POST"])
+    @etag_response
+    @cached_response
     def get_average_semi_points(self, request):
         vote_type = request.data.get("vote_type", get_vote_label(VoteType.COMBINED))
 
@@ -377,6 +343,8 @@ class AverageViewset(viewsets.GenericViewSet):
     # North Macedonia received 76 points in semi 2 (15.8% of the maximum 480), so
     # we say that Croatia placed higher despite receiving fewer points
     @action(detail=False, methods=["POST"])
+    @etag_response
+    @cached_response
     def get_average_place(self, request):
         # get the start and end years from the request
         data = loads(request.body)
@@ -387,7 +355,8 @@ class AverageViewset(viewsets.GenericViewSet):
         # If include_nq is true, we include non-qualifying performances in the ranking, otherwise we ignore them
         include_nq = data.get("include_nq", True)
 
-        editions = Edition.objects.filter(year__gte=start_year, year__lte=end_year)
+        snapshot = get_snapshot()
+        editions = snapshot.editions_between(start_year, end_year)
 
         # get the average places for each country
         # we use a dict with a country as a key, and a list of [sum_of_places, num_editions] as a value
@@ -395,10 +364,10 @@ class AverageViewset(viewsets.GenericViewSet):
         averages = {}
 
         for edition in editions:
-            if edition.show_set.count() == 0:
+            if len(snapshot.shows_in(edition)) == 0:
                 continue
 
-            final = edition.show_set.get(show_type=ShowType.GRAND_FINAL)
+            final = snapshot.final(edition)
 
             # find the key for the points given the voting system
             if data["vote_type"] == get_vote_label(VoteType.COMBINED):
@@ -413,7 +382,7 @@ class AverageViewset(viewsets.GenericViewSet):
             if data["include_nq"] and data["vote_type"] != get_vote_label(
                 VoteType.COMBINED
             ):
-                semis = edition.show_set.exclude(show_type=ShowType.GRAND_FINAL)
+                semis = snapshot.shows_in(edition, "semi")
 
                 exit = False
 
@@ -424,10 +393,8 @@ class AverageViewset(viewsets.GenericViewSet):
                 if exit:
                     continue
 
-            performances = final.performance_set.all()
-
-            q_performances = performances.filter(running_order__gt=0)
-            gf_results = Result.objects.filter(performance__in=q_performances)
+            q_performances = snapshot.performances_in(final, competing=True)
+            gf_results = snapshot.results_of(q_performances)
 
             for result in gf_results:
                 if not result.performance.country in averages:
@@ -439,17 +406,22 @@ class AverageViewset(viewsets.GenericViewSet):
 
             if include_nq:
                 # first, get the NQing countries from the final
-                nq_countries = performances.filter(running_order__lte=0).values_list(
-                    "country", flat=True
-                )
+                nq_countries = [
+                    performance.country_id
+                    for performance in snapshot.performances_in(final, competing=False)
+                ]
 
                 # then, get their performances
-                nqs = Performance.objects.filter(
-                    show__edition=edition, country__in=nq_countries, running_order__gt=0
-                )
+                nqs = [
+                    performance
+                    for performance in snapshot.edition_performances(
+                        edition, competing=True
+                    )
+                    if performance.country_id in nq_countries
+                ]
 
                 # then, get the results of those performances
-                nq_results = Result.objects.filter(performance__in=nqs)
+                nq_results = snapshot.results_of(nqs)
 
                 # get proportion of maximum points for each NQ
                 nq_data = [
@@ -463,7 +435,7 @@ class AverageViewset(viewsets.GenericViewSet):
                             if place_key == VoteType.COMBINED
                             else get_vote_label(place_key),
                         )
-                        / result.performance.show.get_maximum_possible(),
+                        / snapshot.maximum_possible(result.performance.show),
                     ]
                     for result in nq_results
                 ]
@@ -471,7 +443,7 @@ class AverageViewset(viewsets.GenericViewSet):
                 # order our NQs by proportion of maximum points
                 nq_data = sorted(nq_data, key=lambda x: x[1], reverse=True)
 
-                starting_place = gf_results.count() + 1
+                starting_place = len(gf_results) + 1
 
                 for i in range(len(nq_data)):
                     country = nq_data[i][0]
@@ -488,10 +460,11 @@ class AverageViewset(viewsets.GenericViewSet):
             averages[country] = averages[country][0] / averages[country][1]
 
         # convert dict into list sorted by the average we just calculated
+        countries = get_country_registry()
         lst = sorted(averages.items(), key=lambda x: x[1])
         lst = [
             {
-                "country": CountrySerializer(x[0]).data,
+                "country": countries.payload(x[0].id),
                 "result": x[1],
             }
             for x in lst
@@ -501,6 +474,8 @@ class AverageViewset(viewsets.GenericViewSet):
 
     # Gets the average place of a country in the Semi-Finals over a given range of years
     @action(detail=False, methods=["POST"])
+    @etag_response
+    @cached_response
     def get_average_semi_place(self, request):
         data = loads(request.body)
 
@@ -509,11 +484,8 @@ class AverageViewset(viewsets.GenericViewSet):
         end_year = data.get("end_year")
         vote_type = data.get("vote_type", get_vote_label(VoteType.COMBINED))
 
-        editions = Edition.objects.filter(year__gte=start_year, year__lte=end_year)
-
-        shows = Show.objects.filter(edition__in=editions).exclude(
-            show_type=ShowType.GRAND_FINAL
-        )
+        snapshot = get_snapshot()
+        shows = snapshot.shows_between(start_year, end_year, "semi")
 
         # get the average places for each country
         # we use a dict with a country as a key, and a list of [sum_of_places, num_editions] as a value
@@ -530,12 +502,10 @@ class AverageViewset(viewsets.GenericViewSet):
 
                 place_key = get_vote_index(data["vote_type"])
 
-            performances = show.performance_set.all()
-
             # remove auto-qualifiers who are only voting and not performing
-            performances = performances.filter(running_order__gt=0)
+            performances = snapshot.performances_in(show, competing=True)
 
-            results = Result.objects.filter(performance__in=performances)
+            results = snapshot.results_of(performances)
 
             for result in results:
                 if not result.performance.country in averages:
@@ -551,10 +521,11 @@ class AverageViewset(viewsets.GenericViewSet):
             averages[country] = averages[country][0] / averages[country][1]
 
         # convert dict into list sorted by the average we just calculated
+        countries = get_country_registry()
         lst = sorted(averages.items(), key=lambda x: x[1])
         lst = [
             {
-                "country": CountrySerializer(x[0]).data,
+                "country": countries.payload(x[0].id),
                 "result": x[1],
             }
             for x in lst
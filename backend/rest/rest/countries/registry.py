@@ -0,0 +1,81 @@
+from threading import Lock
+
+from snapshot import get_snapshot
+
+
+def country_fields(countries):
+    """The serialized fields of every country, to tell whether a registry is still up to date"""
+    # the viewsets import this module, so we can only pull in the serializer once we need it
+    from rest.countries.viewset import CountrySerializer
+
+    fields = CountrySerializer.Meta.fields
+
+    return tuple(
+        tuple(getattr(country, field) for field in fields)
+        for country in countries.values()
+    )
+
+
+class CountryRegistry:
+    """
+    Maps country codes <-> ids <-> serialized country payloads, so we never have to run
+    Country.objects.get inside a loop just to turn a code from a ranking into something we can return.
+    """
+
+    def __init__(self, countries):
+        from rest.countries.viewset import CountrySerializer
+
+        # a dict of id -> Country, e.g. a snapshot's
+        self.countries = countries
+        self.fields = country_fields(countries)
+
+        self.ids = {country.code: id for id, country in self.countries.items()}
+        self.codes = {id: country.code for id, country in self.countries.items()}
+
+        # we serialize every country once up front, since the same handful of payloads get returned over and over
+        self.payloads = {
+            id: dict(CountrySerializer(country).data)
+            for id, country in self.countries.items()
+        }
+
+    def id_of(self, code):
+        return self.ids[code]
+
+    def code_of(self, id):
+        return self.codes[id]
+
+    def payload(self, id):
+        """Returns the same data as CountrySerializer(country).data for the country with the given id"""
+        return self.payloads[id]
+
+    def payload_for_code(self, code):
+        return self.payloads[self.ids[code]]
+
+
+_registry = None
+_registry_countries = None
+_lock = Lock()
+
+
+def get_country_registry() -> CountryRegistry:
+    """
+    Returns the registry of the snapshot's countries
+    Most data changes don't touch the countries, so the registry is only rebuilt when one of them changed
+    """
+    global _registry, _registry_countries
+
+    countries = get_snapshot().countries
+    registry = _registry
+
+    if countries is not _registry_countries:
+        with _lock:
+            registry = _registry
+
+            if countries is not _registry_countries:
+                if registry is None or registry.fields != country_fields(countries):
+                    registry = CountryRegistry(countries)
+                    _registry = registry
+
+                _registry_countries = countries
+
+    return registry
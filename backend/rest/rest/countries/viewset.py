@@ -3,6 +3,7 @@ from json import loads
 from models import Country
 from rest_framework import viewsets, serializers
 from rest_framework.decorators import action
+from etags import etag_response
 
 from models import Entry
 from rest.entries.viewset import EntrySerializer
@@ -21,11 +22,13 @@ class CountryViewSet(viewsets.ModelViewSet):
         return JsonResponse(CountrySerializer(self.get_object()).data, safe=False)
     
     @action(detail=False, methods=['POST'])
+    @etag_response
     def get_all(self, request):
         set = Country.objects.all()
         return JsonResponse(CountrySerializer(set, many=True).data, safe=False)
     
     @action(detail=True, methods=['POST'])
+    @etag_response
     def get_entries(self, request, pk=None):
         country = self.get_object()
         #get all entries for this country
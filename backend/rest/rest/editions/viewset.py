@@ -1,8 +1,12 @@
+from django.conf import settings
 from django.http import JsonResponse
+from json import loads
 from math import floor
 from rest_framework import serializers, viewsets
 from rest_framework.decorators import action
 
+from calculate import recalculate_edition, recalculate_editions
+from etags import etag_response
 from rest.entries.viewset import EntrySerializer
 from models import Edition, Entry, ShowType
 
@@ -17,12 +21,14 @@ class EditionViewSet(viewsets.ModelViewSet):
     queryset = Edition.objects.all()
 
     @action(detail=False, methods=["POST"])
+    @etag_response
     def get_all(self, request):
         return JsonResponse(
             EditionSerializer(self.queryset, many=True).data, safe=False
         )
 
     @action(detail=True, methods=["POST"])
+    @etag_response
     def get_entries(self, request, pk=None):
         edition = self.get_object()
 
@@ -31,6 +37,43 @@ class EditionViewSet(viewsets.ModelViewSet):
 
         return JsonResponse(EntrySerializer(entries, many=True).data, safe=False)
 
+    @action(detail=True, methods=["POST"])
+    def calculate_results(self, request, pk=None):
+        """
+        Recalculates the results of every show in the edition
+        Returns the standings of each show, keyed by show id
+        """
+        edition = self.get_object()
+
+        return JsonResponse(recalculate_edition(edition), safe=False)
+
+    @action(detail=False, methods=["POST"])
+    def calculate_all_results(self, request):
+        """
+        Recalculates the results of every show in every edition, one transaction per edition
+        An optional "workers" in the body runs that many editions at once (at most settings.RECALCULATION_MAX_WORKERS,
+        since each of them holds a database connection)
+        Returns the number of shows recalculated in each year
+        """
+        try:
+            workers = loads(request.body or "{}").get("workers", 1)
+            workers = int(workers) if not isinstance(workers, (bool, float)) else None
+        except (AttributeError, TypeError, ValueError):
+            workers = None
+
+        if workers is None or workers < 1:
+            return JsonResponse(
+                {"error": "workers must be a whole number of at least 1"}, status=400
+            )
+
+        workers = min(workers, settings.RECALCULATION_MAX_WORKERS)
+
+        standings = recalculate_editions(self.queryset.order_by("year"), workers)
+
+        return JsonResponse(
+            {year: len(shows) for year, shows in standings.items()}, safe=False
+        )
+
     @action(detail=True, methods=["POST"])
     def get_color(self, request, pk=None):
         """
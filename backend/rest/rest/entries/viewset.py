@@ -4,15 +4,15 @@ from json import loads
 from rest_framework import serializers, viewsets
 from rest_framework.decorators import action
 
+from etags import etag_response
 from models import (
-    Country,
     Edition,
     Entry,
+    get_show_label,
     get_vote_label,
     Performance,
+    PointsAwarded,
     POINTS_PER_PLACE,
-    ShowType,
-    Vote,
 )
 
 
@@ -37,8 +37,14 @@ class EntryViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=["POST"])
     def get_points_to(self, request, pk=None):
-        votes = Vote.objects.filter(performance__show__edition=self.get_object().year)
-        votes = votes.filter(ranking__0_10__contains=[self.get_object().country.code])
+        entry = self.get_object()
+
+        # every scoring place this entry's country got in its edition
+        awarded = PointsAwarded.objects.filter(
+            year=entry.year.year,
+            receiver=entry.country,
+            rank__lte=len(POINTS_PER_PLACE),
+        ).order_by("vote_id")
 
         # we make a dict to return
         # first layer of keys is show type
@@ -46,9 +52,10 @@ class EntryViewSet(viewsets.ModelViewSet):
         # third is keys being point totals and values being countries ranking at that index
         ret = {}
 
-        performances = Performance.objects.filter(country=self.get_object().country)
+        performances = Performance.objects.filter(country=entry.country)
         performances = performances.filter(running_order__gt=0)
-        performances = performances.filter(show__edition=self.get_object().year)
+        performances = performances.filter(show__edition=entry.year)
+        performances = performances.select_related("show")
 
         # populate all shows and their vote types
         # this way, we know if an entry got no points for a specific show and vote type
@@ -66,29 +73,30 @@ class EntryViewSet(viewsets.ModelViewSet):
                 if vote_key not in ret[show_type]:
                     ret[show_type][vote_key] = {}
 
-        for vote in votes:
-            # find show type
-            show_type = vote.performance.show.get_show_key()
-
-            # find vote type
-            vote_type = get_vote_label(vote.vote_type)
-
-            # find points and initialize dict if not already there
-            index = vote.ranking.index(self.get_object().country.code)
-            points = POINTS_PER_PLACE[index]
+        for show_type, vote_type, points, voter in awarded.values_list(
+            "show_type", "vote_type", "points", "voter_id"
+        ):
+            show_type = get_show_label(show_type)
+            vote_type = get_vote_label(vote_type)
 
             if points not in ret[show_type][vote_type]:
                 ret[show_type][vote_type][points] = []
 
             # add country to appropriate list
-            ret[show_type][vote_type][points].append(vote.performance.country.id)
+            ret[show_type][vote_type][points].append(voter)
 
         return JsonResponse(ret, safe=False)
 
     @action(detail=True, methods=["POST"])
     def get_points_from(self, request, pk=None):
-        votes = Vote.objects.filter(performance__show__edition=self.get_object().year)
-        votes = votes.filter(performance__country=self.get_object().country)
+        entry = self.get_object()
+
+        # every scoring place this entry's country gave out in its edition
+        awarded = PointsAwarded.objects.filter(
+            year=entry.year.year,
+            voter=entry.country,
+            rank__lte=len(POINTS_PER_PLACE),
+        ).order_by("vote_id", "rank")
 
         # we make a dict to return
         # first layer of keys is show type
@@ -96,29 +104,24 @@ class EntryViewSet(viewsets.ModelViewSet):
         # third is keys being point totals and values being countries ranking at that index
         ret = {}
 
-        for vote in votes:
-            # find show type
-            show_type = vote.performance.show.get_show_key()
+        for show_type, vote_type, points, receiver in awarded.values_list(
+            "show_type", "vote_type", "points", "receiver_id"
+        ):
+            show_type = get_show_label(show_type)
+            vote_type = get_vote_label(vote_type)
 
             if show_type not in ret:
                 ret[show_type] = {}
 
-            # find vote type
-            vote_type = get_vote_label(vote.vote_type)
-
             if vote_type not in ret[show_type]:
                 ret[show_type][vote_type] = {}
 
-            # find points and add to dict
-            for i in range(len(POINTS_PER_PLACE)):
-                points = POINTS_PER_PLACE[i]
-                code = vote.ranking[i]
-                country = Country.objects.get(code=code)
-                ret[show_type][vote_type][points] = [country.id]
+            ret[show_type][vote_type][points] = [receiver]
 
         return JsonResponse(ret, safe=False)
 
     @action(detail=False, methods=["POST"])
+    @etag_response
     def get_entries(self, request):
         data = loads(request.body)
         edition = data.get("edition")
@@ -137,6 +140,7 @@ class EntryViewSet(viewsets.ModelViewSet):
         return JsonResponse(EntrySerializer(entries, many=True).data, safe=False)
 
     @action(detail=False, methods=["POST"])
+    @etag_response
     def get_entries_in_years(self, request):
         data = loads(request.body)
         start_year = Edition.objects.get(id=data.get("start_year"))
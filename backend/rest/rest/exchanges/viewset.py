@@ -1,145 +1,96 @@
 from django.http import JsonResponse
+import numpy as np
 from rest_framework import viewsets
 from rest_framework.decorators import action
 
-from models import (
-    Country,
-    Edition,
-    get_vote_index,
-    Performance,
-    POINTS_PER_PLACE,
-    ShowType,
-    VoteType,
-)
-from rest.countries.viewset import CountrySerializer
+from models import Group
+from rest.countries.registry import get_country_registry
+from snapshot import get_snapshot
+from etags import etag_response
+from response_cache import cached_response
 
+# the ways of combining the points a country received from (first) and gave to (second) another country
+METRICS = {
+    "sum": lambda received, given: received + given,
+    "difference": lambda received, given: received - given,
+    "ratio": lambda received, given: received / given if given else None,
+}
 
-class ExchangeViewSet(viewsets.GenericViewSet):
-    # TODO make grid view for these?
-    def calculate_points_from(self, data):
-        country = data["country"]
 
-        editions = Edition.objects.filter(
-            year__gte=data["start_year"], year__lte=data["end_year"]
+class ExchangeViewSet(viewsets.GenericViewSet):
+    def calculate_exchanges(self, tensor, data):
+        """
+        Works out, in one pass over the vote tensor, the points a country gave to and received from every
+        other country, along with the number of opportunities it had for each
+        Returns a dict of arrays indexed like the vote tensor's countries
+        """
+        country = tensor.country_index[data["country"]]
+
+        shows = tensor.show_mask(data["start_year"], data["end_year"], data["mode"])
+        vote_types = tensor.vote_types(data["vote_type"])
+
+        # the shows in the range where this country had a vote, and the ones where it performed
+        voting = shows & tensor.present[:, country]
+        performing = shows & tensor.competing[:, country]
+
+        # the points given to and received from each other country, summed over shows and vote types
+        given = tensor.points[voting, country][:, vote_types].sum(
+            axis=(0, 1), dtype=np.int32
+        )
+        received = tensor.points[performing][:, :, vote_types, country].sum(
+            axis=(0, 2), dtype=np.int32
         )
 
-        # we use a dict to store the countries this country gives its points to
-        # key is the country
-        # 0th element of value is the number of points given
-        # 1st element of value is the number of times this country had the opportunity to give points to the other
-
-        dict = {}
-
-        for edition in editions:
-            if data["mode"] == "final":
-                shows = edition.show_set.filter(show_type=ShowType.GRAND_FINAL)
-            elif data["mode"] == "semi":
-                shows = edition.show_set.exclude(show_type=ShowType.GRAND_FINAL)
-
-            for show in shows:
-                performances = show.performance_set.filter(running_order__gt=0).exclude(
-                    country__id=country
-                )
-
-                try:
-                    votes = show.performance_set.get(country=country).vote_set.all()
-
-                    if data["vote_type"] != "combined":
-                        index = get_vote_index(data["vote_type"])
-                        votes = votes.filter(vote_type=index)
-
-                except Performance.DoesNotExist:
-                    continue
-
-                for performance in performances:
-                    if performance.country not in dict:
-                        dict[performance.country] = [0, 0]
-
-                    for vote in votes:
-                        # we get the place that the country passed in as an argument gave to this other country
-                        try:
-                            place = vote.ranking.index(performance.country.code)
-                        except ValueError:
-                            continue
-
-                        if place < len(POINTS_PER_PLACE):
-                            dict[performance.country][0] += POINTS_PER_PLACE[place]
-
-                    dict[performance.country][1] += 1
+        # the number of times this country could give points to each other country, and the other way round
+        given_opportunities = tensor.competing[voting].sum(axis=0)
+        given_opportunities[country] = 0
 
-        lst = [
-            {
-                "country": CountrySerializer(country).data,
-                "result": dict[country][0] / dict[country][1]
-                if data["average"]
-                else dict[country][0],
-            }
-            for country in dict
-        ]
+        received_opportunities = tensor.present[performing].sum(axis=0)
+        received_opportunities[country] = 0
 
-        lst = sorted(lst, key=lambda x: x["result"], reverse=True)
+        return {
+            "given": given,
+            "given_opportunities": given_opportunities,
+            "received": received,
+            "received_opportunities": received_opportunities,
+        }
 
-        return lst
+    def calculate_points_from(self, data):
+        tensor = get_snapshot().vote_tensor
+        exchanges = self.calculate_exchanges(tensor, data)
+
+        return self.to_list(
+            tensor,
+            exchanges["given"],
+            exchanges["given_opportunities"],
+            data["average"],
+        )
 
     def calculate_points_to(self, data):
-        editions = Edition.objects.filter(
-            year__gte=data["start_year"], year__lte=data["end_year"]
+        tensor = get_snapshot().vote_tensor
+        exchanges = self.calculate_exchanges(tensor, data)
+
+        return self.to_list(
+            tensor,
+            exchanges["received"],
+            exchanges["received_opportunities"],
+            data["average"],
         )
 
-        code = Country.objects.get(id=data["country"]).code
-
-        # we use a dict to store the countries giving points to this country
-        # key is the other country
-        # 0th element of value is the number of points given
-        # 1st element of value is the number of times the other country had the opportunity to give points to this one
-        dict = {}
-
-        for edition in editions:
-            if data["mode"] == "final":
-                shows = edition.show_set.filter(show_type=ShowType.GRAND_FINAL)
-            elif data["mode"] == "semi":
-                shows = edition.show_set.exclude(show_type=ShowType.GRAND_FINAL)
-
-            for show in shows:
-                # skip the show if this country didn't perform
-                if not show.performance_set.filter(
-                    country__id=data["country"], running_order__gt=0
-                ).exists():
-                    continue
-
-                # we get all performances from the show except our own
-                performances = show.performance_set.exclude(country__id=data["country"])
-
-                for performance in performances:
-                    if performance.country not in dict:
-                        dict[performance.country] = [0, 0]
-
-                    votes = performance.vote_set.all()
-
-                    if data["vote_type"] != "combined":
-                        index = get_vote_index(data["vote_type"])
-                        votes = votes.filter(vote_type=index)
-
-                    # for every vote, we see if this country got points from it, and if so, we add them to the total
-                    for vote in votes:
-                        try:
-                            place = vote.ranking.index(code)
-                        except:
-                            continue
-
-                        if place < len(POINTS_PER_PLACE):
-                            dict[performance.country][0] += POINTS_PER_PLACE[place]
-
-                    dict[performance.country][1] += 1
+    def to_list(self, tensor, points, opportunities, average):
+        """
+        Turns arrays of points and opportunities (indexed like the vote tensor's countries) into our usual
+        list of countries and results, leaving out the countries that never had an opportunity
+        """
+        countries = get_country_registry()
 
         lst = [
             {
-                "country": CountrySerializer(country).data,
-                "result": dict[country][0] / dict[country][1]
-                if data["average"]
-                else dict[country][0],
+                "country": countries.payload(id),
+                "result": points[i] / opportunities[i] if average else int(points[i]),
             }
-            for country in dict
+            for i, id in enumerate(tensor.countries)
+            if opportunities[i] > 0
         ]
 
         lst = sorted(lst, key=lambda x: x["result"], reverse=True)
@@ -147,6 +98,8 @@ class ExchangeViewSet(viewsets.GenericViewSet):
         return lst
 
     @action(detail=False, methods=["POST"])
+    @etag_response
+    @cached_response
     def get_points_from(self, request):
         lst = self.calculate_points_from(
             {
@@ -162,6 +115,8 @@ class ExchangeViewSet(viewsets.GenericViewSet):
         return JsonResponse(lst, safe=False)
 
     @action(detail=False, methods=["POST"])
+    @etag_response
+    @cached_response
     def get_points_to(self, request):
         lst = self.calculate_points_to(
             {
@@ -176,33 +131,209 @@ class ExchangeViewSet(viewsets.GenericViewSet):
 
         return JsonResponse(lst, safe=False)
 
-    # TODO account for total amount of points given/received?
-    def calculate_point_metric(self, data):
-        points_from = self.calculate_points_from(data)
-        points_to = self.calculate_points_to(data)
+    def calculate_totals(self, tensor, data):
+        """
+        Works out the points every country gave every other country over the range, in one pass over the votes
+        Returns the points and opportunities as voter x receiver matrices, indexed like the vote tensor's countries
+        Row i is what countries[i] gave (like get_points_from), column j is what countries[j] got (like get_points_to)
+        """
+        shows = tensor.show_mask(data["start_year"], data["end_year"], data["mode"])
+
+        points = tensor.points[shows][:, :, tensor.vote_types(data["vote_type"])].sum(
+            axis=(0, 2), dtype=np.int32
+        )
+
+        # opportunities[voter, receiver] is the number of shows where the voter voted while the receiver performed
+        present = tensor.present[shows].astype(np.int32)
+        competing = tensor.competing[shows].astype(np.int32)
+        opportunities = present.T @ competing
+        np.fill_diagonal(opportunities, 0)
+
+        return points, opportunities, present.any(axis=0)
+
+    def calculate_grid(self, data):
+        """
+        Returns the points matrix from calculate_totals, with the countries that index both of its axes
+        Cells where the voter never had the opportunity to vote for the receiver are None
+        """
+        tensor = get_snapshot().vote_tensor
+        countries = get_country_registry()
+
+        points, opportunities, present = self.calculate_totals(tensor, data)
+
+        # we only keep the countries that were in at least one of the shows
+        included = np.flatnonzero(present)
+        points = points[np.ix_(included, included)]
+        opportunities = opportunities[np.ix_(included, included)]
+
+        if data["average"]:
+            values = points / np.maximum(opportunities, 1)
+        else:
+            values = points
+
+        return {
+            "countries": [countries.payload(tensor.countries[i]) for i in included],
+            "grid": [
+                [
+                    value if opportunity > 0 else None
+                    for value, opportunity in zip(row, opportunity_row)
+                ]
+                for row, opportunity_row in zip(values.tolist(), opportunities.tolist())
+            ],
+        }
+
+    @action(detail=False, methods=["POST"])
+    @etag_response
+    @cached_response
+    def get_grid(self, request):
+        result = self.calculate_grid(
+            {
+                "start_year": request.data["start_year"],
+                "end_year": request.data["end_year"],
+                "vote_type": request.data["vote_type"],
+                "mode": request.data["shows"],
+                "average": request.data["average"],
+            }
+        )
+
+        return JsonResponse(result, safe=False)
+
+    def calculate_batch(self, data):
+        """
+        Returns the get_points_from and get_points_to lists of several countries, all from one calculate_totals
+        """
+        tensor = get_snapshot().vote_tensor
+        countries = get_country_registry()
+
+        points, opportunities, _ = self.calculate_totals(tensor, data)
 
         result = []
 
-        for i in range(len(points_from)):
-            # TODO check Poland 2021-2023 to see if this is a valid fix
-            points_to_elem = next(
-                (x for x in points_to if x["country"] == points_from[i]["country"]),
-                None,
-            )
+        for id in data["countries"]:
+            country = tensor.country_index[id]
 
             result.append(
                 {
-                    "country": points_from[i]["country"],
-                    "result": data["func"](
-                        points_to_elem["result"], points_from[i]["result"]
+                    "country": countries.payload(id),
+                    "points_from": self.to_list(
+                        tensor,
+                        points[country],
+                        opportunities[country],
+                        data["average"],
+                    ),
+                    "points_to": self.to_list(
+                        tensor,
+                        points[:, country],
+                        opportunities[:, country],
+                        data["average"],
                     ),
                 }
             )
 
-        result = sorted(result, key=lambda x: x["result"], reverse=True)
-
         return result
 
+    """
+    This method does get_points_from and get_points_to for many countries at once,
+    either a list of "countries" (ids) or every country in a "group"
+    """
+
+    @action(detail=False, methods=["POST"])
+    @etag_response
+    @cached_response
+    def get_batch(self, request):
+        if "group" in request.data:
+            countries = list(
+                Group.countries.through.objects.filter(group_id=request.data["group"])
+                .order_by("country_id")
+                .values_list("country_id", flat=True)
+            )
+        else:
+            countries = request.data["countries"]
+
+        result = self.calculate_batch(
+            {
+                "start_year": request.data["start_year"],
+                "end_year": request.data["end_year"],
+                "vote_type": request.data["vote_type"],
+                "countries": countries,
+                "mode": request.data["shows"],
+                "average": request.data["average"],
+            }
+        )
+
+        return JsonResponse(result, safe=False)
+
+    # TODO account for total amount of points given/received?
+    def calculate_point_metrics(self, data):
+        """
+        Combines the points a country received from and gave to each other country into the metrics in METRICS
+        Only countries that had the opportunity to exchange points both ways are included
+        """
+        tensor = get_snapshot().vote_tensor
+        countries = get_country_registry()
+        exchanges = self.calculate_exchanges(tensor, data)
+
+        given_opportunities = exchanges["given_opportunities"]
+        received_opportunities = exchanges["received_opportunities"]
+
+        if data["average"]:
+            given = exchanges["given"] / np.maximum(given_opportunities, 1)
+            received = exchanges["received"] / np.maximum(received_opportunities, 1)
+        else:
+            given = exchanges["given"]
+            received = exchanges["received"]
+
+        exchanged = np.flatnonzero(
+            (given_opportunities > 0) & (received_opportunities > 0)
+        )
+
+        # ties keep the order of the points given, as they always have
+        exchanged = sorted(exchanged, key=lambda i: given[i], reverse=True)
+
+        return [
+            {
+                "country": countries.payload(tensor.countries[i]),
+                "given": given[i].item(),
+                "received": received[i].item(),
+                **{
+                    metric: func(received[i].item(), given[i].item())
+                    for metric, func in METRICS.items()
+                },
+            }
+            for i in exchanged
+        ]
+
+    def calculate_point_metric(self, data):
+        """Returns our usual list of countries and results for one of the metrics in METRICS"""
+        result = [
+            {"country": x["country"], "result": x[data["metric"]]}
+            for x in self.calculate_point_metrics(data)
+        ]
+
+        return sorted(result, key=lambda x: x["result"], reverse=True)
+
+    """
+    This method returns, for each country the given country exchanged points with, the points given and received
+    along with every metric in METRICS, all worked out from the same pass over the votes
+    """
+
+    @action(detail=False, methods=["POST"])
+    @etag_response
+    @cached_response
+    def get_exchanges(self, request):
+        result = self.calculate_point_metrics(
+            {
+                "start_year": request.data["start_year"],
+                "end_year": request.data["end_year"],
+                "vote_type": request.data["vote_type"],
+                "country": request.data["country"],
+                "mode": request.data["shows"],
+                "average": request.data["average"],
+            }
+        )
+
+        return JsonResponse(result, safe=False)
+
     """
     This method calculates the discrepancies between the points given by a country and the points received by it
     for each other country. This way, we can see which countries have the most unequal voting exchanges.
@@ -210,6 +341,8 @@ class ExchangeViewSet(viewsets.GenericViewSet):
     """
 
     @action(detail=False, methods=["POST"])
+    @etag_response
+    @cached_response
     def get_discrepancies(self, request):
         params = {
             "start_year": request.data["start_year"],
@@ -220,7 +353,7 @@ class ExchangeViewSet(viewsets.GenericViewSet):
             "average": request.data["average"],
         }
 
-        result = self.calculate_point_metric({"func": lambda x, y: x - y, **params})
+        result = self.calculate_point_metric({"metric": "difference", **params})
 
         return JsonResponse(result, safe=False)
 
@@ -229,6 +362,8 @@ class ExchangeViewSet(viewsets.GenericViewSet):
     """
 
     @action(detail=False, methods=["POST"])
+    @etag_response
+    @cached_response
     def get_friends(self, request):
         params = {
             "start_year": request.data["start_year"],
@@ -239,6 +374,6 @@ class ExchangeViewSet(viewsets.GenericViewSet):
             "average": request.data["average"],
         }
 
-        result = self.calculate_point_metric({"func": lambda x, y: x + y, **params})
+        result = self.calculate_point_metric({"metric": "sum", **params})
 
         return JsonResponse(result, safe=False)
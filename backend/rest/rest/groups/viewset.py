@@ -2,6 +2,7 @@ from django.http import JsonResponse
 from rest_framework import serializers
 from rest_framework import viewsets
 from rest_framework.decorators import action
+from etags import etag_response
 
 from models import Group
 
@@ -17,6 +18,7 @@ class GroupViewSet(viewsets.ModelViewSet):
     serializer_class = GroupSerializer
 
     @action(detail=False, methods=["POST"])
+    @etag_response
     def get_all(self, request):
         """Returns all groups"""
         return JsonResponse(GroupSerializer(self.queryset, many=True).data, safe=False)
@@ -2,7 +2,10 @@ from django.http import JsonResponse
 from rest_framework import serializers, viewsets
 from rest_framework.decorators import action
 
-from models import Entry, Language, Performance, Result, ShowType
+from models import Language
+from snapshot import get_snapshot
+from etags import etag_response
+from response_cache import cached_response
 
 
 class LanguageSerializer(serializers.ModelSerializer):
@@ -17,25 +20,28 @@ class LanguageViewSet(viewsets.ModelViewSet):
 
     # returns the number of entries in a specific language
     @action(detail=False, methods=["POST"])
+    @etag_response
+    @cached_response
     def get_language_count(self, request):
         start_year = request.data["start_year"]
         end_year = request.data["end_year"]
         weighted = request.data.get("weighted", False)
 
-        entries = Entry.objects.filter(
-            year__year__gte=start_year, year__year__lte=end_year
-        )
+        snapshot = get_snapshot()
+        entries = snapshot.entries_between(start_year, end_year)
 
         # keys are languages, values are totals
         data = {}
 
         for entry in entries:
-            for language in entry.languages.all():
+            languages = snapshot.entry_languages_of(entry)
+
+            for language in languages:
                 if language not in data:
                     data[language] = 0
 
                 if weighted:
-                    data[language] += 1 / len(entry.languages.all())
+                    data[language] += 1 / len(languages)
                 else:
                     data[language] += 1
 
@@ -50,27 +56,32 @@ class LanguageViewSet(viewsets.ModelViewSet):
 
     # returns the number of entries in a specific language by country
     @action(detail=False, methods=["POST"])
+    @etag_response
+    @cached_response
     def get_language_count_by_country(self, request):
         start_year = request.data["start_year"]
         end_year = request.data["end_year"]
         weighted = request.data.get("weighted", False)
 
-        entries = Entry.objects.filter(
-            year__year__gte=start_year,
-            year__year__lte=end_year,
-            country__id=request.data["country"],
-        )
+        snapshot = get_snapshot()
+        entries = [
+            entry
+            for entry in snapshot.entries_between(start_year, end_year)
+            if entry.country_id == request.data["country"]
+        ]
 
         # keys are languages, values are totals
         data = {}
 
         for entry in entries:
-            for language in entry.languages.all():
+            languages = snapshot.entry_languages_of(entry)
+
+            for language in languages:
                 if language not in data:
                     data[language] = 0
 
                 if weighted:
-                    data[language] += 1 / len(entry.languages.all())
+                    data[language] += 1 / len(languages)
                 else:
                     data[language] += 1
 
@@ -85,20 +96,21 @@ class LanguageViewSet(viewsets.ModelViewSet):
 
     # returns the number of countries that have sent entries in a specific language over a time period
     @action(detail=False, methods=["POST"])
+    @etag_response
+    @cached_response
     def get_country_count(self, request):
         start_year = request.data["start_year"]
         end_year = request.data["end_year"]
 
-        entries = Entry.objects.filter(
-            year__year__gte=start_year, year__year__lte=end_year
-        )
+        snapshot = get_snapshot()
+        entries = snapshot.entries_between(start_year, end_year)
 
         # keys are languages, values are sets of country ids that have sent entries in that language
 
         data = {}
 
         for entry in entries:
-            for language in entry.languages.all():
+            for language in snapshot.entry_languages_of(entry):
                 if language not in data:
                     data[language] = set(())
 
@@ -116,18 +128,22 @@ class LanguageViewSet(viewsets.ModelViewSet):
     # returns the longest streak of having an entry in a specific language
     # this includes 2020, should it? something to think about
     @action(detail=False, methods=["POST"])
+    @etag_response
+    @cached_response
     def get_use_streak(self, request):
         start_year = request.data["start_year"]
         end_year = request.data["end_year"]
 
+        snapshot = get_snapshot()
+
         # keys are languages, values are 1 for a year with an entry in that language, 0 for a year without
         data = {}
 
         for year in range(start_year, end_year + 1):
-            entries = Entry.objects.filter(year__year=year)
+            entries = snapshot.entries_between(year, year)
 
             for entry in entries:
-                for language in entry.languages.all():
+                for language in snapshot.entry_languages_of(entry):
                     if language not in data:
                         data[language] = [0] * (end_year - start_year + 1)
 
@@ -167,29 +183,33 @@ class LanguageViewSet(viewsets.ModelViewSet):
 
     # returns the Q rate of all songs in a language
     @action(detail=False, methods=["POST"])
+    @etag_response
+    @cached_response
     def get_qualification_rate(self, request):
         start_year = request.data["start_year"]
         end_year = request.data["end_year"]
 
-        entries = Entry.objects.filter(
-            year__year__gte=start_year, year__year__lte=end_year
-        )
+        snapshot = get_snapshot()
+        entries = snapshot.entries_between(start_year, end_year)
 
         # keys are languages, values are [q_count, total_count]
 
         data = {}
 
         for entry in entries:
-            performances = Performance.objects.filter(
-                country=entry.country, show__edition__year=entry.year.year
-            ).exclude(show__show_type=ShowType.GRAND_FINAL)
+            performances = [
+                performance
+                for show in snapshot.shows_in(entry.year, "semi")
+                for performance in snapshot.performances_in(show)
+                if performance.country_id == entry.country_id
+            ]
 
             if len(performances) == 0 or performances[0].running_order <= 0:
                 continue
 
-            result = Result.objects.get(performance=performances[0])
+            result = snapshot.result(performances[0])
 
-            for language in entry.languages.all():
+            for language in snapshot.entry_languages_of(entry):
                 if language not in data:
                     data[language] = [0, 0]
 
@@ -213,15 +233,14 @@ class LanguageViewSet(viewsets.ModelViewSet):
     # returns the earliest or latest appearance of a language
     # TODO year with most appearances of a language?
     def get_appearance(self, data):
-        entries = Entry.objects.filter(
-            year__year__gte=data["start_year"], year__year__lte=data["end_year"]
-        )
+        snapshot = get_snapshot()
+        entries = snapshot.entries_between(data["start_year"], data["end_year"])
 
         # keys are languages, values are years fitting the criterion
         dict = {}
 
         for entry in entries:
-            for language in entry.languages.all():
+            for language in snapshot.entry_languages_of(entry):
                 if language not in dict:
                     dict[language] = entry.year.year
 
@@ -243,9 +262,13 @@ class LanguageViewSet(viewsets.ModelViewSet):
         return JsonResponse(lst, safe=False)
 
     @action(detail=False, methods=["POST"])
+    @etag_response
+    @cached_response
     def get_earliest_appearance(self, request):
         return self.get_appearance({"mode": "earliest", **request.data})
 
     @action(detail=False, methods=["POST"])
+    @etag_response
+    @cached_response
     def get_latest_appearance(self, request):
         return self.get_appearance({"mode": "latest", **request.data})
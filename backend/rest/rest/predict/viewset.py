@@ -1,141 +1,467 @@
+from django.conf import settings
+from django.db.models import Avg, Count, Max, Sum
 from django.http import JsonResponse
+import numpy as np
 from rest_framework import viewsets
 from rest_framework.decorators import action
 
-from models import Country, Edition, Performance, POINTS_PER_PLACE, Result, Show, Vote
+from backtest import Backtest
+from models import (
+    get_vote_index,
+    get_vote_label,
+    POINTS_PER_PLACE,
+    ShowType,
+    VoteType,
+    VotingBias,
+)
+from rest.countries.registry import get_country_registry
+from simulate import ContestModel, simulate
+from snapshot import get_snapshot
+from etags import etag_response
+from response_cache import cached_response
+
+
+# how many countries qualify from each semi-final, unless the request says otherwise
+QUALIFIERS_PER_SEMI = 10
+
+
+def is_whole_number(value, minimum=0):
+    """Whether a value from a request body is an int (JSON true and false don't count) of at least minimum"""
+    return isinstance(value, int) and not isinstance(value, bool) and value >= minimum
 
 
 # TODO revisit other viewsets + change as needed
 class PredictViewSet(viewsets.ViewSet):
-    @action(detail=False, methods=["get"])
+    @action(detail=False, methods=["POST"])
+    @etag_response
+    @cached_response
     def country_affinity(self, request):
         """
         Gets the affinity of all countries with the others in their semi-final for a given year.
+        The affinities come from the semi-finals of start_year to end_year
         """
+        year = request.data["year"]
+        start_year = request.data["start_year"]
+        end_year = request.data["end_year"]
 
-        # TODO change to post
-        predict_year = 2024
-        start_year = 2018
-        end_year = 2023
+        result = self.calculate_country_affinity(
+            get_snapshot(), year, start_year, end_year
+        )
 
-        # Get the semi-finals of the year to predict
-        # FIXME this wont work with single-semi editions
+        if result is None:
+            return JsonResponse({"error": "Nothing to predict"}, status=400)
+
+        return JsonResponse({"result": result})
 
-        semi_finals = Edition.objects.get(year=predict_year).semi_finals
-        vote_types = semi_finals.first().voting_system
+    @action(detail=False, methods=["POST"])
+    @etag_response
+    @cached_response
+    def simulate_contest(self, request):
+        """
+        Simulates the semi-finals and final of a year many times over, from the voting of start_year to end_year
+        Gives each country's probability of qualifying, and of getting each place in the final
+        The same seed always gives the same probabilities (for a given settings.SIMULATION_BATCH_SIZE)
+        """
+        year = request.data["year"]
+        start_year = request.data["start_year"]
+        end_year = request.data["end_year"]
+        simulations = request.data.get("simulations", 10000)
+        seed = request.data.get("seed", 0)
+        qualifiers = request.data.get("qualifiers", QUALIFIERS_PER_SEMI)
+
+        if not (
+            is_whole_number(simulations, 1)
+            and simulations <= settings.SIMULATION_MAX_COUNT
+        ):
+            return JsonResponse(
+                {"error": f"simulations must be 1 to {settings.SIMULATION_MAX_COUNT}"},
+                status=400,
+            )
 
-        voter_sets = []
-        competitor_sets = []
+        if not is_whole_number(seed):
+            return JsonResponse(
+                {"error": "seed must be a whole number of at least 0"}, status=400
+            )
 
-        semi: Show
+        if not is_whole_number(qualifiers, 1):
+            return JsonResponse(
+                {"error": "qualifiers must be a whole number of at least 1"},
+                status=400,
+            )
 
-        for semi in semi_finals:
-            # Get the countries that are in the semi-final
-            voter_sets.append(
-                Country.objects.filter(performance__in=semi.performance_set.all())
+        snapshot = get_snapshot()
+        model = self.build_contest_model(
+            snapshot, year, start_year, end_year, qualifiers
+        )
+
+        if model is None:
+            return JsonResponse({"error": "Nothing to simulate"}, status=400)
+
+        qualified, places = simulate(
+            model,
+            simulations,
+            seed,
+            settings.SIMULATION_WORKERS,
+            settings.SIMULATION_BATCH_SIZE,
+        )
+
+        tensor = snapshot.vote_tensor
+        registry = get_country_registry()
+        codes = [snapshot.countries[tensor.countries[i]].code for i in model.candidates]
+
+        return JsonResponse(
+            {
+                "simulations": simulations,
+                "data": [
+                    {
+                        "country": registry.payload_for_code(codes[i]),
+                        "automatic": bool(i < model.automatic),
+                        "qualify": qualified[i] / simulations,
+                        "places": (places[i] / simulations).tolist(),
+                    }
+                    for i in sorted(range(len(codes)), key=lambda i: codes[i])
+                ],
+            },
+            safe=False,
+        )
+
+    @action(detail=False, methods=["POST"])
+    @etag_response
+    @cached_response
+    def backtest(self, request):
+        """
+        Predicts every year from start_year to end_year from the window years before it, and scores the predictions
+        against the actual results: how many qualifiers were picked, the rank correlation of the final's places,
+        and how long each year took (see backtest.Backtest)
+        """
+        start_year = request.data["start_year"]
+        end_year = request.data["end_year"]
+        window = request.data.get("window", 5)
+        simulations = request.data.get("simulations", 2000)
+        seed = request.data.get("seed", 0)
+
+        if not (is_whole_number(start_year) and is_whole_number(end_year)):
+            return JsonResponse(
+                {"error": "start_year and end_year must be whole numbers"}, status=400
+            )
+
+        if not is_whole_number(window, 1):
+            return JsonResponse(
+                {"error": "window must be a whole number of at least 1"}, status=400
+            )
+
+        if not is_whole_number(seed):
+            return JsonResponse(
+                {"error": "seed must be a whole number of at least 0"}, status=400
+            )
+
+        # the limit is on the simulations of the whole range
+        years = max(end_year - start_year + 1, 1)
+
+        if not (
+            is_whole_number(simulations, 1)
+            and simulations * years <= settings.SIMULATION_MAX_COUNT
+        ):
+            return JsonResponse(
+                {
+                    "error": f"simulations must be 1 to {settings.SIMULATION_MAX_COUNT // years} for {years} years"
+                },
+                status=400,
+            )
+
+        backtest = Backtest(
+            start_year,
+            end_year,
+            window,
+            simulations,
+            seed,
+            settings.SIMULATION_WORKERS,
+            settings.SIMULATION_BATCH_SIZE,
+        )
+
+        return JsonResponse(backtest.run(), safe=False)
+
+    @action(detail=False, methods=["POST"])
+    @etag_response
+    @cached_response
+    def voting_bias(self, request):
+        """
+        The average points each voter gave each receiver over what the receiver's entry got per voter,
+        in the shows ("final", "semi" or "all") and vote type of a range of years, from the stored voting biases
+        Returns the countries that index both axes of the grid, which is None where a voter never voted on a receiver
+        """
+        biases = VotingBias.objects.filter(
+            year__gte=request.data["start_year"], year__lte=request.data["end_year"]
+        )
+
+        if request.data["shows"] == "final":
+            biases = biases.filter(show_type=ShowType.GRAND_FINAL)
+        elif request.data["shows"] == "semi":
+            biases = biases.exclude(show_type=ShowType.GRAND_FINAL)
+
+        # combined means every kind of vote, like everywhere else
+        if request.data["vote_type"] != get_vote_label(VoteType.COMBINED):
+            biases = biases.filter(vote_type=get_vote_index(request.data["vote_type"]))
+
+        rows = list(
+            biases.values("voter_id", "receiver_id")
+            .annotate(bias=Avg("excess"))
+            .values_list("voter_id", "receiver_id", "bias")
+        )
+
+        countries = sorted({row[0] for row in rows} | {row[1] for row in rows})
+        index = {id: i for i, id in enumerate(countries)}
+        grid = [[None] * len(countries) for _ in countries]
+
+        for voter, receiver, bias in rows:
+            grid[index[voter]][index[receiver]] = bias
+
+        registry = get_country_registry()
+
+        return JsonResponse(
+            {"countries": [registry.payload(id) for id in countries], "grid": grid},
+            safe=False,
+        )
+
+    def build_contest_model(self, snapshot, year, start_year, end_year, qualifiers):
+        """
+        Sets up the simulation of a year (see simulate.ContestModel), from the line-ups of its semi-finals
+        and the affinities of start_year to end_year. The final doesn't have to be in the database yet
+        Returns None if the year has no semi-finals or there's no history to go on
+        """
+        tensor = snapshot.vote_tensor
+        edition = snapshot.editions_by_year.get(year)
+        semi_finals = snapshot.shows_in(edition, "semi") if edition else []
+
+        if not semi_finals:
+            return None
+
+        vote_types = [vote_type - 1 for vote_type in semi_finals[0].voting_system]
+        sums, squares, counts, averages = self.calculate_affinity_sums(
+            snapshot, start_year, end_year, vote_types
+        )
+
+        if len(averages) == 0:
+            return None
+
+        # the affinities are over the points of all the vote types together, so they're split between them
+        with np.errstate(divide="ignore", invalid="ignore"):
+            affinities = np.where(counts > 0, sums / counts, 0) / len(vote_types)
+
+            # how much a pair's affinity varies from year to year, around its average
+            noise_sd = np.sqrt(
+                (squares - np.where(counts > 0, sums**2 / counts, 0)).sum()
+                / max((counts - 1)[counts > 1].sum(), 1)
+                / len(vote_types)
             )
 
-            # Get the countries that are actually competing
-            competitor_sets.append(
-                Country.objects.filter(
-                    performance__in=semi.performance_set.filter(running_order__gt=0)
+        semi_indices = [tensor.show_index[semi.id] for semi in semi_finals]
+        semi_competitors = [
+            np.flatnonzero(tensor.competing[index]) for index in semi_indices
+        ]
+
+        # everyone taking part who isn't in a semi-final goes straight to the final
+        # if the final's line-up is in, that's who took part, otherwise it's the entries with a song
+        # (countries that only vote, like Rest of the World, have entries too)
+        final = snapshot.final(edition)
+        finalists = (
+            tensor.competing[tensor.show_index[final.id]] if final else np.zeros(0)
+        )
+
+        if finalists.any():
+            participants = set(np.flatnonzero(finalists).tolist())
+        else:
+            participants = {
+                tensor.country_index[entry.country_id]
+                for entry in snapshot.edition_entries[edition.id]
+                if entry.title and entry.country.code != "un"
+            }
+
+        in_semis = set(np.concatenate(semi_competitors).tolist())
+        automatic = sorted(participants - in_semis)
+
+        candidates = np.concatenate([automatic, *semi_competitors]).astype(np.intp)
+
+        def make_show(indices, voters, positions, show_vote_types):
+            # voters who don't have votes in the database yet are assumed to cast every kind of vote
+            voting = tensor.voted[indices].any(axis=0)[voters][:, show_vote_types]
+
+            if not voting.any():
+                voting = np.ones(voting.shape, dtype=bool)
+
+            competitors = candidates[positions]
+            show_affinities = affinities[np.ix_(competitors, voters)].T.astype(
+                np.float32
+            )
+            show_affinities[voters[:, None] == competitors[None, :]] = -np.inf
+
+            return {
+                "competitors": positions,
+                "affinities": show_affinities,
+                "voting": voting,
+            }
+
+        semis = []
+        offset = len(automatic)
+
+        for index, competitors in zip(semi_indices, semi_competitors):
+            positions = np.arange(offset, offset + len(competitors))
+            offset += len(competitors)
+
+            semis.append(
+                make_show(
+                    [index],
+                    np.flatnonzero(tensor.present[index]),
+                    positions,
+                    vote_types,
                 )
             )
 
-        # This is a dictionary of dictionaries of arrays
-        # The first key is the competitor
-        # The second key is the voter
-        # Then we have the year-by-year, vote-by-vote affinity
-        # This is calculated by finding the difference between the actual number of points
-        # given by the voter to the competitor and the average for that entry
-        # We only consider the voting methods that are used in the prediction year
-        affinities = {}
-
-        # Now, let's go through each year and find our affinities!
-
-        for year in range(start_year, end_year + 1):
-            year_semi_finals = Edition.objects.get(year=year).semi_finals
-
-            # If there are no semi-finals, we skip this year
-            if not year_semi_finals.exists():
-                continue
-
-            for i in range(len(semi_finals)):
-                # Do each semi-final separately
-
-                voters = voter_sets[i]
-                competitors = competitor_sets[i]
-
-                voter: Country
-                for voter in voters:
-                    # Get the semi-final votes for this voter in this year
-                    semi_votes = Vote.objects.filter(
-                        performance__country=voter,
-                        performance__show__in=year_semi_finals,
-                        vote_type__in=vote_types,
-                    )
-
-                    if not semi_votes.exists():
-                        continue
-
-                    competitor: Country
-                    for competitor in competitors:
-                        if competitor == voter:
-                            continue
-
-                        # Get the voter's votes that are for the competitor
-                        competitor_votes = semi_votes.filter(
-                            ranking__contains=[competitor.code]
-                        )
-
-                        if not competitor_votes.exists():
-                            continue
-
-                        points = 0
-
-                        for vote in competitor_votes:
-                            index = vote.ranking.index(competitor.code)
-                            try:
-                                points += POINTS_PER_PLACE[index]
-                            except IndexError:
-                                pass
-
-                        # Get the average points for this competitor
-                        result = Result.objects.get(
-                            performance__country=competitor,
-                            performance__show__in=year_semi_finals,
-                        )
-
-                        # TODO account for different voting systems
-                        total = result.televote
-
-                        semi = year_semi_finals.get(performance__country=competitor)
-                        count = semi.performance_set.count() - 1
-
-                        average = total / count
-
-                        # Calculate the affinity
-                        affinity = points - average
-
-                        try:
-                            affinities[competitor.code][voter.code].append(affinity)
-                        except KeyError:
-                            # Initialize the dictionary if it doesn't exist
-                            if competitor.code not in affinities:
-                                affinities[competitor.code] = {voter.code: [affinity]}
-
-                            if voter.code not in affinities[competitor.code]:
-                                affinities[competitor.code][voter.code] = [affinity]
-
-        # We finally have all of the affinities calculated, now we need to average them
-
-        collapsed_affinities = {
-            competitor: sum(
-                sum(affinities[competitor][voter]) / len(affinities[competitor][voter])
-                for voter in affinities[competitor]
+        # without the final in the database, everyone who voted in a semi-final votes in it too
+        final = snapshot.final(edition)
+
+        if final is not None:
+            indices = [tensor.show_index[final.id]]
+            final_vote_types = [vote_type - 1 for vote_type in final.voting_system]
+        else:
+            indices = semi_indices
+            final_vote_types = vote_types
+
+        voters = np.flatnonzero(tensor.present[indices].any(axis=0))
+        final_show = make_show(
+            indices, voters, np.arange(len(candidates)), final_vote_types
+        )
+
+        return ContestModel(
+            candidates,
+            len(automatic),
+            semis,
+            final_show,
+            quality_sd=float(np.std(averages)),
+            noise_sd=float(noise_sd),
+            qualifiers=qualifiers,
+            points=POINTS_PER_PLACE,
+        )
+
+    def calculate_country_affinity(self, snapshot, year, start_year, end_year):
+        """
+        The affinity of a competitor with a voter is the difference between the points the voter gave it
+        and the average points its entry got per voter (in the televote) in that year's semi-final
+        Each competitor in the semi-finals of the given year gets the average, over the voters in its semi-final,
+        of their average affinity with it over the range of years
+        Returns a dict keyed by country code, or None if the year has no semi-finals
+        """
+        tensor = snapshot.vote_tensor
+
+        # Get the semi-finals of the year to predict
+        # FIXME this wont work with single-semi editions
+        edition = snapshot.editions_by_year.get(year)
+        semi_finals = snapshot.shows_in(edition, "semi") if edition else []
+
+        if not semi_finals:
+            return None
+
+        vote_types = [vote_type - 1 for vote_type in semi_finals[0].voting_system]
+
+        # pairs[c, v] is True if competitor c and voter v are in the same semi-final of the year to predict
+        pairs = np.zeros((len(tensor.countries),) * 2, dtype=bool)
+
+        for semi in semi_finals:
+            index = tensor.show_index[semi.id]
+            pairs |= tensor.competing[index][:, None] & tensor.present[index][None, :]
+
+        np.fill_diagonal(pairs, False)
+
+        sums, squares, counts, averages = self.calculate_affinity_sums(
+            snapshot, start_year, end_year, vote_types
+        )
+        counts = np.where(pairs, counts, 0)
+
+        # average over the years for each pair, then over the voters for each competitor
+        voters = counts > 0
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            affinities = np.where(voters, sums / counts, 0).sum(axis=1) / voters.sum(
+                axis=1
             )
-            / len(affinities[competitor])
-            for competitor in affinities
+
+        codes = [snapshot.countries[id].code for id in tensor.countries]
+
+        return {
+            codes[i]: affinities[i]
+            for i in sorted(np.flatnonzero(voters.any(axis=1)), key=lambda i: codes[i])
         }
 
-        return JsonResponse({"result": collapsed_affinities})
+    def calculate_affinity_sums(self, snapshot, start_year, end_year, vote_types):
+        """
+        Adds up the stored voting biases (see models.VotingBias) of the semi-finals of start_year to end_year
+        The affinity of a competitor (rows) with a voter (columns) who ranked it in a year is the points they gave it
+        in the given vote type indices, minus what its entry got per voter in the televote
+        Returns the sum, sum of squares and count of each pair's affinities,
+        and the average points per voter of every entry they're measured against
+        """
+        tensor = snapshot.vote_tensor
+        count = len(tensor.countries)
+
+        semis = VotingBias.objects.filter(
+            year__gte=start_year, year__lte=end_year
+        ).exclude(show_type=ShowType.GRAND_FINAL)
+
+        # the points each voter gave each competitor every year, and whether it ranked them at all
+        # in year order, so each pair's affinities are added up one year after the other
+        pairs = np.array(
+            semis.filter(vote_type__in=[vote_type + 1 for vote_type in vote_types])
+            .values("year", "voter_id", "receiver_id")
+            .annotate(total=Sum("points"), ranked=Count("rank"))
+            .order_by("year", "voter_id", "receiver_id")
+            .values_list("year", "voter_id", "receiver_id", "total", "ranked"),
+            dtype=np.int64,
+        ).reshape(-1, 5)
+
+        # TODO account for different voting systems
+        averages = list(
+            semis.filter(vote_type=VoteType.TELEVOTE)
+            .values("year", "receiver_id")
+            .annotate(average=Max("average"))
+            .values_list("year", "receiver_id", "average")
+        )
+
+        sums = np.zeros((count, count))
+        squares = np.zeros(sums.shape)
+        counts = np.zeros(sums.shape, dtype=np.int32)
+        entry_averages = np.array([average for _, _, average in averages])
+
+        if len(pairs) == 0:
+            return sums, squares, counts, entry_averages
+
+        index = np.vectorize(tensor.country_index.get, otypes=[np.intp])
+        years = {year: i for i, year in enumerate(np.unique(pairs[:, 0]).tolist())}
+
+        # by_year[y, c] is competitor c's average points per voter in the y-th year (NaN without a televote)
+        by_year = np.full((len(years), count), np.nan)
+
+        for year, receiver, average in averages:
+            if year in years:
+                by_year[years[year], tensor.country_index[receiver]] = average
+
+        year = np.array([years[x] for x in pairs[:, 0].tolist()], dtype=np.intp)
+        voter = index(pairs[:, 1])
+        competitor = index(pairs[:, 2])
+
+        affinities = pairs[:, 3] - by_year[year, competitor]
+        valid = (pairs[:, 4] > 0) & ~np.isnan(affinities)
+
+        # Skip the competitors the voter's votes don't rank at all
+        flat = (competitor * count + voter)[valid]
+        affinities = affinities[valid]
+
+        sums = np.bincount(flat, affinities, minlength=count * count)
+        squares = np.bincount(flat, affinities**2, minlength=count * count)
+        counts = np.bincount(flat, minlength=count * count).astype(np.int32)
+
+        return (
+            sums.reshape(count, count),
+            squares.reshape(count, count),
+            counts.reshape(count, count),
+            entry_averages,
+        )
@@ -2,53 +2,54 @@ from django.http import JsonResponse
 from rest_framework import viewsets
 from rest_framework.decorators import action
 
-from models import Country, Edition
-from rest.countries.viewset import CountrySerializer
+from models import QualificationStatus, QualificationType
+from rest.countries.registry import get_country_registry
+from etags import etag_response
+from response_cache import cached_response
 
 
 class QualifyViewSet(viewsets.GenericViewSet):
-    def get_qualify_data(self, data):
-        # get all editions in the given range
-        editions = Edition.objects.filter(
-            year__gte=data["start_year"], year__lte=data["end_year"]
+    def get_statuses(self, data):
+        """
+        Returns (year, country, status) for every qualifier and non-qualifier in the given range, in one query
+        Each year lists its qualifiers first, then its non-qualifiers, in the order they performed in the final
+        """
+        return (
+            QualificationStatus.objects.filter(
+                year__gte=data["start_year"],
+                year__lte=data["end_year"],
+                status__in=[
+                    QualificationType.QUALIFIED,
+                    QualificationType.NON_QUALIFIED,
+                ],
+            )
+            .order_by("year", "status", "performance_id")
+            .values_list("year", "country_id", "status")
         )
 
+    def get_qualify_data(self, data):
         # our dict entries have countries as keys and [qualify_count, participation_count] as values
         # we count participation as participation in SEMIFINALS (so hosts aren't included)
         dict = {}
 
-        for edition in editions:
-            # get qualifier data for this edition and make an array: qualify_count is 1 if qualifier, 0 if non-qualifier
-            # TODO make this not error when year is missing
-            qualifier_obj = edition.get_qualifier_data()
-
-            if qualifier_obj is None:
-                continue
-
-            qualifier_lst = [
-                {"country": x, "qualify_count": 1} for x in qualifier_obj["qualifiers"]
-            ]
-            qualifier_lst.extend(
-                [
-                    {"country": x, "qualify_count": 0}
-                    for x in qualifier_obj["non_qualifiers"]
-                ]
-            )
+        for year, country, status in self.get_statuses(data):
+            if not country in dict:
+                dict[country] = [0, 0]
 
-            # add our qualifier_count values to the dict
-            for elem in qualifier_lst:
-                if not elem["country"] in dict:
-                    dict[elem["country"]] = [0, 0]
+            # qualify_count is 1 if qualifier, 0 if non-qualifier
+            if status == QualificationType.QUALIFIED:
+                dict[country][0] += 1
 
-                dict[elem["country"]][0] += elem["qualify_count"]
-                dict[elem["country"]][1] += 1
+            dict[country][1] += 1
 
         # convert dict to list for ease of use
         # return proportional data if we want the qualification rate
+        countries = get_country_registry()
+
         if data["rate"]:
             lst = [
                 {
-                    "country": CountrySerializer(Country.objects.get(id=k)).data,
+                    "country": countries.payload(k),
                     "result": v[0] / v[1],
                 }
                 for k, v in dict.items()
@@ -56,7 +57,7 @@ class QualifyViewSet(viewsets.GenericViewSet):
         else:
             lst = [
                 {
-                    "country": CountrySerializer(Country.objects.get(id=k)).data,
+                    "country": countries.payload(k),
                     "result": v[0],
                 }
                 for k, v in dict.items()
@@ -65,6 +66,8 @@ class QualifyViewSet(viewsets.GenericViewSet):
         return sorted(lst, key=lambda x: x["result"], reverse=True)
 
     @action(detail=False, methods=["POST"])
+    @etag_response
+    @cached_response
     def get_qualify_count(self, request):
         # get all editions in the given range
         start_year = request.data["start_year"]
@@ -77,6 +80,8 @@ class QualifyViewSet(viewsets.GenericViewSet):
         return JsonResponse(lst, safe=False)
 
     @action(detail=False, methods=["POST"])
+    @etag_response
+    @cached_response
     def get_qualify_rate(self, request):
         # get all editions in the given range
         start_year = request.data["start_year"]
@@ -92,29 +97,17 @@ class QualifyViewSet(viewsets.GenericViewSet):
         all_data = {}
         duration = data["end_year"] - data["start_year"] + 1
 
-        for year in range(data["start_year"], data["end_year"] + 1):
-            # get qualifier data for this year
-            qualifier_obj = Edition.objects.get(year=year).get_qualifier_data()
-
-            if qualifier_obj is None:
-                continue
-
-            # 1 extends streak, -1 breaks streak, 0 maintains streak
-            for key, lst in qualifier_obj.items():
-                if key == data["streak_key"]:
-                    for country in lst:
-                        if country not in all_data:
-                            all_data[country] = [0] * duration
-
-                        all_data[country][year - data["start_year"]] = 1
-
-                else:
-                    for country in lst:
-                        if country not in all_data:
-                            all_data[country] = [0] * duration
+        # 1 extends streak, -1 breaks streak, 0 maintains streak
+        for year, country, status in self.get_statuses(data):
+            if country not in all_data:
+                all_data[country] = [0] * duration
 
-                        all_data[country][year - data["start_year"]] = -1
+            if status == data["streak_status"]:
+                all_data[country][year - data["start_year"]] = 1
+            else:
+                all_data[country][year - data["start_year"]] = -1
 
+        countries = get_country_registry()
         streaks = []
 
         for country, q_data in all_data.items():
@@ -139,7 +132,7 @@ class QualifyViewSet(viewsets.GenericViewSet):
 
             streaks.append(
                 {
-                    "country": CountrySerializer(Country.objects.get(id=country)).data,
+                    "country": countries.payload(country),
                     "result": longest,
                 }
             )
@@ -151,12 +144,14 @@ class QualifyViewSet(viewsets.GenericViewSet):
     # We consider streaks to be broken when a country NQs
     # If they autoqualify or do not participate, the streak is not broken, but it is not extended either
     @action(detail=False, methods=["POST"])
+    @etag_response
+    @cached_response
     def get_longest_q_streak(self, request):
         streaks = self.get_longest_streak(
             {
                 "start_year": request.data["start_year"],
                 "end_year": request.data["end_year"],
-                "streak_key": "qualifiers",
+                "streak_status": QualificationType.QUALIFIED,
             }
         )
 
@@ -165,12 +160,14 @@ class QualifyViewSet(viewsets.GenericViewSet):
     # We consider streaks to be broken when a country Qs
     # If they do not participate, the streak is not broken, but it is not extended either
     @action(detail=False, methods=["POST"])
+    @etag_response
+    @cached_response
     def get_longest_nq_streak(self, request):
         streaks = self.get_longest_streak(
             {
                 "start_year": request.data["start_year"],
                 "end_year": request.data["end_year"],
-                "streak_key": "non_qualifiers",
+                "streak_status": QualificationType.NON_QUALIFIED,
             }
         )
 
@@ -3,7 +3,12 @@ from json import loads
 from rest_framework import serializers, viewsets
 from rest_framework.decorators import action
 
-from models import Performance, Result, ShowType, POINTS_PER_PLACE
+from etags import etag_response
+from models import Result, ShowType, POINTS_PER_PLACE
+
+
+# the related objects ResultSerializer looks at, for select_related
+RESULT_RELATIONS = ["performance__country", "performance__show__edition"]
 
 
 class ResultSerializer(serializers.ModelSerializer):
@@ -28,16 +33,25 @@ class ResultSerializer(serializers.ModelSerializer):
         ]
 
     def get_country(self, obj: Result):
-        return obj.performance.country.id
+        return obj.performance.country_id
 
     # we automatically qualify if we are the host country or part of the Big 5
+    # comparing ids means we don't have to load the host just to check
     def get_auto_qualified(self, obj: Result):
         edition = obj.performance.show.edition
         country = obj.performance.country
-        return country == edition.host or country.is_big_five
+        return country.id == edition.host_id or country.is_big_five
 
     def get_maximum_possible(self, obj: Result):
-        return obj.performance.show.get_maximum_possible()
+        # every result in a show has the same maximum, so we only count the voters once per show
+        # (the context is shared by all the results when serializing with many=True)
+        maximums = self.context.setdefault("maximum_possible", {})
+        show = obj.performance.show
+
+        if show.id not in maximums:
+            maximums[show.id] = show.get_maximum_possible()
+
+        return maximums[show.id]
 
 
 class ResultViewSet(viewsets.ModelViewSet):
@@ -45,6 +59,7 @@ class ResultViewSet(viewsets.ModelViewSet):
     serializer_class = ResultSerializer
 
     @action(detail=False, methods=["POST"])
+    @etag_response
     def get_results(self, request):
         # get our country and edition from the request
         data = loads(request.body)
@@ -56,19 +71,18 @@ class ResultViewSet(viewsets.ModelViewSet):
         return JsonResponse(results, safe=False)
 
     def get_results_internal(self, country, edition):
-        # get corresponding performances
-        performances = Performance.objects.filter(
-            country__id=country, show__edition__id=edition, running_order__gt=0
-        )
+        # get the results of the corresponding performances, along with everything the serializer needs
+        results = Result.objects.filter(
+            performance__country__id=country,
+            performance__show__edition__id=edition,
+            performance__running_order__gt=0,
+        ).select_related(*RESULT_RELATIONS)
 
         # get show names and return dict
         ret = {}
 
-        for performance in performances:
-            key = performance.show.get_show_key()
-
-            # get corresponding result
-            result = Result.objects.get(performance=performance)
+        for result in results:
+            key = result.performance.show.get_show_key()
             ret[key] = ResultSerializer(result).data
 
         return ret
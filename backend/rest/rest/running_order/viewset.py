@@ -1,10 +1,11 @@
-from django.db.models import Max
 from django.http import JsonResponse
 from rest_framework.decorators import action
 from rest_framework.viewsets import GenericViewSet
 
-from models import Edition, ShowType
-from rest.countries.viewset import CountrySerializer
+from rest.countries.registry import get_country_registry
+from snapshot import get_snapshot
+from etags import etag_response
+from response_cache import cached_response
 
 
 class RunningOrderViewset(GenericViewSet):
@@ -12,22 +13,19 @@ class RunningOrderViewset(GenericViewSet):
         start_year = data["start_year"]
         end_year = data["end_year"]
 
-        editions = Edition.objects.filter(year__gte=start_year, year__lte=end_year)
+        snapshot = get_snapshot()
+        editions = snapshot.editions_between(start_year, end_year)
 
         # our dict will have the form {country: [sum of running orders, number of appearances]}
         dict = {}
         for edition in editions:
-            if data["mode"] == "final":
-                shows = edition.show_set.filter(show_type=ShowType.GRAND_FINAL)
-            elif data["mode"] == "semi":
-                shows = edition.show_set.exclude(show_type=ShowType.GRAND_FINAL)
-
-            for show in shows:
+            for show in snapshot.shows_in(edition, data["mode"]):
                 # we only want to count performances that actually happened (and not countries that are just voting)
-                performances = show.performance_set.filter(running_order__gt=0)
-                max_running_order = performances.aggregate(Max("running_order"))[
-                    "running_order__max"
-                ]
+                performances = snapshot.performances_in(show, competing=True)
+                max_running_order = max(
+                    (performance.running_order for performance in performances),
+                    default=None,
+                )
 
                 for performance in performances:
                     country = performance.country
@@ -46,9 +44,10 @@ class RunningOrderViewset(GenericViewSet):
 
                     dict[country][1] += 1
 
+        countries = get_country_registry()
         lst = [
             {
-                "country": CountrySerializer(country).data,
+                "country": countries.payload(country.id),
                 "result": dict[country][0] / dict[country][1],
             }
             for country in dict
@@ -59,6 +58,8 @@ class RunningOrderViewset(GenericViewSet):
         return lst
 
     @action(detail=False, methods=["POST"])
+    @etag_response
+    @cached_response
     def get_average_running_order(self, request):
         lst = self.calculate_average_running_order(
             {
@@ -10,7 +10,9 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
+from corsheaders.defaults import default_headers
 from django.utils.log import DEFAULT_LOGGING
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -40,10 +42,12 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'corsheaders',
     'rest_framework',
-    'data'
+    'apps.DataConfig'
 ]
 
 MIDDLEWARE = [
+    'middleware.InstrumentationMiddleware',
+    'middleware.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -112,6 +116,18 @@ CORS_ORIGIN_WHITELIST = [
     'http://localhost:5000'
 ]
 
+# The frontend revalidates responses with If-None-Match, so it has to be able to send that and read the ETag back
+# X-Profile asks for a request to be profiled, and names the saved profile in the response
+CORS_ALLOW_HEADERS = list(default_headers) + [
+    'if-none-match',
+    'x-profile',
+]
+
+CORS_EXPOSE_HEADERS = [
+    'etag',
+    'x-profile',
+]
+
 # Internationalization
 # https://docs.djangoproject.com/en/4.2/topics/i18n/
 
@@ -132,3 +148,121 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Seconds to wait after a vote changes before recalculating the results of its show,
+# so that a burst of edits is recalculated once (0 recalculates as soon as the change is committed)
+RESULTS_RECALCULATION_DELAY = 0
+
+# The most editions calculate_all_results recalculates at once (each worker thread holds its own database connection)
+RECALCULATION_MAX_WORKERS = 8
+
+# Cache for the JSON returned by the analytics endpoints (see response_cache.py)
+# BACKEND can be response_cache.MemoryBackend (per process) or response_cache.FileBackend (shared through DIRECTORY)
+RESPONSE_CACHE_ENABLED = True
+RESPONSE_CACHE = {
+    'BACKEND': 'response_cache.MemoryBackend',
+    'MAX_ENTRIES': 512,
+}
+
+# Per-year arrays behind the similarity endpoints, stored as compressed .npz files for each data version (see array_cache.py)
+# Restoring an older database dump can bring back a version number that's already stored, so clear DIRECTORY when doing that
+ARRAY_CACHE_ENABLED = True
+ARRAY_CACHE = {
+    'BACKEND': 'response_cache.FileBackend',
+    'DIRECTORY': BASE_DIR / '.array_cache',
+    'MAX_ENTRIES': 4096,
+}
+
+# Long get_similarity ranges have their years worked out on a shared pool of SIMILARITY_WORKERS threads
+# (1 turns this off), ranges of fewer than SIMILARITY_PARALLEL_MIN_YEARS years are done in the request's own thread
+SIMILARITY_WORKERS = 4
+SIMILARITY_PARALLEL_MIN_YEARS = 8
+
+# Simulations (see simulate.py) are run in batches of SIMULATION_BATCH_SIZE, spread over SIMULATION_WORKERS processes
+# (1 runs them in the request's own process), and a request can ask for at most SIMULATION_MAX_COUNT of them
+# Each batch is seeded separately, so changing SIMULATION_BATCH_SIZE changes the results a given seed gives
+SIMULATION_WORKERS = 4
+SIMULATION_BATCH_SIZE = 1000
+SIMULATION_MAX_COUNT = 200000
+
+# The data version (see version.py) is pushed to every worker with Postgres LISTEN/NOTIFY
+# Without the listener (or while it's reconnecting), workers re-read it at most every DATA_VERSION_POLL_INTERVAL seconds
+DATA_VERSION_LISTEN = True
+DATA_VERSION_POLL_INTERVAL = 1
+
+# Per-request query counts and timings are logged to the "instrumentation" logger (see middleware.py) at INFO,
+# so they only show up where INSTRUMENTATION_LOG_LEVEL=INFO is set in the environment (budget overruns are warnings)
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'instrumentation': {
+            'handlers': ['console'],
+            'level': os.environ.get('INSTRUMENTATION_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+    },
+}
+
+# Requests with an X-Profile header are run under cProfile when this is on (see middleware.py)
+# "X-Profile: inline" returns the report in place of the response, anything else saves it to PROFILING_DIRECTORY
+PROFILING_ENABLED = False
+PROFILING_DIRECTORY = BASE_DIR / '.profiles'
+
+# The most queries each endpoint (by URL name) may run, checked by the instrumentation middleware
+# Loading the snapshot (and the other data shared between requests) doesn't count, so these are the endpoints' own
+# queries, as measured on the test data: the analytics endpoints work from the snapshot and run none at all
+# The backtest runs 2 per year it predicts, so long ranges go over and log a warning
+QUERY_BUDGETS_ENFORCED = False
+QUERY_BUDGETS = {
+    'data-average-get-average-point-giver-count': 0,
+    'data-average-get-average-performance': 0,
+    'data-average-get-average-final-points': 0,
+    'data-average-get-average-semi-points': 0,
+    'data-average-get-average-place': 0,
+    'data-average-get-average-semi-place': 0,
+    'data-exchanges-get-points-from': 0,
+    'data-exchanges-get-points-to': 0,
+    'data-exchanges-get-friends': 0,
+    'data-exchanges-get-discrepancies': 0,
+    'data-exchanges-get-grid': 0,
+    'data-exchanges-get-exchanges': 0,
+    'data-exchanges-get-batch': 1,
+    'data-qualify-get-qualify-count': 1,
+    'data-qualify-get-qualify-rate': 1,
+    'data-qualify-get-longest-q-streak': 1,
+    'data-qualify-get-longest-nq-streak': 1,
+    'data-running-order-get-average-running-order': 0,
+    'data-votetypes-get-discrepancy': 0,
+    'data-votetypes-get-points-proportion': 0,
+    'data-languages-get-language-count': 0,
+    'data-languages-get-language-count-by-country': 0,
+    'data-languages-get-country-count': 0,
+    'data-languages-get-use-streak': 0,
+    'data-languages-get-qualification-rate': 0,
+    'data-languages-get-earliest-appearance': 0,
+    'data-languages-get-latest-appearance': 0,
+    'data-similarities-get-similarity': 0,
+    'data-similarities-get-jury-televote-similarity': 0,
+    'data-predict-country-affinity': 2,
+    'data-predict-simulate-contest': 2,
+    'data-predict-backtest': 4,
+    'data-predict-voting-bias': 1,
+    'data-countries-get-all': 1,
+    'data-countries-get-entries': 2,
+    'data-editions-get-all': 1,
+    'data-editions-get-entries': 2,
+    'data-entries-get-entries': 1,
+    'data-entries-get-entries-in-years': 3,
+    'data-entries-get-points-to': 5,
+    'data-entries-get-points-from': 4,
+    'data-groups-get-all': 2,
+    'data-results-get-results': 3,
+    'data-shows-get-results': 3,
+    'data-shows-get-show': 1,
+}
@@ -1,267 +1,360 @@
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
 from django.http import JsonResponse
 from enum import Enum
+from threading import Lock
 import numpy as np
 from rest_framework import viewsets
 from rest_framework.decorators import action
-from scipy.stats import spearmanr
 
-from rest.countries.viewset import CountrySerializer
-from models import Country, Edition, Show, ShowType, Vote, VoteType
+from rest.countries.registry import get_country_registry
+from models import VoteType
+from array_cache import cached_arrays
+from snapshot import get_snapshot
+from etags import etag_response
+from response_cache import cached_response
 
 
-class SimilarityViewSet(viewsets.GenericViewSet):
-    class RankType(Enum):
-        RAW_RANK = 0
-        PROPORTION = 1
+def cosine_similarities(values, ranked):
+    """
+    Cosine similarity of every pair of rows of a voter x receiver array (NaN where ranked is False)
+    Each pair is compared on the receivers both of them ranked, which leaves out their own entries
+    """
+    weights = ranked.astype(np.float64)
+    values = np.nan_to_num(values)
 
-    def get_ranking_matrix(
-        self, year: int, vote_type: VoteType, rank_type: RankType = RankType.PROPORTION
-    ):
-        """
-        Returns a "matrix" containing the rank given to each entry by each voting country.
-        The actual data structure will be a dict of dicts.
-        The outer dict will be keyed by the voting countries
-        The inner dicts will be keyed by the receiving countries (i.e. the participants)
-        The values will be the proportion of countries the giving country rated below the receiving country
-        So 1 for first place, 0 for last place
-        We'll only care about finals for now
-        """
+    dots = values @ values.T
+
+    # norms[i, j] is the squared norm of row i over the receivers row j ranked
+    norms = (values**2) @ weights.T
 
-        # Get the final for the given year
-        final = Show.objects.get(edition__year=year, show_type=ShowType.GRAND_FINAL)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return dots / np.sqrt(norms * norms.T)
 
-        # Get all the votes in the final
-        votes = Vote.objects.filter(
-            performance__in=final.performance_set.all(), vote_type=vote_type
+
+def average_ranks(values, mask):
+    """
+    Ranks the values along the last axis (1 for the lowest), only counting the positions where mask is True
+    Ties get their average rank, like spearmanr. values broadcasts against mask, so one row can be ranked
+    against several masks without copying it
+    """
+    # below[..., c, d] / level[..., c, d] is 1 if value d is less than / the same as value c
+    below = (values[..., None, :] < values[..., :, None]).astype(np.float64)
+    level = (values[..., None, :] == values[..., :, None]).astype(np.float64)
+
+    weights = mask.astype(np.float64)[..., None]
+    less = (below @ weights)[..., 0]
+    equal = (level @ weights)[..., 0]
+
+    return less + (equal + 1) / 2
+
+
+def pearson(x, y, mask):
+    """Pearson correlation of x and y along the last axis, over the positions where mask is True"""
+    mask = mask.astype(np.float64)
+    count = mask.sum(axis=-1, keepdims=True)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        dx = (x - (x * mask).sum(axis=-1, keepdims=True) / count) * mask
+        dy = (y - (y * mask).sum(axis=-1, keepdims=True) / count) * mask
+
+        return (dx * dy).sum(axis=-1) / np.sqrt(
+            (dx**2).sum(axis=-1) * (dy**2).sum(axis=-1)
         )
 
-        # Now we'll set up our matrix
-        matrix = {}
 
-        vote: Vote
-        for vote in votes:
-            # We'll just assume that all the entries are there if there are more than 10
-            # (10 normally implies only knowing the countries that got points)
-            if len(vote.ranking) <= 10:
-                continue
+def rank_similarities(values, ranked):
+    """
+    Spearman correlation of every pair of rows of a voter x receiver array (NaN where ranked is False)
+    Like spearmanr, each row is ranked (ties get their average rank) among the receivers both rows ranked
+    """
+    # common[i, j, c] is True if voters i and j both ranked receiver c
+    common = ranked[:, None, :] & ranked[None, :, :]
 
-            code = vote.performance.country.code
-            matrix[code] = {}
+    # ranks[i, j, c] is the rank of receiver c in voter i's values, counting only the receivers common to i and j
+    ranks = average_ranks(values[:, None, :], common)
 
-            # Let's iterate through the vote's rankings
-            for i in range(len(vote.ranking)):
-                if rank_type == self.RankType.RAW_RANK:
-                    matrix[code][vote.ranking[i]] = i + 1
-                elif rank_type == self.RankType.PROPORTION:
-                    value = 1 - i / (len(vote.ranking) - 1)
-                    matrix[code][vote.ranking[i]] = value
+    # then it's the Pearson correlation of the ranks, over the common receivers
+    return pearson(ranks, ranks.transpose(1, 0, 2), common)
 
-        return matrix
 
-    def get_jury_televote_cosine_similarity(self, year: int):
-        """
-        Gets a quantification of the difference between the jury and televote results for each country
-        We'll use cosine similarity for this
-        """
+def row_cosine_similarities(a, b, ranked):
+    """
+    Cosine similarity of each row of a with the same row of b, over the receivers ranked (True) in that row
+    """
+    a = np.where(ranked, a, 0)
+    b = np.where(ranked, b, 0)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (a * b).sum(axis=1) / np.sqrt(
+            (a**2).sum(axis=1) * (b**2).sum(axis=1)
+        )
 
-        result_dict = {}
 
-        # Get our matrices
-        jury_matrix = self.get_ranking_matrix(year, VoteType.JURY)
-        televote_matrix = self.get_ranking_matrix(year, VoteType.TELEVOTE)
+def row_rank_similarities(a, b, ranked):
+    """
+    Spearman correlation of each row of a with the same row of b, over the receivers ranked (True) in that row
+    """
+    return pearson(average_ranks(a, ranked), average_ranks(b, ranked), ranked)
 
-        for voter in jury_matrix:
-            if voter not in televote_matrix:
-                continue
 
-            jury = []
-            televote = []
+_executor = None
+_executor_lock = Lock()
 
-            # get entries in the same order
-            for receiver in jury_matrix[voter]:
-                if receiver not in televote_matrix[voter]:
-                    continue
 
-                jury.append(jury_matrix[voter][receiver])
-                televote.append(televote_matrix[voter][receiver])
+def get_executor():
+    """
+    Returns the thread pool that long get_similarity ranges share (settings.SIMILARITY_WORKERS threads)
+    Threads are enough here, since numpy lets go of the GIL for the heavy array operations
+    """
+    global _executor
 
-            # Calculate cosine similarity
-            dot_product = np.dot(jury, televote)
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.SIMILARITY_WORKERS,
+                    thread_name_prefix="similarity",
+                )
+
+    return _executor
+
+
+# the ways get_similarity can compare the voting of two countries
+SIMILARITIES = {
+    "cosine": cosine_similarities,
+    "rank": rank_similarities,
+}
 
-            jury_norm = np.linalg.norm(jury)
-            televote_norm = np.linalg.norm(televote)
+# the same, for comparing the jury and televote of each voter in get_jury_televote_similarity
+ROW_SIMILARITIES = {
+    "cosine": row_cosine_similarities,
+    "rank": row_rank_similarities,
+}
 
-            similarity = dot_product / (jury_norm * televote_norm)
 
-            result_dict[voter] = similarity
+class SimilarityViewSet(viewsets.GenericViewSet):
+    class RankType(Enum):
+        RAW_RANK = 0
+        PROPORTION = 1
 
+    def get_jury_televote_cosine_similarity(self, year: int):
+        """
+        Gets a quantification of the difference between the jury and televote results for each country
+        We'll use cosine similarity for this
+        """
+        return self.get_ranked_jury_televote_similarities(year, "cosine")
+
+    def get_jury_televote_rank_similarity(self, year: int):
+        """
+        Gets a quantification of the difference between the jury and televote results for each country
+        This uses the Spearman rank correlation coefficient
+        """
+        return self.get_ranked_jury_televote_similarities(year, "rank")
+
+    def get_ranked_jury_televote_similarities(self, year: int, mode: str):
+        """Every voter with a jury/televote similarity in the final of a year, most similar first"""
+        snapshot = get_snapshot()
+        tensor = snapshot.vote_tensor
+        similarities, mask = self.get_jury_televote_array(snapshot, year, mode)
+
+        countries = get_country_registry()
         lst = [
             {
-                "country": CountrySerializer(Country.objects.get(code=k)).data,
-                "similarity": v,
+                "country": countries.payload_for_code(
+                    snapshot.countries[tensor.countries[i]].code
+                ),
+                "similarity": similarities[i],
             }
-            for k, v in result_dict.items()
+            for i in np.flatnonzero(mask)
         ]
 
         lst = sorted(lst, key=lambda x: x["similarity"], reverse=True)
 
         return lst
 
-    def get_jury_televote_rank_similarity(self, year: int):
+    def get_jury_televote_array(self, snapshot, year: int, mode: str):
+        """calculate_jury_televote_array, stored for the snapshot's data version (see array_cache.py)"""
+        if mode not in ROW_SIMILARITIES:
+            raise ValueError(f"unknown similarity mode {mode}")
+
+        def compute():
+            similarities, mask = self.calculate_jury_televote_array(
+                snapshot, year, mode
+            )
+            return {"similarities": similarities, "mask": mask}
+
+        arrays = cached_arrays(
+            f"jury-televote-{year}-{mode}", snapshot.version, compute
+        )
+
+        return arrays["similarities"], arrays["mask"]
+
+    def calculate_jury_televote_array(self, snapshot, year: int, mode: str):
         """
-        Gets a quantification of the difference between the jury and televote results for each country
-        This uses the Spearman rank correlation coefficient
+        Works out how similar each country's jury and televote were in the final of a year, all voters at once
+        Each voter's two rows are compared on the receivers ranked in both
+        Returns the similarities, and a mask of the voters with a full ranking from both, indexed like the tensor's countries
         """
+        jury = self.get_ranking_array(snapshot, year, VoteType.JURY)
+        televote = self.get_ranking_array(snapshot, year, VoteType.TELEVOTE)
 
-        result_dict = {}
+        ranked = ~np.isnan(jury) & ~np.isnan(televote)
+        mask = ~np.isnan(jury).all(axis=1) & ~np.isnan(televote).all(axis=1)
 
-        # Get our matrices
-        jury_matrix = self.get_ranking_matrix(year, VoteType.JURY)
-        televote_matrix = self.get_ranking_matrix(year, VoteType.TELEVOTE)
+        similarities = np.full(len(mask), np.nan)
+        similarities[mask] = ROW_SIMILARITIES[mode](
+            jury[mask], televote[mask], ranked[mask]
+        )
 
-        for voter in jury_matrix:
-            if voter not in televote_matrix:
-                continue
+        return similarities, mask
 
-            jury = []
-            televote = []
+    def get_ranking_array(
+        self, snapshot, year: int, vote_type: VoteType, rank_type=RankType.PROPORTION
+    ):
+        """calculate_ranking_array, stored for the snapshot's data version (see array_cache.py)"""
+        arrays = cached_arrays(
+            f"ranking-{year}-{vote_type}-{rank_type.name}",
+            snapshot.version,
+            lambda: {
+                "values": self.calculate_ranking_array(
+                    snapshot, year, vote_type, rank_type
+                )
+            },
+        )
 
-            # get entries in the same order
-            for receiver in jury_matrix[voter]:
-                if receiver not in televote_matrix[voter]:
-                    continue
+        return arrays["values"]
 
-                jury.append(jury_matrix[voter][receiver])
-                televote.append(televote_matrix[voter][receiver])
+    def calculate_ranking_array(
+        self, snapshot, year: int, vote_type: VoteType, rank_type=RankType.PROPORTION
+    ):
+        """
+        Returns the place each voter gave each receiver in the final of a year, read from the snapshot's vote tensor
+        PROPORTION gives the proportion of receivers ranked below (1 for first place, 0 for last place)
+        It's a voter x receiver array (both axes indexed like the tensor's countries)
+        Wherever a voter didn't rank a receiver, and for every voter without a full ranking, the value is NaN
+        """
+        tensor = snapshot.vote_tensor
+        final = snapshot.final(snapshot.editions_by_year[year])
 
-            # now let's calculate the rank correlation
-            correlation = spearmanr(jury, televote).statistic
+        ranks = tensor.ranks[tensor.show_index[final.id], :, vote_type - 1].astype(
+            np.float64
+        )
+        lengths = (ranks > 0).sum(axis=1, keepdims=True)
 
-            result_dict[voter] = correlation
+        if rank_type == self.RankType.RAW_RANK:
+            values = ranks
+        elif rank_type == self.RankType.PROPORTION:
+            # 1 for first place, 0 for last place
+            with np.errstate(divide="ignore", invalid="ignore"):
+                values = 1 - (ranks - 1) / (lengths - 1)
 
-        lst = [
-            {
-                "country": CountrySerializer(Country.objects.get(code=k)).data,
-                "similarity": v,
-            }
-            for k, v in result_dict.items()
-        ]
+        values[ranks == 0] = np.nan
 
-        lst = sorted(lst, key=lambda x: x["similarity"], reverse=True)
+        # 10 or fewer places normally means we only know the countries that got points
+        values[lengths[:, 0] <= 10] = np.nan
 
-        return lst
+        return values
 
-    # TODO unify these next two functions
-    # likely with a function param that calculates similarity given two vectors
-    def calculate_cosine_similarity_matrix(self, year: int):
+    def get_summed_array(self, snapshot, year: int):
         """
-        Gets a "matrix" of the similarity between each pair of countries' voting.
-        We'll use cosine similarity to quantify this.
-        The actual data structure will be a dict of dicts.
-        Since similarity does not depend on the order of the countries, we will only store the upper triangle.
+        Sums the ranking arrays of every voting system used in the final of a year
+        The voters are the ones with a full ranking in the first voting system
         """
+        final = snapshot.final(snapshot.editions_by_year[year])
+        arrays = [
+            self.get_ranking_array(snapshot, year, system)
+            for system in final.voting_system
+        ]
 
-        # Get the ranking matrices for each voting type
-        voting_systems = Edition.objects.get(year=year).final.voting_system
-        matrices = [self.get_ranking_matrix(year, system) for system in voting_systems]
+        summed = arrays[0]
 
-        # Sum them (assuming all voting types have the same countries)
-        summed = {
-            voter: {
-                votee: sum(
-                    [matrix[voter][votee] for matrix in matrices if voter in matrix]
-                )
-                for votee in matrices[0][voter]
-            }
-            for voter in matrices[0]
-        }
+        # a voter missing from the other voting systems just keeps the first one's values
+        for array in arrays[1:]:
+            summed = summed + np.nan_to_num(array)
 
-        matrix = {}
+        return summed
 
-        # For each pair of countries, calculate the cosine similarity
-        for country_a in summed:
-            for country_b in summed:
-                # Let's skip this scenario to speed things up
-                if country_a >= country_b:
-                    continue
+    def get_similarity_array(self, snapshot, year: int, mode: str):
+        """calculate_similarity_array, stored for the snapshot's data version (see array_cache.py)"""
+        if mode not in SIMILARITIES:
+            raise ValueError(f"unknown similarity mode {mode}")
 
-                # Get vectors of scores (making sure to have them in the same order!)
-                # TODO account for the ranking of the other country since there will be a hole there
-                a_scores = [
-                    summed[country_a][country]
-                    for country in summed[country_a]
-                    if country != country_b
-                ]
+        def compute():
+            similarities, mask = self.calculate_similarity_array(snapshot, year, mode)
+            return {"similarities": similarities, "mask": mask}
 
-                b_scores = [
-                    summed[country_b][country]
-                    for country in summed[country_a]
-                    if country != country_b
-                ]
+        arrays = cached_arrays(f"similarity-{year}-{mode}", snapshot.version, compute)
 
-                # Calculate cosine similarity
-                dot_product = np.dot(a_scores, b_scores)
+        return arrays["similarities"], arrays["mask"]
 
-                a_norm = np.linalg.norm(a_scores)
-                b_norm = np.linalg.norm(b_scores)
+    def calculate_similarity_array(self, snapshot, year: int, mode: str):
+        """
+        Works out the similarity of the voting of every pair of countries in the final of a year
+        mode is "cosine" or "rank" (Spearman), see SIMILARITIES
+        Returns the similarities, and a mask of the pairs that have one, both indexed like the tensor's countries
+        """
+        tensor = snapshot.vote_tensor
+        summed = self.get_summed_array(snapshot, year)
 
-                similarity = dot_product / (a_norm * b_norm)
+        ranked = ~np.isnan(summed)
+        voters = np.flatnonzero(ranked.any(axis=1))
+        pairs = np.ix_(voters, voters)
 
-                if country_a not in matrix:
-                    matrix[country_a] = {}
+        similarities = np.full((len(tensor.countries),) * 2, np.nan)
+        similarities[pairs] = SIMILARITIES[mode](summed[voters], ranked[voters])
 
-                matrix[country_a][country_b] = similarity
+        mask = np.zeros(similarities.shape, dtype=bool)
+        mask[pairs] = True
+        np.fill_diagonal(mask, False)
 
-        return matrix
+        return similarities, mask
 
-    def get_rank_similarity_matrix(self, year: int):
-        # Get the ranking matrices for each voting type
-        voting_systems = Edition.objects.get(year=year).final.voting_system
-        matrices = [self.get_ranking_matrix(year, system) for system in voting_systems]
-
-        # Sum them (assuming all voting types have the same countries)
-        summed = {
-            voter: {
-                votee: sum(
-                    [matrix[voter][votee] for matrix in matrices if voter in matrix]
-                )
-                for votee in matrices[0][voter]
-            }
-            for voter in matrices[0]
-        }
-
-        matrix = {}
+    def map_years(self, snapshot, years, mode: str):
+        """
+        Returns get_similarity_array for each year, in order
+        Long ranges are spread over the similarity thread pool, short ones are done right here
+        """
+        workers = getattr(settings, "SIMILARITY_WORKERS", 1)
+        minimum = getattr(settings, "SIMILARITY_PARALLEL_MIN_YEARS", 8)
 
-        # For each pair of countries, calculate the rank similarity
-        for country_a in summed:
-            for country_b in summed:
-                # Let's skip this scenario to speed things up
-                if country_a >= country_b:
-                    continue
+        if workers <= 1 or len(years) < minimum:
+            return [self.get_similarity_array(snapshot, year, mode) for year in years]
 
-                # Get vectors of scores (making sure to have them in the same order!)
-                a_scores = [
-                    summed[country_a][country]
-                    for country in summed[country_a]
-                    if country != country_b
-                ]
+        # the tensor is built on first use, so build it once here rather than in every thread
+        snapshot.vote_tensor
 
-                b_scores = [
-                    summed[country_b][country]
-                    for country in summed[country_a]
-                    if country != country_b
-                ]
+        return list(
+            get_executor().map(
+                lambda year: self.get_similarity_array(snapshot, year, mode), years
+            )
+        )
 
-                # Calculate similarity
-                correlation = spearmanr(a_scores, b_scores).statistic
+    def calculate_similarity_matrix(self, year: int, mode: str):
+        """
+        Gets a "matrix" of the similarity between each pair of countries' voting.
+        The actual data structure will be a dict of dicts, keyed by country code.
+        Since similarity does not depend on the order of the countries, we will only store the upper triangle.
+        """
+        snapshot = get_snapshot()
+        tensor = snapshot.vote_tensor
+        similarities, mask = self.get_similarity_array(snapshot, year, mode)
 
-                if country_a not in matrix:
-                    matrix[country_a] = {}
+        codes = [snapshot.countries[id].code for id in tensor.countries]
+        matrix = {}
 
-                matrix[country_a][country_b] = correlation
+        for a, b in zip(*np.nonzero(mask)):
+            if codes[a] < codes[b]:
+                matrix.setdefault(codes[a], {})[codes[b]] = similarities[a, b]
 
         return matrix
 
+    def calculate_cosine_similarity_matrix(self, year: int):
+        return self.calculate_similarity_matrix(year, "cosine")
+
+    def get_rank_similarity_matrix(self, year: int):
+        return self.calculate_similarity_matrix(year, "rank")
+
     def get_ranked_cosine_similarities(self, year: int):
         """
         Get all country pairs ranked by similarity in voting
@@ -304,51 +397,113 @@ class SimilarityViewSet(viewsets.GenericViewSet):
         return lst
 
     @action(detail=False, methods=["POST"])
+    @etag_response
+    @cached_response
     def get_similarity(self, request):
         start_year = request.data["start_year"]
         end_year = request.data["end_year"]
         mode = request.data["mode"]
 
-        # dict of dicts: key 1 is country A, key 2 is country B, value is [sum, count]
-        result_dict = {}
-        countries = set()
+        if mode not in SIMILARITIES:
+            return JsonResponse({"error": "Invalid mode"}, status=400)
 
-        for year in range(start_year, end_year + 1):
-            if year == 2020:
-                continue
-
-            if mode == "cosine":
-                matrix = self.calculate_cosine_similarity_matrix(year)
-            elif mode == "rank":
-                matrix = self.get_rank_similarity_matrix(year)
-
-            for country_a in matrix:
-                if country_a not in result_dict:
-                    result_dict[country_a] = {}
-                    countries.add(country_a)
-
-                for country_b in matrix[country_a]:
-                    if country_b not in result_dict[country_a]:
-                        result_dict[country_a][country_b] = [0, 0]
-                        countries.add(country_b)
-
-                    similarity = matrix[country_a][country_b]
-                    result_dict[country_a][country_b][0] += similarity
-                    result_dict[country_a][country_b][1] += 1
-
-        # Now we'll calculate the average similarity for each pair
-        averaged = {
-            country_a: {
-                country_b: result_dict[country_a][country_b][0]
-                / result_dict[country_a][country_b][1]
-                for country_b in sorted(result_dict[country_a])
-            }
-            for country_a in sorted(result_dict)
-        }
+        snapshot = get_snapshot()
+        tensor = snapshot.vote_tensor
 
-        countries_lst = [
-            CountrySerializer(Country.objects.get(code=country)).data
-            for country in sorted(countries)
+        # the sum and count of the similarities of each pair, indexed like the tensor's countries
+        sums = np.zeros((len(tensor.countries),) * 2)
+        counts = np.zeros(sums.shape, dtype=np.int32)
+
+        # e.g. 2020, which had no contest
+        years = [
+            year
+            for year in range(start_year, end_year + 1)
+            if year in snapshot.editions_by_year
+            and snapshot.final(snapshot.editions_by_year[year]) is not None
         ]
 
+        # the years come back in order, so the sums always add up the same way
+        for similarities, mask in self.map_years(snapshot, years, mode):
+            sums[mask] += similarities[mask]
+            counts += mask
+
+        # Now we'll calculate the average similarity for each pair, keyed by code (upper triangle only)
+        codes = [snapshot.countries[id].code for id in tensor.countries]
+        countries = sorted(np.flatnonzero(counts.any(axis=0)), key=lambda i: codes[i])
+
+        averaged = {}
+
+        for position, a in enumerate(countries):
+            row = {
+                codes[b]: sums[a, b] / counts[a, b]
+                for b in countries[position + 1 :]
+                if counts[a, b] > 0
+            }
+
+            if row:
+                averaged[codes[a]] = row
+
+        registry = get_country_registry()
+        countries_lst = [registry.payload_for_code(codes[i]) for i in countries]
+
         return JsonResponse({"data": averaged, "countries": countries_lst}, safe=False)
+
+    @action(detail=False, methods=["POST"])
+    @etag_response
+    @cached_response
+    def get_jury_televote_similarity(self, request):
+        """
+        How similar each country's jury and televote were in each final of a range of years
+        mode is "cosine" or "rank" (Spearman)
+        Returns a country x year matrix, with None wherever a country didn't have both a jury and a televote
+        """
+        start_year = request.data["start_year"]
+        end_year = request.data["end_year"]
+        mode = request.data["mode"]
+
+        if mode not in ROW_SIMILARITIES:
+            return JsonResponse({"error": "Invalid mode"}, status=400)
+
+        snapshot = get_snapshot()
+        tensor = snapshot.vote_tensor
+
+        # only the years whose final had a separate jury and televote
+        years = []
+
+        for year in range(start_year, end_year + 1):
+            edition = snapshot.editions_by_year.get(year)
+            final = snapshot.final(edition) if edition is not None else None
+
+            if final is not None and {VoteType.JURY, VoteType.TELEVOTE} <= set(
+                final.voting_system
+            ):
+                years.append(year)
+
+        # country x year, like the response
+        similarities = np.full((len(tensor.countries), len(years)), np.nan)
+        mask = np.zeros(similarities.shape, dtype=bool)
+
+        for column, year in enumerate(years):
+            similarities[:, column], mask[:, column] = self.get_jury_televote_array(
+                snapshot, year, mode
+            )
+
+        codes = [snapshot.countries[id].code for id in tensor.countries]
+        countries = sorted(np.flatnonzero(mask.any(axis=1)), key=lambda i: codes[i])
+
+        registry = get_country_registry()
+
+        return JsonResponse(
+            {
+                "years": years,
+                "countries": [registry.payload_for_code(codes[i]) for i in countries],
+                "data": [
+                    [
+                        similarities[i, column] if mask[i, column] else None
+                        for column in range(len(years))
+                    ]
+                    for i in countries
+                ],
+            },
+            safe=False,
+        )
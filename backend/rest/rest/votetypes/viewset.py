@@ -2,8 +2,10 @@ from django.http import JsonResponse
 from rest_framework import viewsets
 from rest_framework.decorators import action
 
-from rest.countries.viewset import CountrySerializer
-from models import Performance, Result, ShowType
+from rest.countries.registry import get_country_registry
+from snapshot import get_snapshot
+from etags import etag_response
+from response_cache import cached_response
 
 
 class VoteTypeViewSet(viewsets.GenericViewSet):
@@ -14,22 +16,18 @@ class VoteTypeViewSet(viewsets.GenericViewSet):
         end_year = data["end_year"]
         average = data["average"]
 
-        performances = Performance.objects.filter(
-            show__edition__year__gte=start_year,
-            show__edition__year__lte=end_year,
-            running_order__gt=0,
-        )
-
-        if data["mode"] == "final":
-            performances = performances.filter(show__show_type=ShowType.GRAND_FINAL)
-        elif data["mode"] == "semi":
-            performances = performances.exclude(show__show_type=ShowType.GRAND_FINAL)
+        snapshot = get_snapshot()
+        performances = [
+            performance
+            for show in snapshot.shows_between(start_year, end_year, data["mode"])
+            for performance in snapshot.performances_in(show, competing=True)
+        ]
 
         # keys are countries, values are [difference, number of occurrences]
         dict = {}
 
         for performance in performances:
-            result = Result.objects.get(performance=performance)
+            result = snapshot.result(performance)
             # make sure we have both results for this performance
             if (
                 getattr(result, data["positive_key"], None) is None
@@ -48,9 +46,10 @@ class VoteTypeViewSet(viewsets.GenericViewSet):
 
             dict[country][1] += 1
 
+        countries = get_country_registry()
         lst = [
             {
-                "country": CountrySerializer(country).data,
+                "country": countries.payload(country.id),
                 "result": result[0] / result[1] if average else result[0],
             }
             for country, result in dict.items()
@@ -66,23 +65,19 @@ class VoteTypeViewSet(viewsets.GenericViewSet):
         start_year = data["start_year"]
         end_year = data["end_year"]
 
-        performances = Performance.objects.filter(
-            show__edition__year__gte=start_year,
-            show__edition__year__lte=end_year,
-            running_order__gt=0,
-        )
-
-        if data["mode"] == "final":
-            performances = performances.filter(show__show_type=ShowType.GRAND_FINAL)
-        elif data["mode"] == "semi":
-            performances = performances.exclude(show__show_type=ShowType.GRAND_FINAL)
+        snapshot = get_snapshot()
+        performances = [
+            performance
+            for show in snapshot.shows_between(start_year, end_year, data["mode"])
+            for performance in snapshot.performances_in(show, competing=True)
+        ]
 
         # keys are countries, values are [proportion, number of occurrences]
 
         dict = {}
 
         for performance in performances:
-            result = Result.objects.get(performance=performance)
+            result = snapshot.result(performance)
             # make sure we have both results for this performance
             if (
                 getattr(result, data["positive_key"], None) is None
@@ -108,9 +103,10 @@ class VoteTypeViewSet(viewsets.GenericViewSet):
 
             dict[country][1] += 1
 
+        countries = get_country_registry()
         lst = [
             {
-                "country": CountrySerializer(country).data,
+                "country": countries.payload(country.id),
                 "result": result[0] / result[1],
             }
             for country, result in dict.items()
@@ -121,6 +117,8 @@ class VoteTypeViewSet(viewsets.GenericViewSet):
         return lst
 
     @action(detail=False, methods=["POST"])
+    @etag_response
+    @cached_response
     def get_discrepancy(self, request):
         metric = request.data["metric"]  # points or places
 
@@ -141,6 +139,8 @@ class VoteTypeViewSet(viewsets.GenericViewSet):
         return JsonResponse(lst, safe=False)
 
     @action(detail=False, methods=["POST"])
+    @etag_response
+    @cached_response
     def get_points_proportion(self, request):
         lst = self.calculate_proportion(
             {
@@ -0,0 +1,180 @@
+from django.db.models import Q
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+
+from calculate import schedule_recalculation
+from models import (
+    Country,
+    Edition,
+    Entry,
+    Group,
+    Language,
+    Performance,
+    PointsAwarded,
+    QualificationStatus,
+    Result,
+    Show,
+    Vote,
+    VotingBias,
+)
+from version import bump_data_version
+
+# any change to the contest data bumps the data version,
+# which is what the snapshot, the country registry and the response cache are all keyed on
+for model in (
+    Country,
+    Edition,
+    Entry,
+    Group,
+    Language,
+    Performance,
+    Result,
+    Show,
+    Vote,
+):
+    post_save.connect(bump_data_version, sender=model)
+    post_delete.connect(bump_data_version, sender=model)
+
+m2m_changed.connect(bump_data_version, sender=Entry.languages.through)
+m2m_changed.connect(bump_data_version, sender=Group.countries.through)
+
+
+# PointsAwarded copies the voter, show and year onto every row, so it has to be rebuilt
+# whenever a vote changes or whatever it hangs off of does
+def rebuild_vote_points(sender, instance, **kwargs):
+    PointsAwarded.objects.rebuild(Vote.objects.filter(id=instance.id))
+
+
+def rebuild_performance_points(sender, instance, **kwargs):
+    PointsAwarded.objects.rebuild(Vote.objects.filter(performance=instance))
+
+
+def rebuild_show_points(sender, instance, **kwargs):
+    PointsAwarded.objects.rebuild(Vote.objects.filter(performance__show=instance))
+
+
+# an edition's rows only copy its year (and host), so they're left alone when anything else about it is edited
+def remember_edition_fields(sender, instance, raw=False, **kwargs):
+    if raw or instance.pk is None:
+        return
+
+    instance._fields_before_save = (
+        Edition.objects.filter(pk=instance.pk).values("year", "host_id").first()
+    )
+
+
+def edition_changed(instance, created, fields):
+    """Whether a just saved edition is new, or had any of the given fields changed by the save"""
+    before = getattr(instance, "_fields_before_save", None)
+
+    if created or before is None:
+        return True
+
+    return any(before[field] != getattr(instance, field) for field in fields)
+
+
+def rebuild_edition_points(sender, instance, created=False, raw=False, **kwargs):
+    # fixtures come with their own rows
+    if raw or not edition_changed(instance, created, ["year"]):
+        return
+
+    PointsAwarded.objects.rebuild(
+        Vote.objects.filter(performance__show__edition=instance)
+    )
+
+
+# deleting a vote (or anything above it) cascades to its rows, so we only need to handle saves
+pre_save.connect(remember_edition_fields, sender=Edition)
+post_save.connect(rebuild_vote_points, sender=Vote)
+post_save.connect(rebuild_performance_points, sender=Performance)
+post_save.connect(rebuild_show_points, sender=Show)
+post_save.connect(rebuild_edition_points, sender=Edition)
+
+
+# results are worked out from the votes, so a show's results have to be recalculated when its votes change
+# a performance's running order also decides whether it gets a result at all
+def recalculate_vote_results(sender, instance, raw=False, **kwargs):
+    # fixtures come with their own results
+    if raw:
+        return
+
+    show_id = (
+        Performance.objects.filter(id=instance.performance_id)
+        .values_list("show_id", flat=True)
+        .first()
+    )
+
+    if show_id is not None:
+        schedule_recalculation(show_id)
+
+
+def recalculate_performance_results(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+
+    schedule_recalculation(instance.show_id)
+
+
+post_save.connect(recalculate_vote_results, sender=Vote)
+post_delete.connect(recalculate_vote_results, sender=Vote)
+post_save.connect(recalculate_performance_results, sender=Performance)
+
+
+# QualificationStatus is worked out from an edition's final, its host and who's in the Big Five
+# rows of a show or performance that moved to another edition have to be redone in the old edition too
+def rebuild_show_qualification(sender, instance, **kwargs):
+    QualificationStatus.objects.rebuild(
+        Edition.objects.filter(
+            Q(id=instance.edition_id)
+            | Q(qualificationstatus__performance__show=instance)
+        ).distinct()
+    )
+
+
+def rebuild_performance_qualification(sender, instance, **kwargs):
+    QualificationStatus.objects.rebuild(
+        Edition.objects.filter(
+            Q(show__id=instance.show_id) | Q(qualificationstatus__performance=instance)
+        ).distinct()
+    )
+
+
+def rebuild_edition_qualification(sender, instance, created=False, raw=False, **kwargs):
+    if raw or not edition_changed(instance, created, ["year", "host_id"]):
+        return
+
+    QualificationStatus.objects.rebuild(Edition.objects.filter(id=instance.id))
+
+
+def rebuild_country_qualification(sender, instance, **kwargs):
+    QualificationStatus.objects.rebuild(
+        Edition.objects.filter(show__performance__country=instance).distinct()
+    )
+
+
+# deletes cascade to the rows of the performance (or anything above it), so again we only handle saves
+post_save.connect(rebuild_show_qualification, sender=Show)
+post_save.connect(rebuild_performance_qualification, sender=Performance)
+post_save.connect(rebuild_edition_qualification, sender=Edition)
+post_save.connect(rebuild_country_qualification, sender=Country)
+
+
+# VotingBias copies the year and show type onto every row too, but the votes and results it comes from
+# are handled by recalculate_shows (see calculate.py)
+# as with QualificationStatus, a show that moved to another edition has to be redone in the old edition too
+def rebuild_show_biases(sender, instance, **kwargs):
+    VotingBias.objects.rebuild(
+        Edition.objects.filter(
+            Q(id=instance.edition_id) | Q(votingbias__show=instance)
+        ).distinct()
+    )
+
+
+def rebuild_edition_biases(sender, instance, created=False, raw=False, **kwargs):
+    if raw or not edition_changed(instance, created, ["year"]):
+        return
+
+    VotingBias.objects.rebuild(Edition.objects.filter(id=instance.id))
+
+
+post_save.connect(rebuild_show_biases, sender=Show)
+post_save.connect(rebuild_edition_biases, sender=Edition)
@@ -0,0 +1,211 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from threading import Lock
+from time import perf_counter
+
+import numpy as np
+
+# this module is sent to worker processes, so it only uses numpy (no Django, no models)
+
+
+class ContestModel:
+    """
+    Everything a simulated contest is drawn from, as plain arrays (so it can be sent to a worker process)
+
+    candidates are the countries that can reach the final: the automatic qualifiers first, then the competitors
+    of each semi-final in turn. Countries are referred to by their position in candidates, except for voters,
+    who can be anyone and are referred to by their own index
+
+    Each voter ranks the competitors of a show by affinity + quality + noise, where affinity is what the voter
+    has historically given the competitor over its average, quality is drawn once per simulation for each
+    candidate (some songs are just better that year), and noise is drawn for every vote
+    """
+
+    def __init__(
+        self,
+        candidates,
+        automatic,
+        semis,
+        final,
+        quality_sd,
+        noise_sd,
+        qualifiers,
+        points,
+    ):
+        self.candidates = candidates
+        self.automatic = automatic
+
+        # each show is a dict of
+        # "competitors" (positions in candidates), "affinities" (voter x competitor)
+        # and "voting" (voter x vote type, True where the voter casts that kind of vote)
+        self.semis = semis
+        self.final = final
+
+        self.quality_sd = quality_sd
+        self.noise_sd = noise_sd
+
+        # how many countries qualify from each semi-final
+        self.qualifiers = qualifiers
+
+        # the points given to each place, best first
+        self.points = np.asarray(points)
+
+    @property
+    def finalists(self):
+        return self.automatic + sum(
+            min(self.qualifiers, len(semi["competitors"])) for semi in self.semis
+        )
+
+
+def score_show(rng, affinities, voting, quality, noise_sd, points):
+    """
+    Simulates the votes of a show, for a batch of simulations at once
+    affinities is voter x competitor, or simulations x voter x competitor when the line-up varies between simulations,
+    voting is voter x vote type and quality is simulations x competitor
+    Returns the total points of each competitor in each simulation, with a random fraction added to break ties
+    """
+    size, count = quality.shape
+    voters, vote_types = voting.shape
+
+    # costs[n, v, t, c] is minus how much voter v likes competitor c in vote type t of simulation n
+    # (the noise is symmetric, so it doesn't need negating), a voter can't vote for themselves so theirs is inf
+    costs = rng.standard_normal((size, voters, vote_types, count), dtype=np.float32)
+    costs *= noise_sd
+    costs -= affinities.reshape(-1, voters, 1, count)
+    costs -= quality[:, None, None, :]
+
+    # a full sort of these short rows is quicker than partitioning them, and gives the top places in order
+    places = min(len(points), count)
+    top = np.argsort(costs, axis=-1)[..., :places]
+    weights = points[:places] * voting[None, :, :, None]
+
+    # nobody gets points they can't get (when there are fewer competitors than points)
+    if places == count:
+        weights = weights * np.isfinite(np.take_along_axis(costs, top, axis=-1))
+
+    # add up the points each competitor got in each simulation
+    top += np.arange(size)[:, None, None, None] * count
+    totals = np.bincount(
+        top.ravel(), np.broadcast_to(weights, top.shape).ravel(), minlength=size * count
+    )
+
+    return totals.reshape(size, count) + rng.random((size, count)) / 2
+
+
+def simulate_batch(model: ContestModel, seed, size):
+    """
+    Simulates a batch of contests
+    Returns how many times each candidate qualified, and how many times it got each place in the final
+    """
+    rng = np.random.default_rng(seed)
+    count = len(model.candidates)
+    finalists = model.finalists
+
+    quality = rng.normal(0, model.quality_sd, (size, count)).astype(np.float32)
+
+    # the automatic qualifiers are always in the final
+    qualified = np.zeros((size, count), dtype=bool)
+    qualified[:, : model.automatic] = True
+
+    for semi in model.semis:
+        competitors = semi["competitors"]
+        totals = score_show(
+            rng,
+            semi["affinities"],
+            semi["voting"],
+            quality[:, competitors],
+            model.noise_sd,
+            model.points,
+        )
+
+        # the best totals qualify
+        ranking = np.argsort(-totals, axis=1)[:, : model.qualifiers]
+        qualified[np.arange(size)[:, None], competitors[ranking]] = True
+
+    # lineups[n] are the candidates in the final of simulation n (the same number every time)
+    lineups = np.nonzero(qualified)[1].reshape(size, finalists)
+
+    totals = score_show(
+        rng,
+        model.final["affinities"][:, lineups].transpose(1, 0, 2),
+        model.final["voting"],
+        np.take_along_axis(quality, lineups, axis=1),
+        model.noise_sd,
+        model.points,
+    )
+
+    # the candidate in each place (from 0) of the final of each simulation
+    standings = np.take_along_axis(lineups, np.argsort(-totals, axis=1), axis=1)
+    place_counts = np.bincount(
+        (standings * finalists + np.arange(finalists)).ravel(),
+        minlength=count * finalists,
+    )
+
+    return qualified.sum(axis=0), place_counts.reshape(count, finalists)
+
+
+_pool = None
+_pool_workers = None
+_pool_lock = Lock()
+
+
+def get_pool(workers):
+    """
+    Returns a process pool of the given size, shared between calls (it's replaced if the size changes)
+    The workers are spawned rather than forked, since the server may have threads running
+    """
+    global _pool, _pool_workers
+
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown()
+
+            _pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            _pool_workers = workers
+
+    return _pool
+
+
+def simulate(model: ContestModel, simulations, seed=0, workers=1, batch_size=1000):
+    """
+    Simulates the contest a number of times, in batches of batch_size
+    Each batch gets its own seed, spawned from the given one, so the same seed and batch size always give
+    the same results, however many workers there are. With workers > 1, the batches are spread over a process pool
+    Returns how many times each candidate qualified, and how many times it got each place in the final
+    """
+    sizes = [batch_size] * (simulations // batch_size)
+
+    if simulations % batch_size:
+        sizes.append(simulations % batch_size)
+
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    models = [model] * len(sizes)
+
+    if workers <= 1 or len(sizes) <= 1:
+        batches = map(simulate_batch, models, seeds, sizes)
+    else:
+        batches = get_pool(workers).map(simulate_batch, models, seeds, sizes)
+
+    qualified = np.zeros(len(model.candidates), dtype=np.int64)
+    places = np.zeros((len(model.candidates), model.finalists), dtype=np.int64)
+
+    for batch_qualified, batch_places in batches:
+        qualified += batch_qualified
+        places += batch_places
+
+    return qualified, places
+
+
+def timed_simulate(model: ContestModel, simulations, seed=0, batch_size=1000):
+    """
+    Simulates the contest in this process (for spreading whole contests over a pool, see backtest.py)
+    Returns the results of simulate and how many seconds it took
+    """
+    start = perf_counter()
+    qualified, places = simulate(model, simulations, seed, 1, batch_size)
+
+    return qualified, places, perf_counter() - start
@@ -0,0 +1,269 @@
+from functools import cached_property
+from threading import Lock
+
+from middleware import loading_shared_data
+from models import (
+    Country,
+    Edition,
+    Entry,
+    Language,
+    Performance,
+    POINTS_PER_PLACE,
+    Result,
+    Show,
+    ShowType,
+    Vote,
+)
+from tensors import VoteTensor
+from version import get_data_version
+
+
+class Snapshot:
+    """
+    A read-only, in-memory copy of the contest data.
+    Everything is loaded with one query per table and indexed by id (and by code/year where it makes sense),
+    so the analytics viewsets can walk editions -> shows -> performances -> votes/results without
+    going back to the database for every row.
+    The model instances have their foreign keys wired up to each other, so things like
+    result.performance.show.edition don't trigger any queries either.
+    """
+
+    def __init__(self, version=None):
+        # the data version this snapshot was loaded at
+        self.version = version
+
+        self.countries = {
+            country.id: country for country in Country.objects.order_by("id")
+        }
+        self.countries_by_code = {
+            country.code: country for country in self.countries.values()
+        }
+
+        self.editions = {}
+        self.editions_by_year = {}
+
+        for edition in Edition.objects.order_by("id"):
+            edition.host = self.countries[edition.host_id]
+            self.editions[edition.id] = edition
+            self.editions_by_year[edition.year] = edition
+
+        # keys are edition ids, values are lists of shows in that edition
+        self.shows = {}
+        self.edition_shows = {id: [] for id in self.editions}
+
+        for show in Show.objects.order_by("id"):
+            show.edition = self.editions[show.edition_id]
+            self.shows[show.id] = show
+            self.edition_shows[show.edition_id].append(show)
+
+        # keys are show ids, values are lists of performances in that show
+        self.performances = {}
+        self.show_performances = {id: [] for id in self.shows}
+
+        # keys are (show id, country id)
+        self.performances_by_country = {}
+
+        for performance in Performance.objects.order_by("id"):
+            performance.country = self.countries[performance.country_id]
+            performance.show = self.shows[performance.show_id]
+            self.performances[performance.id] = performance
+            self.show_performances[performance.show_id].append(performance)
+            self.performances_by_country[
+                (performance.show_id, performance.country_id)
+            ] = performance
+
+        # keys are performance ids, values are lists of votes
+        self.votes = {}
+        self.performance_votes = {id: [] for id in self.performances}
+
+        for vote in Vote.objects.order_by("id"):
+            vote.performance = self.performances[vote.performance_id]
+            self.votes[vote.id] = vote
+            self.performance_votes[vote.performance_id].append(vote)
+
+        # keys are performance ids
+        self.results = {}
+
+        for result in Result.objects.order_by("id"):
+            result.performance = self.performances[result.performance_id]
+            self.results[result.performance_id] = result
+
+        self.languages = {
+            language.id: language for language in Language.objects.order_by("id")
+        }
+
+        # keys are entry ids, values are lists of languages
+        self.entry_languages = {}
+
+        for entry_id, language_id in Entry.languages.through.objects.order_by(
+            "id"
+        ).values_list("entry_id", "language_id"):
+            if entry_id not in self.entry_languages:
+                self.entry_languages[entry_id] = []
+
+            self.entry_languages[entry_id].append(self.languages[language_id])
+
+        # keys are edition ids, values are lists of entries
+        self.entries = {}
+        self.edition_entries = {id: [] for id in self.editions}
+
+        for entry in Entry.objects.order_by("id"):
+            entry.country = self.countries[entry.country_id]
+            entry.year = self.editions[entry.year_id]
+            self.entries[entry.id] = entry
+            self.edition_entries[entry.year_id].append(entry)
+
+    @cached_property
+    def vote_tensor(self) -> VoteTensor:
+        """Points/rank tensor over every vote in the snapshot, built the first time it's needed"""
+        return VoteTensor(
+            self.countries.values(),
+            self.shows.values(),
+            self.performances.values(),
+            self.votes.values(),
+        )
+
+    def editions_between(self, start_year, end_year):
+        """Returns the editions in the given range of years, in chronological order"""
+        return [
+            self.editions_by_year[year]
+            for year in sorted(self.editions_by_year)
+            if start_year <= year <= end_year
+        ]
+
+    def shows_in(self, edition: Edition, mode=None):
+        """
+        Returns the shows of an edition
+        mode can be "final" (grand final only), "semi" (semi-finals only) or None (everything)
+        """
+        shows = self.edition_shows[edition.id]
+
+        if mode == "final":
+            return [show for show in shows if show.show_type == ShowType.GRAND_FINAL]
+        elif mode == "semi":
+            return [show for show in shows if show.show_type != ShowType.GRAND_FINAL]
+
+        return list(shows)
+
+    def shows_between(self, start_year, end_year, mode=None):
+        return [
+            show
+            for edition in self.editions_between(start_year, end_year)
+            for show in self.shows_in(edition, mode)
+        ]
+
+    def final(self, edition: Edition):
+        return next(
+            (
+                show
+                for show in self.edition_shows[edition.id]
+                if show.show_type == ShowType.GRAND_FINAL
+            ),
+            None,
+        )
+
+    def performances_in(self, show: Show, competing=None):
+        """
+        Returns the performances in a show
+        competing=True only gives countries that actually performed, competing=False only those that just voted
+        """
+        performances = self.show_performances[show.id]
+
+        if competing is None:
+            return list(performances)
+
+        return [
+            performance
+            for performance in performances
+            if (performance.running_order > 0) == competing
+        ]
+
+    def performance(self, show: Show, country_id):
+        return self.performances_by_country.get((show.id, country_id))
+
+    def edition_performances(self, edition: Edition, competing=None):
+        return [
+            performance
+            for show in self.edition_shows[edition.id]
+            for performance in self.performances_in(show, competing)
+        ]
+
+    def votes_of(self, performance: Performance, vote_type=None):
+        votes = self.performance_votes[performance.id]
+
+        if vote_type is None:
+            return list(votes)
+
+        return [vote for vote in votes if vote.vote_type == vote_type]
+
+    def votes_in(self, show: Show, vote_type=None):
+        return [
+            vote
+            for performance in self.show_performances[show.id]
+            for vote in self.votes_of(performance, vote_type)
+        ]
+
+    def result(self, performance: Performance):
+        return self.results.get(performance.id)
+
+    def results_of(self, performances):
+        """Returns the results of the given performances (the ones that have any), in the order they were created"""
+        results = [self.results.get(performance.id) for performance in performances]
+        return sorted(
+            [result for result in results if result is not None], key=lambda x: x.id
+        )
+
+    def entries_between(self, start_year, end_year):
+        return [
+            entry
+            for edition in self.editions_between(start_year, end_year)
+            for entry in self.edition_entries[edition.id]
+        ]
+
+    def entry_languages_of(self, entry: Entry):
+        return self.entry_languages.get(entry.id, [])
+
+    def maximum_possible(self, show: Show):
+        """Same as Show.get_maximum_possible, without the count query"""
+        num_countries = len(self.show_performances[show.id])
+        num_votes = len(show.voting_system)
+        # we can't vote for our own country, so subtract 1
+        return (num_countries - 1) * num_votes * POINTS_PER_PLACE[0]
+
+    def automatic_qualifiers(self, edition: Edition):
+        """Same as Edition.get_automatic_qualifiers, from memory"""
+        return [
+            performance.country_id
+            for performance in self.performances_in(self.final(edition))
+            if performance.country.is_big_five
+            or performance.country_id == edition.host_id
+        ]
+
+
+_snapshot = None
+_lock = Lock()
+
+
+def get_snapshot() -> Snapshot:
+    """
+    Returns the process-wide snapshot, loading it if the data has changed since it was last loaded
+    """
+    global _snapshot
+
+    # we take the version before loading, so if the data changes while we load,
+    # the snapshot is already out of date and gets reloaded on the next call
+    version = get_data_version()
+    snapshot = _snapshot
+
+    if snapshot is None or snapshot.version != version:
+        with _lock:
+            snapshot = _snapshot
+
+            # someone else may have loaded it while we were waiting for the lock
+            if snapshot is None or snapshot.version != version:
+                with loading_shared_data():
+                    snapshot = Snapshot(version)
+
+                _snapshot = snapshot
+
+    return snapshot
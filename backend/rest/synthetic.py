@@ -0,0 +1,346 @@
+from itertools import product
+from string import ascii_lowercase
+
+import numpy as np
+from django.db import connection, transaction
+
+from calculate import recalculate_editions
+from models import (
+    Country,
+    Edition,
+    Entry,
+    Group,
+    Language,
+    Performance,
+    PointsAwarded,
+    POINTS_PER_PLACE,
+    QualificationStatus,
+    Show,
+    ShowType,
+    Vote,
+    VoteType,
+)
+from version import bump_data_version
+
+# real codes go first so that small datasets look familiar, made up ones are only used past these
+REAL_CODES = (
+    "se no dk fi is ie gb fr de it es pt nl be lu ch at mt cy gr tr il al mk rs me ba hr si "
+    "hu sk cz pl lt lv ee ua by md ro bg ru ge am az au sm ad mc"
+).split()
+BIG_FIVE = ["fr", "de", "it", "es", "gb"]
+
+LANGUAGES = ["English", "French", "Italian", "Spanish", "German", "Swedish", "Other"]
+
+# most qualifiers we take from each semi-final, like the real contest
+QUALIFIERS_PER_SEMI = 10
+
+# editions are generated and saved this many at a time, so memory use doesn't grow with the history
+CHUNK_YEARS = 25
+
+
+def country_codes(count):
+    """Returns count distinct two letter codes, real ones first"""
+    made_up = [
+        a + b
+        for a, b in product(ascii_lowercase, repeat=2)
+        if a + b not in REAL_CODES and a + b != "un"
+    ]
+    codes = (REAL_CODES + made_up)[:count]
+
+    if len(codes) < count:
+        raise ValueError(f"can't make more than {len(codes)} countries")
+
+    return codes
+
+
+class ContestGenerator:
+    """
+    Fills the database with a made up, but realistic looking, contest history
+
+    Every country has a hidden "quality" and every pair of countries an "affinity" (neighbours vote for each other),
+    and each vote ranks the competitors by quality + affinity + noise, so the analytics have patterns to find
+    scale multiplies the number of years generated, for load testing (e.g. scale=100 with 27 years gives 2700)
+    """
+
+    def __init__(
+        self,
+        start_year=1998,
+        years=27,
+        countries=44,
+        semis=2,
+        full_rankings=True,
+        split_from=2016,
+        scale=1,
+        seed=0,
+    ):
+        self.start_year = start_year
+        self.years = years * scale
+        self.semis = semis
+        self.full_rankings = full_rankings
+        self.split_from = split_from
+        self.rng = np.random.default_rng(seed)
+
+        # editions generated but not saved yet
+        self.pending = []
+
+        self.codes = country_codes(countries)
+        self.big_five = [code for code in BIG_FIVE if code in self.codes]
+
+        self.quality = self.rng.normal(0, 1, len(self.codes))
+
+        # affinities are symmetric, like most real voting blocs
+        affinity = self.rng.normal(0, 1, (len(self.codes), len(self.codes)))
+        self.affinity = (affinity + affinity.T) / 2
+
+    @staticmethod
+    def flush():
+        """Empties every contest table (deleting countries, languages and groups cascades to the rest)"""
+        tables = [model._meta.db_table for model in (Country, Language, Group)]
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"TRUNCATE {', '.join(tables)} RESTART IDENTITY CASCADE")
+
+    def generate(self, workers=1, log=None):
+        """Generates everything, then works out results and the derived tables the signals would have filled"""
+        log = log or (lambda message: None)
+
+        self.countries = Country.objects.bulk_create(
+            [
+                Country(
+                    name=code.upper() + "land",
+                    adjective=code.upper() + "ish",
+                    code=code,
+                    is_big_five=code in self.big_five,
+                )
+                for code in self.codes
+            ]
+        )
+        self.languages = Language.objects.bulk_create(
+            [Language(name=name) for name in LANGUAGES]
+        )
+
+        nordics = Group.objects.create(name="Nordics")
+        nordics.countries.set(
+            [country for country in self.countries if country.code in REAL_CODES[:5]]
+        )
+
+        winner = int(self.rng.integers(len(self.codes)))
+        editions = []
+
+        for start in range(0, self.years, CHUNK_YEARS):
+            years = range(
+                self.start_year + start,
+                self.start_year + min(start + CHUNK_YEARS, self.years),
+            )
+
+            with transaction.atomic():
+                for year in years:
+                    winner = self.generate_edition(year, winner)
+
+                editions.extend(self.save_chunk())
+
+            log(f"generated {years[0]}-{years[-1]}")
+
+        recalculate_editions(editions, workers)
+        log("calculated results")
+
+        # bulk_create skips the signals that keep these up to date
+        for start in range(0, len(editions), CHUNK_YEARS):
+            chunk = [edition.id for edition in editions[start : start + CHUNK_YEARS]]
+            PointsAwarded.objects.rebuild(
+                Vote.objects.filter(performance__show__edition__in=chunk)
+            )
+            QualificationStatus.objects.rebuild(Edition.objects.filter(id__in=chunk))
+
+        log("rebuilt derived tables")
+
+        bump_data_version()
+
+        return editions
+
+    def generate_edition(self, year, host):
+        """Generates one edition in memory (saved by save_chunk), and returns the index of its winner"""
+        # most countries take part most years
+        count = len(self.codes)
+        participants = set(
+            self.rng.choice(count, int(count * self.rng.uniform(0.7, 0.95)), False)
+        )
+        participants |= {self.codes.index(code) for code in self.big_five} | {host}
+        participants = sorted(participants)
+
+        automatic = [
+            i for i in participants if self.codes[i] in self.big_five or i == host
+        ]
+        others = [i for i in participants if i not in automatic]
+
+        if self.split_from is not None and year >= self.split_from:
+            voting_system = [VoteType.JURY, VoteType.TELEVOTE]
+        else:
+            voting_system = [VoteType.COMBINED]
+
+        shows = []
+
+        # without semi-finals (or with too few countries for them) everyone goes to the final
+        if self.semis == 0 or len(others) <= QUALIFIERS_PER_SEMI * self.semis:
+            finalists = participants
+            non_qualifiers = []
+
+        else:
+            self.rng.shuffle(others)
+            qualifiers = []
+            non_qualifiers = []
+
+            for i in range(self.semis):
+                competitors = others[i :: self.semis]
+
+                # the automatic qualifiers vote in (one of) the semi-finals
+                voters = automatic[i :: self.semis]
+
+                show = self.make_show(
+                    ShowType(i + 1), voting_system, competitors, voters
+                )
+                shows.append(show)
+
+                ranked = sorted(
+                    competitors, key=lambda x: show["totals"][x], reverse=True
+                )
+                qualifiers.extend(ranked[:QUALIFIERS_PER_SEMI])
+                non_qualifiers.extend(ranked[QUALIFIERS_PER_SEMI:])
+
+            finalists = automatic + qualifiers
+
+        final = self.make_show(
+            ShowType.GRAND_FINAL, voting_system, finalists, non_qualifiers
+        )
+        shows.append(final)
+
+        self.pending.append(
+            {
+                "edition": Edition(
+                    year=year, host=self.countries[host], city=f"City {year}"
+                ),
+                "participants": participants,
+                "shows": shows,
+            }
+        )
+
+        return max(finalists, key=lambda x: final["totals"][x])
+
+    def make_show(self, show_type, voting_system, competitors, voters):
+        """Generates the running order and votes of a show, along with the points each competitor got"""
+        order = self.rng.permutation(competitors).tolist()
+        performances = [(i, position + 1) for position, i in enumerate(order)]
+        performances.extend((i, 0) for i in voters)
+
+        votes = []
+        totals = {i: 0 for i in competitors}
+
+        for voter, _ in performances:
+            for vote_type in voting_system:
+                # televotes are a bit noisier than juries
+                noise = 1.5 if vote_type == VoteType.TELEVOTE else 1
+                ranking = self.ranking(voter, competitors, noise)
+                votes.append((voter, vote_type, ranking))
+
+                for place, i in enumerate(ranking[: len(POINTS_PER_PLACE)]):
+                    totals[i] += POINTS_PER_PLACE[place]
+
+        return {
+            "show_type": show_type,
+            "voting_system": voting_system,
+            "performances": performances,
+            "votes": votes,
+            "totals": totals,
+        }
+
+    def ranking(self, voter, competitors, noise):
+        """Returns the indices of the competitors (minus the voter), best first"""
+        competitors = np.array([i for i in competitors if i != voter])
+        scores = (
+            self.quality[competitors]
+            + 0.6 * self.affinity[voter, competitors]
+            + self.rng.normal(0, noise, len(competitors))
+        )
+        ranking = competitors[np.argsort(-scores)].tolist()
+
+        return ranking if self.full_rankings else ranking[: len(POINTS_PER_PLACE)]
+
+    def save_chunk(self):
+        """Saves the editions generated since the last call, one bulk_create per table"""
+        pending = self.pending
+        self.pending = []
+
+        editions = Edition.objects.bulk_create([x["edition"] for x in pending])
+
+        entries = []
+        languages = []
+
+        for x in pending:
+            for i in x["participants"]:
+                entries.append(
+                    Entry(
+                        title=f"Song {self.codes[i]} {x['edition'].year}",
+                        artist=f"Artist {self.codes[i]}",
+                        country=self.countries[i],
+                        year=x["edition"],
+                    )
+                )
+
+                # most songs are in one language, some mix in a second
+                count = 1 if self.rng.random() < 0.8 else 2
+                languages.append(
+                    self.rng.choice(len(self.languages), count, False).tolist()
+                )
+
+        entries = Entry.objects.bulk_create(entries)
+        Entry.languages.through.objects.bulk_create(
+            [
+                Entry.languages.through(entry=entry, language=self.languages[language])
+                for entry, indices in zip(entries, languages)
+                for language in indices
+            ]
+        )
+
+        shows = Show.objects.bulk_create(
+            [
+                Show(
+                    edition=x["edition"],
+                    show_type=show["show_type"],
+                    voting_system=show["voting_system"],
+                )
+                for x in pending
+                for show in x["shows"]
+            ]
+        )
+        generated = [show for x in pending for show in x["shows"]]
+
+        performances = Performance.objects.bulk_create(
+            [
+                Performance(
+                    country=self.countries[i], show=show, running_order=running_order
+                )
+                for show, data in zip(shows, generated)
+                for i, running_order in data["performances"]
+            ]
+        )
+
+        # votes are generated in the same order as the performances
+        by_country = {
+            (performance.show_id, performance.country_id): performance
+            for performance in performances
+        }
+
+        Vote.objects.bulk_create(
+            [
+                Vote(
+                    performance=by_country[(show.id, self.countries[voter].id)],
+                    vote_type=vote_type,
+                    ranking=[self.codes[i] for i in ranking],
+                )
+                for show, data in zip(shows, generated)
+                for voter, vote_type, ranking in data["votes"]
+            ],
+            batch_size=5000,
+        )
+
+        return editions
@@ -0,0 +1,127 @@
+import numpy as np
+
+from models import get_vote_index, get_vote_label, POINTS_PER_PLACE, ShowType, VoteType
+
+
+class VoteTensor:
+    """
+    Dense NumPy version of every Vote.ranking in a set of shows, so that consumers don't have to re-parse
+    the rankings with ranking.index(code) and POINTS_PER_PLACE lookups.
+
+    points[show, voter, vote_type, receiver] is the number of points the voter gave the receiver (int8)
+    ranks[show, voter, vote_type, receiver] is the place the voter ranked the receiver in, starting at 1 (int16)
+    A 0 in ranks means the receiver isn't in the ranking at all (e.g. only the top 10 are known).
+    The vote_type axis is indexed by VoteType - 1.
+
+    We also keep a few masks that describe the shows themselves:
+    present[show, country] is True if the country has a performance in the show (i.e. it votes there)
+    competing[show, country] is True if the country actually performed (running_order > 0)
+    voted[show, voter, vote_type] is True if we have a vote of that type from the voter
+    """
+
+    def __init__(self, countries, shows, performances, votes):
+        # index maps from ids to positions along the axes
+        self.countries = sorted(country.id for country in countries)
+        self.country_index = {id: i for i, id in enumerate(self.countries)}
+
+        code_index = {
+            country.code: self.country_index[country.id] for country in countries
+        }
+
+        # shows are kept in chronological order so that slices over years are contiguous
+        shows = sorted(shows, key=lambda x: (x.edition.year, x.id))
+        self.shows = [show.id for show in shows]
+        self.show_index = {id: i for i, id in enumerate(self.shows)}
+
+        self.show_years = np.array(
+            [show.edition.year for show in shows], dtype=np.int16
+        )
+        self.show_types = np.array([show.show_type for show in shows], dtype=np.int8)
+
+        num_shows = len(self.shows)
+        num_countries = len(self.countries)
+        num_vote_types = len(VoteType.choices)
+
+        self.present = np.zeros((num_shows, num_countries), dtype=bool)
+        self.competing = np.zeros((num_shows, num_countries), dtype=bool)
+
+        # we need the show and country of a performance to place its votes
+        placement = {}
+
+        for performance in performances:
+            show = self.show_index.get(performance.show_id)
+
+            if show is None:
+                continue
+
+            country = self.country_index[performance.country_id]
+            placement[performance.id] = (show, country)
+
+            self.present[show, country] = True
+            self.competing[show, country] = performance.running_order > 0
+
+        self.voted = np.zeros((num_shows, num_countries, num_vote_types), dtype=bool)
+
+        # gather the coordinates of every ranked slot first, then fill the arrays in one go
+        show_idx = []
+        voter_idx = []
+        type_idx = []
+        receiver_idx = []
+        place_idx = []
+
+        for vote in votes:
+            if vote.performance_id not in placement:
+                continue
+
+            show, voter = placement[vote.performance_id]
+            self.voted[show, voter, vote.vote_type - 1] = True
+
+            for i, code in enumerate(vote.ranking):
+                show_idx.append(show)
+                voter_idx.append(voter)
+                type_idx.append(vote.vote_type - 1)
+                receiver_idx.append(code_index[code])
+                place_idx.append(i)
+
+        shape = (num_shows, num_countries, num_vote_types, num_countries)
+        coordinates = tuple(
+            np.array(idx, dtype=np.intp)
+            for idx in (show_idx, voter_idx, type_idx, receiver_idx)
+        )
+        place_idx = np.array(place_idx, dtype=np.int16)
+
+        self.ranks = np.zeros(shape, dtype=np.int16)
+        self.ranks[coordinates] = place_idx + 1
+
+        # places past the end of POINTS_PER_PLACE don't get any points
+        points = np.zeros(len(place_idx), dtype=np.int8)
+        scoring = place_idx < len(POINTS_PER_PLACE)
+        points[scoring] = np.array(POINTS_PER_PLACE)[place_idx[scoring]]
+
+        self.points = np.zeros(shape, dtype=np.int8)
+        self.points[coordinates] = points
+
+    def show_mask(self, start_year, end_year, mode=None):
+        """
+        Returns a boolean mask over the show axis for the given range of years
+        mode can be "final" (grand final only), "semi" (semi-finals only) or None (everything)
+        """
+        mask = (self.show_years >= start_year) & (self.show_years <= end_year)
+
+        if mode == "final":
+            mask &= self.show_types == ShowType.GRAND_FINAL
+        elif mode == "semi":
+            mask &= self.show_types != ShowType.GRAND_FINAL
+
+        return mask
+
+    @staticmethod
+    def vote_types(vote_type):
+        """
+        Returns the indices along the vote type axis for a vote type label
+        "combined" means every kind of vote we have, otherwise it's just that one vote type
+        """
+        if vote_type == get_vote_label(VoteType.COMBINED):
+            return list(range(len(VoteType.choices)))
+
+        return [get_vote_index(vote_type) - 1]
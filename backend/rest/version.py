@@ -0,0 +1,166 @@
+import os
+import select
+from threading import local, Lock, Thread
+from time import monotonic, sleep
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F
+
+from middleware import loading_shared_data
+from models import DataVersion
+
+# the data version goes up by one every time the contest data changes, so anything derived from the data
+# can be tagged with the version it was worked out from and thrown away once the version moves on
+# it lives in the database (the DataVersion table) so that every worker agrees on it
+
+# workers find out about new versions in one of two ways:
+# - a background thread LISTENs for the NOTIFY we send on every bump (Postgres only, see DATA_VERSION_LISTEN)
+# - otherwise, or while the listener is down, we re-read the table at most every DATA_VERSION_POLL_INTERVAL seconds
+
+CHANNEL = "data_version"
+
+# the version this process last saw, and when it last checked the database
+_version = None
+_checked_at = 0
+_lock = Lock()
+
+# the listener thread, and the process it was started in (threads don't survive a fork)
+_listener = None
+_listener_pid = None
+_listening = False
+
+# set when something in the current transaction changed the data (per thread, like transactions)
+_local = local()
+
+
+def _read_version():
+    version = DataVersion.objects.values_list("version", flat=True).first()
+    return version or 0
+
+
+def _see_version(version):
+    # versions only ever go up, so a late notification can't take us backwards
+    global _version, _checked_at
+
+    with _lock:
+        if _version is None or version > _version:
+            _version = version
+
+        _checked_at = monotonic()
+
+
+def get_data_version():
+    """
+    Returns the current data version
+    This is cheap: it only goes to the database when the listener isn't running and the poll interval has passed
+    """
+    _ensure_listener()
+
+    interval = getattr(settings, "DATA_VERSION_POLL_INTERVAL", 1)
+
+    if _version is None or (not _listening and monotonic() - _checked_at >= interval):
+        with loading_shared_data():
+            _see_version(_read_version())
+
+    return _version
+
+
+def bump_data_version(**kwargs):
+    """
+    Marks the data as changed (usable as a signal receiver)
+    The version is only bumped once the current transaction commits, and only once per transaction,
+    so nobody can see a version for data that ends up rolled back
+    """
+    _local.changed = True
+
+    # as with result recalculation, registering every time means a rollback can't strand the flag
+    transaction.on_commit(_commit_bump)
+
+
+def _commit_bump():
+    if not getattr(_local, "changed", False):
+        return
+
+    _local.changed = False
+
+    with transaction.atomic():
+        updated = DataVersion.objects.filter(id=1).update(version=F("version") + 1)
+
+        if updated == 0:
+            DataVersion.objects.create(id=1, version=1)
+
+        version = _read_version()
+
+        # the notification is only delivered when this transaction commits
+        if connections["default"].vendor == "postgresql":
+            with connections["default"].cursor() as cursor:
+                cursor.execute("SELECT pg_notify(%s, %s)", [CHANNEL, str(version)])
+
+    _see_version(version)
+
+
+def _ensure_listener():
+    global _listener, _listener_pid, _listening
+
+    if getattr(settings, "DATA_VERSION_LISTEN", True) is False:
+        return
+
+    if connections["default"].vendor != "postgresql":
+        return
+
+    if _listener is not None and _listener_pid == os.getpid():
+        return
+
+    with _lock:
+        if _listener is None or _listener_pid != os.getpid():
+            _listener = Thread(target=_listen, name="data-version-listener")
+            _listener.daemon = True
+            _listener_pid = os.getpid()
+
+            # after a fork we inherit the parent's flag, but not its thread, so poll until ours is up
+            _listening = False
+            _listener.start()
+
+
+def _listen():
+    """Runs forever on its own connection, updating _version whenever a NOTIFY comes in"""
+    global _listening
+
+    while True:
+        connection = connections.create_connection("default")
+
+        try:
+            connection.ensure_connection()
+            raw = connection.connection
+            raw.autocommit = True
+
+            with raw.cursor() as cursor:
+                cursor.execute(f"LISTEN {CHANNEL}")
+
+            # we may have missed bumps while we weren't listening
+            with raw.cursor() as cursor:
+                cursor.execute("SELECT version FROM data_dataversion WHERE id = 1")
+                row = cursor.fetchone()
+
+            _see_version(row[0] if row else 0)
+            _listening = True
+
+            while True:
+                if select.select([raw], [], [], 60) == ([], [], []):
+                    continue
+
+                raw.poll()
+
+                while raw.notifies:
+                    notification = raw.notifies.pop(0)
+                    _see_version(int(notification.payload))
+
+        # until we can reconnect, get_data_version falls back to polling
+        except Exception:
+            _listening = False
+
+        finally:
+            connection.close()
+
+        sleep(getattr(settings, "DATA_VERSION_POLL_INTERVAL", 1))
@@ -1,8 +1,66 @@
-import axios from "axios";
+import axios, { AxiosResponse, InternalAxiosRequestConfig } from "axios";
 
-export default axios.create({
+const client = axios.create({
     baseURL: "http://localhost:8000",
     headers: {
         "Content-type": "application/json"
+    },
+    // a 304 means our stored copy is still good, so it isn't an error
+    validateStatus: (status: number) => (status >= 200 && status < 300) || status === 304
+});
+
+// The backend tags its responses with an ETag, and answers with an empty 304 if we send the same one back.
+// Browsers don't do that for POST requests on their own, so we keep the last response for each request here.
+// A Map iterates in insertion order, so moving an entry to the end on every use keeps the least recently used first
+const MAX_STORED = 200;
+const stored = new Map<string, { etag: string, data: any }>();
+
+const use = (key: string) => {
+    const entry = stored.get(key);
+
+    if (entry !== undefined) {
+        stored.delete(key);
+        stored.set(key, entry);
     }
-});
\ No newline at end of file
+
+    return entry;
+};
+
+const store = (key: string, entry: { etag: string, data: any }) => {
+    stored.delete(key);
+    stored.set(key, entry);
+
+    while (stored.size > MAX_STORED) {
+        stored.delete(stored.keys().next().value);
+    }
+};
+
+const keyOf = (config: InternalAxiosRequestConfig) => {
+    const body = typeof config.data === "string" ? config.data : JSON.stringify(config.data ?? {});
+    return `${config.method} ${config.url} ${body}`;
+};
+
+client.interceptors.request.use((config: InternalAxiosRequestConfig) => {
+    const entry = use(keyOf(config));
+
+    if (entry !== undefined) {
+        config.headers.set("If-None-Match", entry.etag);
+    }
+
+    return config;
+});
+
+client.interceptors.response.use((response: AxiosResponse) => {
+    const key = keyOf(response.config);
+
+    if (response.status === 304) {
+        response.data = use(key)?.data;
+        response.status = 200;
+    } else if (response.headers["etag"] !== undefined) {
+        store(key, { etag: response.headers["etag"], data: response.data });
+    }
+
+    return response;
+});
+
+export default client;